@@ -0,0 +1 @@
+"""Benchmarks for Crownstone SSE."""
@@ -0,0 +1,83 @@
+"""
+Compressed stream benchmark against a local compressing stand-in SSE server.
+
+For every content encoding, reports the bytes on the wire per event,
+the compression ratio, throughput, send-to-dispatch latency and CPU time per event
+of CrownstoneSSEAsync. The server flushes the compressor after every event.
+
+Run with:
+    python -m benchmarks.bench_compression --events 20000 --mix data_change
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import time
+from typing import Any
+
+from benchmarks.bench_throughput import bench_async_client
+from benchmarks.common import print_table, run_isolated, server_process
+from tests.mock_classes.compressing_server import ENCODINGS, run_compressing_server
+from tests.mock_classes.standin_server import DEFAULT_MIX, StreamConfig, parse_mix
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="events/sec, 0 for unlimited")
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX))
+    parser.add_argument("--only", choices=ENCODINGS, action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    config = StreamConfig(args.mix, args.rate, args.events, args.payload_size)
+    results: list[dict[str, Any]] = []
+    for encoding in ENCODINGS:
+        if args.only and encoding not in args.only:
+            continue
+        bytes_sent = multiprocessing.Value("q", 0)
+        with server_process(
+            run_compressing_server, config, None, encoding, bytes_sent
+        ) as port:
+            result = run_isolated(bench_async_client, port, args.events)
+            # let the server publish its final count
+            time.sleep(0.1)
+        results.append(
+            {
+                "encoding": encoding,
+                "wire_bytes_per_event": bytes_sent.value / args.events,
+                **result,
+            }
+        )
+
+    identity = next((row for row in results if row["encoding"] == "identity"), None)
+    for row in results:
+        row["ratio"] = (
+            identity["wire_bytes_per_event"] / row["wire_bytes_per_event"]
+            if identity is not None and row["wire_bytes_per_event"]
+            else float("nan")
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results,
+        [
+            "encoding",
+            "wire_bytes_per_event",
+            "ratio",
+            "events_per_sec",
+            "p50_ms",
+            "p99_ms",
+            "cpu_us_per_event",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
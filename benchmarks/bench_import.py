@@ -0,0 +1,96 @@
+"""
+Import time benchmark.
+
+Measures the time, peak memory and amount of loaded modules of importing parts
+of the package, every repeat in a fresh interpreter.
+
+Run with:
+    python -m benchmarks.bench_import --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any
+
+from benchmarks.common import print_table
+
+STATEMENTS = {
+    "package": "import crownstone_sse",
+    "constants": "from crownstone_sse import EVENT_SWITCH_STATE_UPDATE",
+    "events": "from crownstone_sse.events import parse_event",
+    "event bus": "from crownstone_sse import EventBus",
+    "async client": "from crownstone_sse import CrownstoneSSEAsync",
+    "threaded client": "from crownstone_sse import CrownstoneSSE",
+}
+
+# runs in the fresh interpreter, measures the statement against a baseline
+# the peak RSS is inherited over exec on Linux, so the current RSS is used where available
+_MEASURE = """
+import json, resource, sys, time
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+modules = len(sys.modules)
+rss = rss_kb()
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": duration,
+    "modules": len(sys.modules) - modules,
+    "rss_kb": rss_kb() - rss,
+    "aiohttp": "aiohttp" in sys.modules,
+}}))
+"""
+
+
+def measure(statement: str, repeat: int) -> dict[str, Any]:
+    """Run a statement in fresh interpreters, return the median measurements."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE.format(statement=statement)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output))
+
+    return {
+        "import_ms": statistics.median(run["seconds"] for run in runs) * 1000,
+        "modules": int(statistics.median(run["modules"] for run in runs)),
+        "rss_delta_mb": statistics.median(run["rss_kb"] for run in runs) / 1024,
+        "loads_aiohttp": runs[0]["aiohttp"],
+    }
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        {"import": name, **measure(statement, args.repeat)}
+        for name, statement in STATEMENTS.items()
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results, ["import", "import_ms", "modules", "rss_delta_mb", "loads_aiohttp"]
+    )
+
+
+if __name__ == "__main__":
+    main()
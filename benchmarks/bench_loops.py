@@ -0,0 +1,84 @@
+"""
+Event loop benchmark against a local stand-in SSE server.
+
+Compares events/sec, p50/p99 send-to-dispatch latency and CPU time per event
+of CrownstoneSSEAsync and CrownstoneSSE on the default asyncio event loop
+and on uvloop, when it is installed.
+
+Run with:
+    python -m benchmarks.bench_loops --events 20000 --payload-size 512
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from typing import Any
+
+from benchmarks.bench_throughput import bench_async_client, bench_threaded_client
+from benchmarks.common import print_table, run_isolated, server_process
+from crownstone_sse.helpers.event_loop import LoopFactory, uvloop
+from tests.mock_classes.standin_server import (
+    DEFAULT_MIX,
+    EVENT_TEMPLATES,
+    StreamConfig,
+    parse_mix,
+    run_server,
+)
+
+LOOPS: dict[str, LoopFactory] = {"asyncio": asyncio.new_event_loop}
+if uvloop is not None:
+    LOOPS["uvloop"] = uvloop.new_event_loop
+
+CLIENTS = {
+    "CrownstoneSSEAsync": bench_async_client,
+    "CrownstoneSSE": bench_threaded_client,
+}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="events/sec, 0 for unlimited")
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument(
+        "--mix", type=parse_mix, default=dict(DEFAULT_MIX), help=f"kinds: {', '.join(EVENT_TEMPLATES)}"
+    )
+    parser.add_argument("--only", choices=list(CLIENTS), action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if uvloop is None:
+        print("uvloop is not installed, only the asyncio event loop is measured.")
+
+    config = StreamConfig(args.mix, args.rate, args.events, args.payload_size)
+    results: list[dict[str, Any]] = []
+    for name, benchmark in CLIENTS.items():
+        if args.only and name not in args.only:
+            continue
+        for loop_name, loop_factory in LOOPS.items():
+            with server_process(run_server, config) as port:
+                result = run_isolated(benchmark, port, args.events, loop_factory)
+            results.append({"client": name, "loop": loop_name, **result})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results,
+        [
+            "client",
+            "loop",
+            "events",
+            "events_per_sec",
+            "p50_ms",
+            "p99_ms",
+            "cpu_us_per_event",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Reconnect benchmark, injecting faults with a local stand-in SSE server.
+
+For every fault scenario, reports the time from injecting the fault to the first
+event received afterwards, the gap between events around the fault,
+and the events lost or duplicated.
+
+Run with:
+    python -m benchmarks.bench_reconnect --rate 200 --reconnection-time 1
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any
+
+from benchmarks.common import print_table, run_isolated
+from benchmarks.fault_server import (
+    FAULT_REFUSE,
+    FAULT_STALL,
+    FAULTS,
+    Fault,
+    FaultInjectingServer,
+)
+from crownstone_sse import CrownstoneSSEAsync
+from tests.mock_classes.standin_server import SEQUENCE_FIELD, StreamConfig
+
+
+def bench_scenario(kind: str, options: dict[str, Any]) -> dict[str, Any]:
+    """Stream events through a single fault, return the recovery statistics."""
+    rate = options["rate"]
+    if kind == FAULT_STALL:
+        duration = options["stall"]
+    elif kind == FAULT_REFUSE:
+        duration = options["refuse"]
+    else:
+        duration = 0
+    # inject the fault after a second, and keep streaming for a while after the fault
+    after = int(rate)
+    count = int(rate * (1 + duration + options["seconds"]))
+
+    # reconnect warnings are expected
+    logging.getLogger("crownstone_sse").setLevel(logging.ERROR)
+    received: list[tuple[float, int]] = []
+
+    async def run() -> FaultInjectingServer:
+        """Run the server and client until all events are received or the timeout."""
+        server = FaultInjectingServer(
+            StreamConfig(rate=rate, count=count),
+            [Fault(kind, after, duration)],
+            cache=options["cache"],
+        )
+        await server.start()
+
+        async def consume() -> None:
+            """Receive events until the last one."""
+            async with CrownstoneSSEAsync(
+                "bench",
+                "bench",
+                reconnection_time=options["reconnection_time"],
+                connection_timeout=options["connection_timeout"],
+                event_base_url=server.event_base_url,
+                login_url=server.login_url,
+            ) as client:
+                async for event in client:
+                    sequence = event.data.get(SEQUENCE_FIELD) if event else None
+                    if not sequence:
+                        continue
+                    received.append((time.monotonic(), sequence))
+                    if sequence >= count:
+                        break
+
+        try:
+            await asyncio.wait_for(consume(), options["timeout"])
+        except asyncio.TimeoutError:
+            pass
+        await server.stop()
+        return server
+
+    server = asyncio.run(run())
+    return _statistics(kind, server, received, count)
+
+
+def _statistics(
+    kind: str,
+    server: FaultInjectingServer,
+    received: list[tuple[float, int]],
+    count: int,
+) -> dict[str, Any]:
+    """Return the recovery statistics of a scenario."""
+    sequences = [sequence for _, sequence in received]
+    unique = set(sequences)
+    result: dict[str, Any] = {
+        "scenario": kind,
+        "recovery_ms": float("nan"),
+        "gap_ms": float("nan"),
+        "lost": count - len(unique),
+        "duplicated": len(sequences) - len(unique),
+        "connections": server.connections,
+        "logins": server.logins,
+    }
+    if not server.fault_times:
+        return result
+
+    fault_time = server.fault_times[0]
+    before = [when for when, _ in received if when < fault_time]
+    after = [when for when, _ in received if when >= fault_time]
+    if after:
+        result["recovery_ms"] = (after[0] - fault_time) * 1000
+        if before:
+            result["gap_ms"] = (after[0] - before[-1]) * 1000
+    return result
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=200, help="events/sec")
+    parser.add_argument("--seconds", type=float, default=4, help="stream length after the fault")
+    parser.add_argument("--reconnection-time", type=float, default=1)
+    parser.add_argument("--connection-timeout", type=float, default=2)
+    parser.add_argument("--stall", type=float, default=4, help="stall duration in seconds")
+    parser.add_argument("--refuse", type=float, default=3, help="refuse duration in seconds")
+    parser.add_argument("--cache", action="store_true", help="server resends missed events")
+    parser.add_argument("--timeout", type=float, default=30, help="per scenario")
+    parser.add_argument("--only", choices=FAULTS, action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    options = vars(args)
+
+    results = [
+        run_isolated(bench_scenario, kind, options)
+        for kind in FAULTS
+        if not args.only or kind in args.only
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results,
+        ["scenario", "recovery_ms", "gap_ms", "lost", "duplicated", "connections", "logins"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Throughput and latency benchmark against a local stand-in SSE server.
+
+Measures events/sec, p50/p99 send-to-dispatch latency, CPU time per event
+and peak RSS for CrownstoneSSEAsync, CrownstoneSSE and EventBus dispatch.
+The stand-in server runs in a separate process, every client in a fresh one.
+The clients run on uvloop when it is installed, see bench_loops to compare loops.
+
+Run with:
+    python -m benchmarks.bench_throughput --events 20000 --payload-size 512
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from typing import Any
+
+from benchmarks.common import (
+    max_rss_mb,
+    percentile,
+    print_table,
+    run_isolated,
+    server_process,
+    urls,
+)
+from crownstone_sse import CrownstoneSSE, CrownstoneSSEAsync, EventBus
+from crownstone_sse.helpers import event_loop
+from crownstone_sse.helpers.event_loop import LoopFactory
+from tests.mock_classes.standin_server import (
+    DEFAULT_MIX,
+    EVENT_TEMPLATES,
+    SENT_AT_FIELD,
+    SEQUENCE_FIELD,
+    StreamConfig,
+    parse_mix,
+    run_server,
+)
+
+EVENT_TYPES = ["switchStateUpdate", "presence", "dataChange", "command", "ping", "system"]
+
+
+class _Recorder:
+    """Records the dispatch latency of benchmark events."""
+
+    def __init__(self, events: int) -> None:
+        """Initialize the recorder."""
+        self.events = events
+        self.latencies: list[float] = []
+        self.first: float | None = None
+        self.last = 0.0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, event: Any) -> None:
+        """Record a dispatched event."""
+        now = time.monotonic()
+        if event is None or SEQUENCE_FIELD not in event.data or event.data[SEQUENCE_FIELD] == 0:
+            return
+        with self._lock:
+            if self.first is None:
+                self.first = now
+            self.last = now
+            self.latencies.append(now - event.data[SENT_AT_FIELD])
+            if len(self.latencies) >= self.events:
+                self.done.set()
+
+    def result(self, cpu_time: float) -> dict[str, Any]:
+        """Return the benchmark result."""
+        count = len(self.latencies)
+        duration = self.last - (self.first or self.last)
+        return {
+            "events": count,
+            "events_per_sec": count / duration if duration > 0 else float("nan"),
+            "p50_ms": percentile(self.latencies, 0.5) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "cpu_us_per_event": cpu_time / count * 1e6 if count else float("nan"),
+            "max_rss_mb": max_rss_mb(),
+        }
+
+
+def bench_async_client(
+    port: int, events: int, loop_factory: LoopFactory | None = None
+) -> dict[str, Any]:
+    """Iterate CrownstoneSSEAsync directly."""
+    recorder = _Recorder(events)
+
+    async def run() -> None:
+        """Consume events until all are received."""
+        async with CrownstoneSSEAsync("bench", "bench", **urls(port)) as client:
+            async for event in client:
+                recorder.record(event)
+                if recorder.done.is_set():
+                    break
+
+    cpu_start = time.process_time()
+    event_loop.run(run(), loop_factory)
+    return recorder.result(time.process_time() - cpu_start)
+
+
+def bench_event_bus(
+    port: int, events: int, loop_factory: LoopFactory | None = None
+) -> dict[str, Any]:
+    """Fire events from CrownstoneSSEAsync into an EventBus with async listeners."""
+    recorder = _Recorder(events)
+
+    async def listener(event: Any) -> None:
+        """Record the event."""
+        recorder.record(event)
+
+    async def run() -> None:
+        """Consume events until all are received."""
+        bus = EventBus()
+        for event_type in EVENT_TYPES:
+            bus.add_event_listener(event_type, listener)
+        async with CrownstoneSSEAsync("bench", "bench", **urls(port)) as client:
+            async for event in client:
+                if event is not None:
+                    bus.fire(event.type, event)
+                if recorder.done.is_set():
+                    break
+        await asyncio.sleep(0)
+
+    cpu_start = time.process_time()
+    event_loop.run(run(), loop_factory)
+    return recorder.result(time.process_time() - cpu_start)
+
+
+def bench_threaded_client(
+    port: int, events: int, loop_factory: LoopFactory | None = None
+) -> dict[str, Any]:
+    """Receive events with sync listeners on CrownstoneSSE."""
+    recorder = _Recorder(events)
+    cpu_start = time.process_time()
+    client = CrownstoneSSE("bench", "bench", loop_factory=loop_factory, **urls(port))
+    for event_type in EVENT_TYPES:
+        client.add_event_listener(event_type, recorder.record)
+    recorder.done.wait()
+    cpu_time = time.process_time() - cpu_start
+    client.stop()
+    client.join()
+    return recorder.result(cpu_time)
+
+
+BENCHMARKS = {
+    "CrownstoneSSEAsync": bench_async_client,
+    "EventBus": bench_event_bus,
+    "CrownstoneSSE": bench_threaded_client,
+}
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="events/sec, 0 for unlimited")
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument(
+        "--mix", type=parse_mix, default=dict(DEFAULT_MIX), help=f"kinds: {', '.join(EVENT_TEMPLATES)}"
+    )
+    parser.add_argument("--only", choices=list(BENCHMARKS), action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    config = StreamConfig(args.mix, args.rate, args.events, args.payload_size)
+    results: list[dict[str, Any]] = []
+    for name, benchmark in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        # a fresh server per benchmark, so each client gets the same stream
+        with server_process(run_server, config) as port:
+            result = run_isolated(benchmark, port, args.events)
+        results.append({"benchmark": name, **result})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results,
+        [
+            "benchmark",
+            "events",
+            "events_per_sec",
+            "p50_ms",
+            "p99_ms",
+            "cpu_us_per_event",
+            "max_rss_mb",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
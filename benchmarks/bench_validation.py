@@ -0,0 +1,102 @@
+"""
+Validation overhead benchmark.
+
+For every event kind of the stand-in server, measures the time per event of
+json.loads and parse_event, without and with a validator, and the time to
+reject invalid data of that kind.
+
+Run with:
+    python -m benchmarks.bench_validation --iterations 100000
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import time
+from typing import Any, Callable
+
+from benchmarks.common import print_table
+from crownstone_sse.events import InvalidEvent, parse_event
+from crownstone_sse.util.validation import EventValidator
+from tests.mock_classes.standin_server import EVENT_TEMPLATES, STREAM_START_EVENT
+
+KINDS = {**{kind: templates[0] for kind, templates in EVENT_TEMPLATES.items()}, "system": STREAM_START_EVENT}
+
+
+def _break(data: dict[str, Any]) -> dict[str, Any]:
+    """Return a copy of the data with a required field removed, as deep as possible."""
+    broken = copy.deepcopy(data)
+    if "switchData" in broken:
+        del broken["switchData"][-1]["type"]
+    elif "crownstone" in broken:
+        del broken["crownstone"]["uid"]
+    elif "sphere" in broken:
+        del broken["sphere"]["id"]
+    elif "counter" in broken:
+        broken["counter"] = "1"
+    else:
+        del broken["subType"]
+    return broken
+
+
+def _time_per_call(function: Callable[[], Any], iterations: int, repeat: int) -> float:
+    """Return the best time per call in nanoseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e9
+
+
+def measure(data: dict[str, Any], iterations: int, repeat: int) -> dict[str, Any]:
+    """Return the time per event of parsing without and with validation."""
+    line = json.dumps(data)
+    broken = json.dumps(_break(data))
+    validator = EventValidator()
+    assert not isinstance(parse_event(json.loads(line), None, validator), InvalidEvent)
+    assert isinstance(parse_event(json.loads(broken), None, validator), InvalidEvent)
+
+    plain = _time_per_call(lambda: parse_event(json.loads(line)), iterations, repeat)
+    validated = _time_per_call(
+        lambda: parse_event(json.loads(line), None, validator), iterations, repeat
+    )
+    rejected = _time_per_call(
+        lambda: parse_event(json.loads(broken), None, validator), iterations, repeat
+    )
+    return {
+        "parse_ns": plain,
+        "validated_ns": validated,
+        "overhead_ns": validated - plain,
+        "overhead_pct": (validated - plain) / plain * 100,
+        "reject_ns": rejected,
+    }
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        {"kind": kind, **measure(data, args.iterations, args.repeat)}
+        for kind, data in KINDS.items()
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        results,
+        ["kind", "parse_ns", "validated_ns", "overhead_ns", "overhead_pct", "reject_ns"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Helpers shared by the benchmarks."""
+from __future__ import annotations
+
+import contextlib
+import multiprocessing
+import os
+import resource
+import socket
+import time
+from typing import Any, Callable, Iterator, Sequence
+
+from tests.mock_classes.standin_server import LOGIN_PATH, SSE_PATH, StreamConfig
+
+HOST = "127.0.0.1"
+
+
+def free_port() -> int:
+    """Return a free TCP port on localhost."""
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return int(sock.getsockname()[1])
+
+
+def wait_for_port(port: int, timeout: float = 10) -> None:
+    """Wait until a server accepts connections on a port."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def urls(port: int) -> dict[str, str]:
+    """Return the client URL arguments for a stand-in server on a port."""
+    return {
+        "event_base_url": f"http://{HOST}:{port}{SSE_PATH}?accessToken=",
+        "login_url": f"http://{HOST}:{port}{LOGIN_PATH}",
+    }
+
+
+@contextlib.contextmanager
+def server_process(
+    target: Callable[..., Any], config: StreamConfig, port: int | None = None, *args: Any
+) -> Iterator[int]:
+    """Run a stand-in server in a separate process, yield its port."""
+    port = port or free_port()
+    process = multiprocessing.Process(
+        target=target, args=(config, HOST, port, *args), daemon=True
+    )
+    process.start()
+    try:
+        wait_for_port(port)
+        yield port
+    finally:
+        process.terminate()
+        process.join()
+
+
+def run_isolated(target: Callable[..., dict[str, Any]], *args: Any) -> dict[str, Any]:
+    """Run a benchmark in a fresh process, so CPU and memory are measured in isolation."""
+    queue: multiprocessing.Queue[dict[str, Any]] = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_and_report, args=(queue, target, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _run_and_report(
+    queue: multiprocessing.Queue[dict[str, Any]],
+    target: Callable[..., dict[str, Any]],
+    args: Sequence[Any],
+) -> None:
+    """Run a benchmark and put its result in a queue."""
+    try:
+        queue.put(target(*args))
+    except Exception as err:  # pylint: disable=broad-except
+        queue.put({"error": repr(err)})
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Return a percentile of values."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def max_rss_mb() -> float:
+    """Return the peak resident set size of this process in MB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / 1024 / 1024 if os.uname().sysname == "Darwin" else usage / 1024
+
+
+def print_table(rows: list[dict[str, Any]], columns: list[str]) -> None:
+    """Print results as an aligned table."""
+    formatted = [
+        [
+            f"{row[column]:.3f}" if isinstance(row.get(column), float) else str(row.get(column, ""))
+            for column in columns
+        ]
+        for row in rows
+    ]
+    widths = [
+        max(len(column), *(len(line[index]) for line in formatted))
+        for index, column in enumerate(columns)
+    ]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in formatted:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)))
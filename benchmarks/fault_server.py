@@ -0,0 +1,206 @@
+"""
+Stand-in SSE server that injects faults into the stream.
+
+Events are produced on a fixed timeline at the configured rate, whether a client
+is connected or not. Events produced while no client is connected are lost, unless
+the server caches them and resends everything after the last completely written event.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import web
+
+from crownstone_sse.const import (
+    EVENT_SYSTEM,
+    EVENT_SYSTEM_NO_CONNECTION,
+    EVENT_SYSTEM_TOKEN_EXPIRED,
+)
+from tests.mock_classes.standin_server import (
+    STREAM_START_EVENT,
+    StandInServer,
+    StreamConfig,
+)
+
+FAULT_TRUNCATE = "truncate"
+FAULT_STALL = "stall"
+FAULT_DROP = "drop"
+FAULT_TOKEN_EXPIRED = "token_expired"
+FAULT_NO_CONNECTION = "no_connection"
+FAULT_REFUSE = "refuse"
+
+FAULTS = [
+    FAULT_TRUNCATE,
+    FAULT_STALL,
+    FAULT_DROP,
+    FAULT_TOKEN_EXPIRED,
+    FAULT_NO_CONNECTION,
+    FAULT_REFUSE,
+]
+
+
+@dataclass
+class Fault:
+    """
+    A fault to inject once.
+
+    truncate: send half of an event frame, the stream continues.
+    stall: stop sending for the duration, the stream continues afterwards.
+    drop: send half of an event frame and abort the connection.
+    token_expired: send TOKEN_EXPIRED, close the stream and reject the token until a new login.
+    no_connection: send NO_CONNECTION and close the stream.
+    refuse: abort the connection and refuse new connections for the duration.
+    """
+
+    kind: str
+    # events sent on the connection before the fault is injected
+    after: int = 100
+    # seconds, for stall and refuse
+    duration: float = 0
+
+
+class FaultInjectingServer(StandInServer):
+    """Stand-in server injecting faults, one per connection in the given order."""
+
+    def __init__(
+        self,
+        config: StreamConfig,
+        faults: list[Fault],
+        cache: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """
+        Initialize the server.
+
+        :param config: Stream configuration, the rate must be set.
+        :param faults: Faults to inject, the first in the first connection and so on.
+        :param cache: Resend events that were not completely written when a client reconnects.
+        """
+        if not config.rate:
+            raise ValueError("The fault injecting server requires a rate.")
+        super().__init__(config, host, port)
+        self.fault_times: list[float] = []
+        self._faults = list(faults)
+        self._cache = cache
+        self._events = self.iter_events()
+        self._started: float | None = None
+        self._last_written = 0
+        self._token_expired = False
+
+    async def handle_login(self, request: web.Request) -> web.Response:
+        """Accept any credentials, and accept tokens again."""
+        self._token_expired = False
+        return await super().handle_login(request)
+
+    async def handle_stream(self, request: web.Request) -> web.StreamResponse:
+        """Stream events from the timeline to a client, and inject the next fault."""
+        self.connections += 1
+        if self._token_expired:
+            return web.Response(status=401)
+
+        response = await self.prepare_stream(request)
+        fault = self._faults.pop(0) if self._faults else None
+
+        try:
+            await self.write_event(response, STREAM_START_EVENT, 0)
+            if self._started is None:
+                self._started = time.monotonic()
+
+            sequence = self._resume_sequence()
+            written = 0
+            while not self.config.count or sequence <= self.config.count:
+                await self._wait_until_due(sequence)
+                if fault is not None and written >= fault.after:
+                    next_sequence = await self.inject(fault, request, response, sequence)
+                    fault = None
+                    if next_sequence is None:
+                        return response
+                    sequence = next_sequence
+                    continue
+
+                await self.write_event(response, next(self._events), sequence)
+                self._last_written = max(self._last_written, sequence)
+                sequence += 1
+                written += 1
+
+            # keep the stream open like the real server, until the client disconnects
+            while True:
+                await asyncio.sleep(3600)
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def inject(
+        self,
+        fault: Fault,
+        request: web.Request,
+        response: web.StreamResponse,
+        sequence: int,
+    ) -> int | None:
+        """Inject a fault, return the next sequence number if the stream continues."""
+        self.fault_times.append(time.monotonic())
+
+        if fault.kind == FAULT_TRUNCATE:
+            frame = self.encode_event(next(self._events), sequence)
+            await response.write(frame[: len(frame) // 2] + b"\n\n")
+            # the truncated event is lost
+            return sequence + 1
+
+        if fault.kind == FAULT_STALL:
+            await asyncio.sleep(fault.duration)
+            return sequence
+
+        if fault.kind == FAULT_DROP:
+            frame = self.encode_event(next(self._events), sequence)
+            await response.write(frame[: len(frame) // 2])
+            self._abort(request)
+            return None
+
+        if fault.kind == FAULT_TOKEN_EXPIRED:
+            self._token_expired = True
+            await self.write_event(response, _system_event(EVENT_SYSTEM_TOKEN_EXPIRED), 0)
+            return None
+
+        if fault.kind == FAULT_NO_CONNECTION:
+            await self.write_event(response, _system_event(EVENT_SYSTEM_NO_CONNECTION), 0)
+            return None
+
+        if fault.kind == FAULT_REFUSE:
+            await self.stop_listening()
+            self._abort(request)
+            asyncio.get_running_loop().call_later(
+                fault.duration, lambda: asyncio.ensure_future(self.start_listening())
+            )
+            return None
+
+        raise ValueError(f"Unknown fault {fault.kind}.")
+
+    def _resume_sequence(self) -> int:
+        """Return the first sequence number to send on a new connection."""
+        if self._cache:
+            return self._last_written + 1
+        assert self._started is not None
+        due = int((time.monotonic() - self._started) * self.config.rate) + 1
+        return max(self._last_written + 1, due)
+
+    async def _wait_until_due(self, sequence: int) -> None:
+        """Wait until an event is due on the timeline."""
+        assert self._started is not None
+        delay = self._started + (sequence - 1) / self.config.rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _abort(request: web.Request) -> None:
+        """Abort the connection of a request, without ending the response."""
+        if request.transport is not None:
+            request.transport.abort()
+
+
+def _system_event(sub_type: str) -> dict[str, Any]:
+    """Return a system event."""
+    return {"type": EVENT_SYSTEM, "subType": sub_type, "code": 200, "message": sub_type}
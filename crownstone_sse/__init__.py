@@ -1,6 +1,13 @@
-"""Init file for Crownstone SSE."""
-from crownstone_sse.async_client import CrownstoneSSEAsync
-from crownstone_sse.client import CrownstoneSSE
+"""
+Init file for Crownstone SSE.
+
+The constants are imported directly. The clients, event bus and runtime are
+imported on first use, so importing the package does not load aiohttp.
+"""
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any
 
 # include all possible event types in the top level
 from crownstone_sse.const import (
@@ -33,6 +40,36 @@ from crownstone_sse.const import (
     OPERATION_DELETE,
     OPERATION_UPDATE,
 )
-from crownstone_sse.util.eventbus import EventBus
+
+if TYPE_CHECKING:
+    from crownstone_sse.async_client import CrownstoneSSEAsync
+    from crownstone_sse.client import CrownstoneSSE
+    from crownstone_sse.util.eventbus import EventBus
+    from crownstone_sse.util.runtime import SSERuntime
 
 __version__ = "2.0.4-git"
+
+# public name -> module it is imported from on first use
+_LAZY_IMPORTS = {
+    "CrownstoneSSEAsync": "crownstone_sse.async_client",
+    "CrownstoneSSE": "crownstone_sse.client",
+    "EventBus": "crownstone_sse.util.eventbus",
+    "SSERuntime": "crownstone_sse.util.runtime",
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Import the clients, event bus and runtime on first use."""
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    # cache, so the next lookup does not go through this function
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """Include the lazily imported names."""
+    # lazy names are also in globals once imported
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
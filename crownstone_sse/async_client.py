@@ -10,8 +10,9 @@ import asyncio
 import hashlib
 import json
 import logging
+import time
 from enum import Enum, auto
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import aiohttp
 
@@ -23,6 +24,7 @@ from crownstone_sse.const import (
     EVENT_SYSTEM_NO_CONNECTION,
     EVENT_SYSTEM_TOKEN_EXPIRED,
     EVENT_SYSTEM_TOKEN_INVALID,
+    IDENTITY,
     LOGIN_FAILED,
     LOGIN_FAILED_EMAIL_NOT_VERIFIED,
     LOGIN_URL,
@@ -31,7 +33,13 @@ from crownstone_sse.const import (
     PROJECT_NAME,
     RECONNECTION_TIME,
 )
-from crownstone_sse.events import Event, SystemEvent, parse_event
+from crownstone_sse.events import (
+    Event,
+    InvalidEvent,
+    ReceiveInfo,
+    SystemEvent,
+    parse_event,
+)
 from crownstone_sse.exceptions import (
     AuthError,
     ClientError,
@@ -40,7 +48,31 @@ from crownstone_sse.exceptions import (
     CrownstoneClientException,
     CrownstoneConnectionException,
 )
-from crownstone_sse.helpers.aiohttp_client import create_client_session
+from crownstone_sse.helpers.aiohttp_client import create_client_session, get_accept_encoding
+from crownstone_sse.util.journal import EventJournal
+from crownstone_sse.util.metrics import (
+    RECONNECT_CONNECT_FAILED,
+    RECONNECT_NO_CONNECTION,
+    RECONNECT_PAYLOAD_ERROR,
+    RECONNECT_READ_TIMEOUT,
+    RECONNECT_STREAM_ENDED,
+    RECONNECT_TOKEN_EXPIRED,
+    RECONNECT_TOKEN_INVALID,
+    ClientMetrics,
+    MetricSnapshot,
+)
+from crownstone_sse.util.operators import Stream
+from crownstone_sse.util.profiling import (
+    STAGE_DECODE,
+    STAGE_JSON,
+    STAGE_PARSE,
+    PipelineProfiler,
+)
+from crownstone_sse.util.shedding import ConsumerLag, LoadShedder
+from crownstone_sse.util.validation import EventValidator
+
+if TYPE_CHECKING:
+    from crownstone_sse.util.replay import StreamRecorder
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -66,6 +98,16 @@ class CrownstoneSSEAsync:
         websession: aiohttp.ClientSession | None = None,
         reconnection_time: int = RECONNECTION_TIME,
         project_name: str | None = None,
+        journal: EventJournal | None = None,
+        recorder: StreamRecorder | None = None,
+        event_base_url: str = EVENT_BASE_URL,
+        login_url: str = LOGIN_URL,
+        connection_timeout: float = CONNECTION_TIMEOUT,
+        metrics: bool = False,
+        profiler: PipelineProfiler | None = None,
+        compression: bool = True,
+        shedder: LoadShedder | None = None,
+        validate: bool = False,
     ) -> None:
         """Initialize event client.
 
@@ -78,6 +120,20 @@ class CrownstoneSSEAsync:
         :param websession: An aiohttp ClientSession instance.
             Creates a default session when none provided.
         :param reconnection_time: Time between reconnection in case of connection failure.
+        :param journal: Journal to append the raw payload of every received event to.
+        :param recorder: Recorder to record the raw stream to, for replaying it later.
+        :param event_base_url: URL of the SSE endpoint, up to the access token.
+        :param login_url: URL of the login endpoint.
+        :param connection_timeout: Time in seconds without data after which the connection
+            is considered lost. The server sends a ping event every 30 seconds.
+        :param metrics: Collect metrics of the stream, readable with metrics().
+        :param profiler: Profiler to sample the time spent in each stage of the pipeline.
+        :param compression: Accept a compressed stream, decompressed incrementally by aiohttp.
+            Ignored when the websession does not decompress responses.
+        :param shedder: Load shedder to measure the lag of the consumer,
+            and drop low value events while it lags.
+        :param validate: Check the required fields of every event when it is parsed,
+            and skip the events that are invalid.
         """
         self._project_name = f"{PROJECT_NAME}-{crownstone_sse.__version__}-{project_name or NO_PROJECT_NAME}"
 
@@ -93,20 +149,70 @@ class CrownstoneSSEAsync:
             self.websession = websession
             self._close_session = False
 
+        self._metrics = ClientMetrics() if metrics else None
+        self._profiler = profiler
+        self._shedder = shedder
+        self._validator = EventValidator() if validate else None
+        self._compression = compression and getattr(
+            self.websession, "auto_decompress", True
+        )
+        self._disconnected_at: float | None = None
+        # connection count and data line count within the connection, for receive info
+        self._generation = 0
+        self._sequence = 0
         self._state = AsyncClientState.CLOSED
         self._reconnection_time = reconnection_time
         self._sleep_task: asyncio.Task[Any] | None = None
+        self._journal = journal
+        self._recorder = recorder
+        self._event_base_url = event_base_url
+        self._login_url = login_url
+        self._connection_timeout = connection_timeout
 
     @property
     def is_available(self) -> bool:
         """Returns whether the client is currently running."""
         return bool(self._state == AsyncClientState.RUNNING)
 
+    def metrics(self) -> dict[str, MetricSnapshot] | None:
+        """Return a snapshot of the metrics, or None when metrics are disabled."""
+        if self._metrics is None:
+            return None
+        if self._shedder is not None:
+            lag = self._shedder.lag()
+            self._metrics.consumer_lag_bytes.set(lag.buffered_bytes)
+            self._metrics.consumer_lag_seconds.set(lag.seconds)
+        return self._metrics.snapshot()
+
+    def consumer_lag(self) -> ConsumerLag | None:
+        """Return how far the consumer is behind the stream, or None without a shedder."""
+        if self._shedder is None:
+            return None
+        return self._shedder.lag()
+
+    def invalid_event_counts(self) -> dict[str, int] | None:
+        """Return the amount of invalid events skipped per type, or None without validation."""
+        if self._validator is None:
+            return None
+        return dict(self._validator.invalid_counts)
+
+    def shed_counts(self) -> dict[str, int] | None:
+        """Return the amount of events dropped per reason, or None without a shedder."""
+        if self._shedder is None:
+            return None
+        return dict(self._shedder.shed_counts)
+
     async def __aenter__(self) -> CrownstoneSSEAsync:
         """Login & establish a new connection to the Crownstone SSE server."""
-        if self._access_token is None:
-            await self._async_login()
-        await self._async_connect()
+        try:
+            if self._access_token is None:
+                await self._async_login()
+            await self._async_connect()
+        except BaseException:
+            # __aexit__ is not called when entering fails
+            if self._close_session:
+                await self.websession.close()
+            raise
 
         return self
 
@@ -121,7 +227,10 @@ class CrownstoneSSEAsync:
         if self._close_session:
             await self.websession.close()
 
-        self._state = AsyncClientState.CLOSED
+        if self._profiler is not None:
+            self._profiler.close()
+
+        self._set_state(AsyncClientState.CLOSED)
         _LOGGER.debug("Crownstone SSE client closed.")
 
     async def __anext__(self) -> Event:
@@ -133,19 +242,92 @@ class CrownstoneSSEAsync:
         # aiohttp StreamReader supports asynchronous iteration by line
         # the default separator is \n
         # this method already ensures we get complete data
+        metrics = self._metrics
+        shedder = self._shedder
+        sample = self._profiler.begin() if self._profiler is not None else None
         while self._client_response.status != 204:
+            if sample is not None:
+                # do not count the time spent reconnecting
+                sample.restart()
             try:
-                async for line in self._client_response.content:
+                content = self._client_response.content
+                lines: Any = content if shedder is None else shedder.reader(content)
+                async for line in lines:
+                    if sample is not None:
+                        sample.lap_read()
+                    if self._recorder is not None:
+                        self._recorder.record(line)
+                    if metrics is not None:
+                        metrics.bytes_read.inc(len(line))
+
                     # convert to string and remove returns/delimiters
                     line_str: str = line.decode("utf-8")
                     line_str = line_str.rstrip("\n").rstrip("\r")
+                    if sample is not None:
+                        sample.lap(STAGE_DECODE)
 
                     # only look at the data lines, ignore everything else
                     if line_str.startswith("data:"):
+                        self._sequence += 1
+                        receive_info = ReceiveInfo(
+                            time.monotonic(), time.time(), self._generation, self._sequence
+                        )
                         line_str = line_str.lstrip("data:")
-                        data: dict[str, Any] = json.loads(line_str)
-
-                        event = parse_event(data)
+                        if self._journal is not None:
+                            self._journal.append(line[5:].rstrip(b"\r\n"), receive_info)
+                        try:
+                            if shedder is not None and lines.data is not None:
+                                # decoded when read ahead
+                                data: dict[str, Any] = lines.data
+                            elif metrics is None:
+                                data = json.loads(line_str)
+                            else:
+                                started = time.perf_counter()
+                                data = json.loads(line_str)
+                                metrics.json_decode_seconds.observe(
+                                    time.perf_counter() - started
+                                )
+                            if sample is not None:
+                                sample.lap(STAGE_JSON)
+                        except ValueError:
+                            # a frame that was cut off, skip it
+                            _LOGGER.warning("Skipping invalid data received from the SSE server.")
+                            if metrics is not None:
+                                metrics.invalid_data.inc()
+                            continue
+                        if not isinstance(data, dict):
+                            # valid JSON, but not an event
+                            _LOGGER.warning("Skipping data that is not an event object.")
+                            if metrics is not None:
+                                metrics.invalid_data.inc()
+                            continue
+
+                        if shedder is not None:
+                            reason = shedder.shed(data)
+                            if reason is not None:
+                                if metrics is not None:
+                                    metrics.events_shed.inc(labels=(reason,))
+                                continue
+
+                        if metrics is None:
+                            event = parse_event(data, receive_info, self._validator)
+                        else:
+                            started = time.perf_counter()
+                            event = parse_event(data, receive_info, self._validator)
+                            metrics.parse_seconds.observe(time.perf_counter() - started)
+                            metrics.events.inc(
+                                labels=(str(data.get("type")), str(data.get("subType", "")))
+                            )
+                        if sample is not None:
+                            sample.lap(STAGE_PARSE)
+                        if isinstance(event, InvalidEvent):
+                            _LOGGER.warning(
+                                f"Skipping invalid {event.type or 'unknown'} event: "
+                                f"{', '.join(event.errors)}"
+                            )
+                            if metrics is not None:
+                                metrics.invalid_events.inc(labels=(event.type,))
+                            continue
                         # handle important system events
                         if isinstance(event, SystemEvent):
                             if event.sub_type == EVENT_SYSTEM_TOKEN_EXPIRED:
@@ -157,17 +339,24 @@ class CrownstoneSSEAsync:
                                     ConnectError.CONNECTION_TO_CLOUD_LOST
                                 )
 
+                        if sample is not None:
+                            assert self._profiler is not None
+                            self._profiler.end(sample, event)
                         return event
 
+                # the server ended the stream, reconnect to continue
+                if self._client_response.status != 204:
+                    await self._async_reconnect(RECONNECT_STREAM_ENDED)
+
             except aiohttp.ClientPayloadError:
                 # a payload error due to packet loss
                 # reconnection should retrieve server side cached events
-                await self._async_reconnect()
+                await self._async_reconnect(RECONNECT_PAYLOAD_ERROR)
 
             except aiohttp.ServerTimeoutError:
                 # Read timeout. A ping event is send every 30 seconds
                 # After 35 seconds no data, connection must be lost
-                await self._async_reconnect()
+                await self._async_reconnect(RECONNECT_READ_TIMEOUT)
 
             except CrownstoneAuthException as auth_err:
                 # handle re-auth and reconnection
@@ -175,13 +364,19 @@ class CrownstoneSSEAsync:
                     auth_err.type == AuthError.TOKEN_EXPIRED
                     or auth_err.type == AuthError.TOKEN_INVALID
                 ):
+                    if metrics is not None:
+                        metrics.token_refreshes.inc()
                     await self._async_login()
-                    await self._async_reconnect()
+                    await self._async_reconnect(
+                        RECONNECT_TOKEN_EXPIRED
+                        if auth_err.type == AuthError.TOKEN_EXPIRED
+                        else RECONNECT_TOKEN_INVALID
+                    )
 
             except CrownstoneConnectionException as conn_err:
                 # sse server lost connection to the cloud service
                 if conn_err.type == ConnectError.CONNECTION_TO_CLOUD_LOST:
-                    await self._async_reconnect()
+                    await self._async_reconnect(RECONNECT_NO_CONNECTION)
 
             except CrownstoneClientException as client_err:
                 # client is manually closed
@@ -194,6 +389,10 @@ class CrownstoneSSEAsync:
         """Return instance."""
         return self
 
+    def stream(self, max_buffered: int = 1000) -> Stream:
+        """Return a stream of the events, to chain operators like filter and debounce_by on."""
+        return Stream(self, max_buffered)
+
     async def _async_login(self) -> None:
         """Login to Crownstone Cloud using email and password."""
         sha_hash = hashlib.sha1(self._password.encode("utf-8"))
@@ -204,7 +403,7 @@ class CrownstoneSSEAsync:
 
         try:
             # login
-            response = await self.websession.post(LOGIN_URL, json=login_data)
+            response = await self.websession.post(self._login_url, json=login_data)
             data: dict[str, Any] = await response.json()
             # success
             if response.status == 200:
@@ -241,12 +440,17 @@ class CrownstoneSSEAsync:
             aiohttp.hdrs.CONTENT_TYPE: CONTENT_TYPE,
             aiohttp.hdrs.ACCEPT: CONTENT_TYPE,
             aiohttp.hdrs.CACHE_CONTROL: NO_CACHE,
+            aiohttp.hdrs.ACCEPT_ENCODING: (
+                get_accept_encoding() if self._compression else IDENTITY
+            ),
         }
 
         # Override the default total timeout of 5 minutes for this stream
         # Stream should be alive forever unless explicitly stopped
         # a ping event is send every 30 seconds, if nothing is read, reconnect
-        sse_timeout = aiohttp.ClientTimeout(total=None, sock_read=CONNECTION_TIMEOUT)
+        sse_timeout = aiohttp.ClientTimeout(
+            total=None, sock_read=self._connection_timeout
+        )
 
         # Close old session if reconnecting
         if (
@@ -257,7 +461,7 @@ class CrownstoneSSEAsync:
 
         try:
             response = await self.websession.get(
-                url=f"{EVENT_BASE_URL}{self._access_token}&projectName={self._project_name}",
+                url=f"{self._event_base_url}{self._access_token}&projectName={self._project_name}",
                 headers=headers,
                 timeout=sse_timeout,
             )
@@ -266,24 +470,31 @@ class CrownstoneSSEAsync:
 
             # aiohttp.ClientResponse instance
             self._client_response = response
-            self._state = AsyncClientState.RUNNING
+            self._generation += 1
+            self._sequence = 0
+            self._set_state(AsyncClientState.RUNNING)
             _LOGGER.info("Crownstone SSE client is running.")
 
         except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError):
             # keep trying to connect
-            await self._async_reconnect()
+            await self._async_reconnect(RECONNECT_CONNECT_FAILED)
 
-    async def _async_reconnect(self) -> None:
+    async def _async_reconnect(self, reason: str = RECONNECT_CONNECT_FAILED) -> None:
         """Reconnect to the server after a connection loss / data error."""
         # lost connection to the SSE server, try to reconnect
         # log once
         if self._state != AsyncClientState.CONNECTING:
             _LOGGER.warning(
                 f"Lost connection to the Crownstone SSE server. "
-                f"Reconnecting in {RECONNECTION_TIME} seconds."
+                f"Reconnecting in {self._reconnection_time} seconds."
             )
 
-        self._state = AsyncClientState.CONNECTING
+        if self._metrics is not None:
+            self._metrics.reconnects.inc(labels=(reason,))
+            if self._disconnected_at is None:
+                self._disconnected_at = time.monotonic()
+
+        self._set_state(AsyncClientState.CONNECTING)
         self._sleep_task = asyncio.create_task(asyncio.sleep(self._reconnection_time))
         try:
             await self._sleep_task
@@ -294,6 +505,18 @@ class CrownstoneSSEAsync:
 
         await self._async_connect()
 
+    def _set_state(self, state: AsyncClientState) -> None:
+        """Set the state of the client, and update the metrics."""
+        self._state = state
+        if self._metrics is None:
+            return
+
+        for client_state in AsyncClientState:
+            self._metrics.state.set(int(client_state == state), labels=(client_state.name,))
+        if state == AsyncClientState.RUNNING and self._disconnected_at is not None:
+            self._metrics.gap_seconds.observe(time.monotonic() - self._disconnected_at)
+            self._disconnected_at = None
+
     def close_client(self) -> None:
         """Manually close the Crownstone SSE client."""
         if self._state == AsyncClientState.CLOSED:
@@ -305,7 +528,7 @@ class CrownstoneSSEAsync:
             self._sleep_task.cancel()
 
         # Set an exception in StreamReader to stop the iteration
-        if self._client_response is not None:
+        if getattr(self, "_client_response", None) is not None:
             self._client_response.content.set_exception(
                 CrownstoneClientException(
                     ClientError.CLOSE_RECEIVED, "Connection close received"
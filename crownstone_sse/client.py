@@ -7,12 +7,21 @@ This can be used in synchronous context.
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import threading
 from typing import Any, Awaitable, Callable
 
 from crownstone_sse.async_client import CrownstoneSSEAsync
-from crownstone_sse.const import RECONNECTION_TIME
+from crownstone_sse.const import EVENT_BASE_URL, LOGIN_URL, RECONNECTION_TIME
+from crownstone_sse.helpers import event_loop
+from crownstone_sse.helpers.event_loop import LoopFactory
 from crownstone_sse.util.eventbus import EventBus
+from crownstone_sse.util.journal import EventJournal
+from crownstone_sse.util.metrics import MetricSnapshot
+from crownstone_sse.util.priority import PriorityEventBus, PriorityPolicy
+from crownstone_sse.util.profiling import PipelineProfiler
+from crownstone_sse.util.runtime import SSERuntime
+from crownstone_sse.util.shedding import LoadShedder
 
 
 class CrownstoneSSE(threading.Thread):
@@ -27,6 +36,19 @@ class CrownstoneSSE(threading.Thread):
         access_token: str | None = None,
         reconnection_time: int = RECONNECTION_TIME,
         project_name: str | None = None,
+        runtime: SSERuntime | None = None,
+        loop: asyncio.AbstractEventLoop | None = None,
+        journal: EventJournal | None = None,
+        event_base_url: str = EVENT_BASE_URL,
+        login_url: str = LOGIN_URL,
+        metrics: bool = False,
+        profiler: PipelineProfiler | None = None,
+        compression: bool = True,
+        loop_factory: LoopFactory | None = None,
+        allow_uvloop: bool = True,
+        priority: PriorityPolicy | None = None,
+        shedder: LoadShedder | None = None,
+        validate: bool = False,
     ) -> None:
         """
         Initialize event client.
@@ -38,35 +60,128 @@ class CrownstoneSSE(threading.Thread):
         :param access_token: Access token obtained from logging in successfully
             to the Crownstone cloud. Can be provided to skip an extra login, for faster setup.
         :param reconnection_time: Time between reconnection in case of connection failure.
+        :param runtime: Shared runtime to host the client on.
+            When provided, no dedicated thread is started for this client.
+        :param loop: Event loop of the application to run async listeners on.
+            By default, async listeners run on the event loop of the client.
+        :param journal: Journal to append the raw payload of every received event to.
+        :param event_base_url: URL of the SSE endpoint, up to the access token.
+        :param login_url: URL of the login endpoint.
+        :param metrics: Collect metrics of the client and its event bus, readable with metrics().
+        :param profiler: Profiler to sample the time spent in each stage of the pipeline.
+        :param compression: Accept a compressed stream.
+        :param loop_factory: Factory of the event loop of the client thread.
+            Not used when hosted on a runtime.
+        :param allow_uvloop: Run the client thread on uvloop when it is installed
+            and no loop_factory is provided.
+        :param priority: Run listeners with bounded concurrency, in the priority order of this policy.
+        :param shedder: Load shedder to drop low value events while the listeners lag.
+        :param validate: Skip events without the required fields, instead of failing in listeners.
         """
         self._email = email
         self._password = password
         self._access_token = access_token
         self._reconnection_time = reconnection_time
         self._project_name = project_name
-        self._bus = EventBus()
+        self._bus = (
+            EventBus(loop=loop, metrics=metrics)
+            if priority is None
+            else PriorityEventBus(loop=loop, metrics=metrics, policy=priority)
+        )
+        self._metrics = metrics
+        self._profiler = profiler
+        self._shedder = shedder
+        self._validate = validate
+        self._compression = compression
+        self._loop_factory = loop_factory
+        self._allow_uvloop = allow_uvloop
+        self._runtime = runtime
+        self._journal = journal
+        self._event_base_url = event_base_url
+        self._login_url = login_url
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._future: concurrent.futures.Future[None] | None = None
+        # set once connected, _settled also when the client failed before that
+        self._ready = threading.Event()
+        self._settled = threading.Event()
+        self._error: BaseException | None = None
+        self._stop_requested = False
 
         super().__init__(target=self._start_client)
-        self.start()
+        if runtime is None:
+            self.start()
+        else:
+            self._loop, self._future = runtime.submit(self._process_events())
 
     def _start_client(self) -> None:
         """Start the SSE client."""
-        asyncio.run(self._process_events())
+        event_loop.run(self._process_events(), self._loop_factory, self._allow_uvloop)
 
     async def _process_events(self) -> None:
         """Get events from the server, and fire them in the event bus."""
+        self._loop = asyncio.get_running_loop()
         self._client = CrownstoneSSEAsync(
             email=self._email,
             password=self._password,
             access_token=self._access_token,
+            websession=(
+                self._runtime.get_websession() if self._runtime is not None else None
+            ),
             reconnection_time=self._reconnection_time,
             project_name=self._project_name,
+            journal=self._journal,
+            event_base_url=self._event_base_url,
+            login_url=self._login_url,
+            metrics=self._metrics,
+            profiler=self._profiler,
+            compression=self._compression,
+            shedder=self._shedder,
+            validate=self._validate,
         )
 
-        async with self._client as sse_client:
-            async for event in sse_client:
-                if event is not None:
-                    self._bus.fire(event.type, event)
+        try:
+            async with self._client as sse_client:
+                self._ready.set()
+                self._settled.set()
+                # stop may have been requested while connecting
+                if self._stop_requested:
+                    sse_client.close_client()
+                async for event in sse_client:
+                    if event is not None:
+                        self._bus.fire(event.type, event)
+        except Exception as err:
+            if isinstance(err, StopAsyncIteration) and self._stop_requested:
+                # stopped while the first connection was still being retried
+                return
+            if not self._ready.is_set():
+                self._error = err
+            raise
+        finally:
+            # release anyone still waiting, also when the client failed to start
+            self._settled.set()
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """
+        Block until the client is connected to the SSE server.
+
+        Return False when the timeout expired, or the client stopped before it was ready.
+        Raise the error of the client when it failed to login or connect.
+        """
+        if not self._settled.wait(timeout):
+            return False
+        if self._error is not None:
+            raise self._error
+        return self._ready.is_set()
+
+    def metrics(self) -> dict[str, MetricSnapshot] | None:
+        """Return a snapshot of the client and event bus metrics, or None when disabled."""
+        if not self._metrics:
+            return None
+        snapshot = self._bus.metrics() or {}
+        client = getattr(self, "_client", None)
+        if client is not None:
+            snapshot.update(client.metrics() or {})
+        return snapshot
 
     def add_event_listener(
         self, event_type: str, callback: Callable[..., Any] | Awaitable[Any]
@@ -74,6 +189,33 @@ class CrownstoneSSE(threading.Thread):
         """Add a new listener, return function to remove the listener."""
         return self._bus.add_event_listener(event_type, callback)
 
+    def is_alive(self) -> bool:
+        """Return whether the client is still running."""
+        if self._future is not None:
+            return not self._future.done()
+        return super().is_alive()
+
+    def join(self, timeout: float | None = None) -> None:
+        """Wait until the client has finished."""
+        if self._future is None:
+            super().join(timeout)
+            return
+
+        try:
+            self._future.result(timeout)
+        except Exception:  # pylint: disable=broad-except
+            # like a thread, errors of the client are not raised here, wait_until_ready reports them
+            pass
+
     def stop(self) -> None:
         """Stop the client & terminate the thread."""
-        self._client.close_client()
+        self._stop_requested = True
+        if self._loop is None or not hasattr(self, "_client"):
+            # not started yet, the client stops itself once connected
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._client.close_client)
+        except RuntimeError:
+            # the event loop is already closed
+            pass
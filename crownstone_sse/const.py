@@ -14,6 +14,7 @@ LOGIN_URL: Final = "https://cloud.crownstone.rocks/api/users/login"
 # Headers
 CONTENT_TYPE: Final = "text/event-stream"
 NO_CACHE: Final = "no-cache"
+IDENTITY: Final = "identity"
 
 # Connection parameters
 RECONNECTION_TIME: Final = 2
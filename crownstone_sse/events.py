@@ -7,7 +7,9 @@ for full details on the events.
 from __future__ import annotations
 
 import json
-from typing import Any, Union
+import time
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, NamedTuple, Union
 
 from crownstone_sse.const import (
     EVENT_ABILITY_CHANGE,
@@ -19,14 +21,38 @@ from crownstone_sse.const import (
     EVENT_SYSTEM,
 )
 from crownstone_sse.helpers.switch_command import SwitchCommand
+from crownstone_sse.helpers.switch_plan import SwitchPlan
+
+if TYPE_CHECKING:
+    from crownstone_sse.util.validation import EventValidator
+
+
+class ReceiveInfo(NamedTuple):
+    """When and where in the stream an event was received."""
+
+    # time.monotonic() when the data line was read
+    monotonic: float
+    # time.time() when the data line was read
+    wall: float
+    # connection to the SSE server, counting from 1 for the first connection
+    generation: int
+    # data line within the connection, counting from 1
+    sequence: int
+
+    def age(self) -> float:
+        """Return the seconds since the event was received."""
+        return time.monotonic() - self.monotonic
 
 
 class AbilityChangeEvent:
     """Event that indicates an ability change."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -76,9 +102,12 @@ class AbilityChangeEvent:
 class DataChangeEvent:
     """Data Change SSE event."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -118,9 +147,12 @@ class DataChangeEvent:
 class MultiSwitchCommandEvent:
     """Command SSE event requesting to switch a list of crownstones."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -141,7 +173,7 @@ class MultiSwitchCommandEvent:
         """Return the sphere id."""
         return str(self.data["sphere"]["id"])
 
-    @property
+    @cached_property
     def crownstone_list(self) -> list[SwitchCommand]:
         """Return a list of SwitchCommand."""
         switch_list: list[SwitchCommand] = []
@@ -149,13 +181,21 @@ class MultiSwitchCommandEvent:
             switch_list.append(SwitchCommand(cmd))
         return switch_list
 
+    @cached_property
+    def switch_plan(self) -> SwitchPlan:
+        """Return the de-duplicated switch commands, compiled once."""
+        return SwitchPlan(self.data["switchData"])
+
 
 class PresenceEvent:
     """Presence SSE event."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -190,9 +230,12 @@ class PresenceEvent:
 class SwitchStateUpdateEvent:
     """A Crownstone was switched."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -232,9 +275,12 @@ class SwitchStateUpdateEvent:
 class SystemEvent:
     """System SSE event."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -264,9 +310,12 @@ class SystemEvent:
 class PingEvent:
     """Ping event that indicates the connection is alive."""
 
-    def __init__(self, data: dict[str, Any]) -> None:
+    def __init__(
+        self, data: dict[str, Any], receive_info: ReceiveInfo | None = None
+    ) -> None:
         """Initialize event."""
         self.data = data
+        self.receive_info = receive_info
 
     def __str__(self) -> str:
         """Return event data as string"""
@@ -288,6 +337,29 @@ class PingEvent:
         return int(self.data["counter"]) * 30
 
 
+class InvalidEvent:
+    """Event data rejected by validation, with the fields that are missing or of the wrong type."""
+
+    def __init__(
+        self, data: Any, errors: list[str], receive_info: ReceiveInfo | None = None
+    ) -> None:
+        """Initialize event."""
+        self.data = data
+        self.errors = errors
+        self.receive_info = receive_info
+
+    def __str__(self) -> str:
+        """Return event data as string"""
+        return json.dumps(self.data)
+
+    @property
+    def type(self) -> str:
+        """Return the event type, empty when unknown."""
+        if isinstance(self.data, dict) and isinstance(self.data.get("type"), str):
+            return str(self.data["type"])
+        return ""
+
+
 Event = Union[
     AbilityChangeEvent,
     DataChangeEvent,
@@ -296,31 +368,45 @@ Event = Union[
     SwitchStateUpdateEvent,
     PresenceEvent,
     PingEvent,
+    InvalidEvent,
     None,
 ]
 
 
-def parse_event(data: dict[str, Any]) -> Event:
-    """Return the correct Crownstone Event based on data."""
+def parse_event(
+    data: dict[str, Any],
+    receive_info: ReceiveInfo | None = None,
+    validator: EventValidator | None = None,
+) -> Event:
+    """
+    Return the correct Crownstone Event based on data, with optional receive info.
+
+    :param validator: Validate the data first, and return an InvalidEvent when it is invalid.
+    """
+    if validator is not None:
+        errors = validator.validate(data)
+        if errors is not None:
+            return InvalidEvent(data, errors, receive_info)
+
     if data["type"] == EVENT_PING:
-        return PingEvent(data)
+        return PingEvent(data, receive_info)
 
     if data["type"] == EVENT_SYSTEM:
-        return SystemEvent(data)
+        return SystemEvent(data, receive_info)
 
     if data["type"] == EVENT_COMMAND:
-        return MultiSwitchCommandEvent(data)
+        return MultiSwitchCommandEvent(data, receive_info)
 
     if data["type"] == EVENT_SWITCH_STATE_UPDATE:
-        return SwitchStateUpdateEvent(data)
+        return SwitchStateUpdateEvent(data, receive_info)
 
     if data["type"] == EVENT_DATA_CHANGE:
-        return DataChangeEvent(data)
+        return DataChangeEvent(data, receive_info)
 
     if data["type"] == EVENT_PRESENCE:
-        return PresenceEvent(data)
+        return PresenceEvent(data, receive_info)
 
     if data["type"] == EVENT_ABILITY_CHANGE:
-        return AbilityChangeEvent(data)
+        return AbilityChangeEvent(data, receive_info)
 
     return None
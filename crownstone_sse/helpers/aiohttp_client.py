@@ -4,6 +4,7 @@ from typing import Any
 
 import aiohttp
 import certifi
+from aiohttp import http_parser
 
 
 def create_client_session(**kwargs: Any) -> aiohttp.ClientSession:
@@ -31,3 +32,13 @@ def get_connector() -> aiohttp.BaseConnector:
     connector = aiohttp.TCPConnector(enable_cleanup_closed=True, ssl=client_context())
 
     return connector
+
+
+def get_accept_encoding() -> str:
+    """Return the content encodings aiohttp can decompress, for the Accept-Encoding header."""
+    encodings = ["gzip", "deflate"]
+    if getattr(http_parser, "HAS_BROTLI", False):
+        encodings.append("br")
+    if getattr(http_parser, "HAS_ZSTD", False):
+        encodings.append("zstd")
+    return ", ".join(encodings)
@@ -0,0 +1,168 @@
+"""Merge switch commands of multiple command events before executing them."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from crownstone_sse.const import EVENT_COMMAND
+from crownstone_sse.events import Event, MultiSwitchCommandEvent
+from crownstone_sse.helpers.switch_command import SwitchCommandType, SwitchCommandValue
+from crownstone_sse.util.eventbus import EventBus
+
+_SWITCH_ON_OFF = (SwitchCommandType.TURN_ON, SwitchCommandType.TURN_OFF)
+
+
+@dataclass
+class MergedCommand:
+    """A switch command for a single Crownstone, after merging."""
+
+    sphere_id: str
+    unique_id: int
+    cloud_id: str
+    value: SwitchCommandValue
+
+
+@dataclass
+class MergeStats:
+    """Statistics of the command merger."""
+
+    events: int = 0
+    commands_received: int = 0
+    commands_emitted: int = 0
+    flushes: int = 0
+    immediate_flushes: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def commands_merged(self) -> int:
+        """Return the amount of commands replaced by a later command."""
+        return self.commands_received - self.commands_emitted
+
+    @property
+    def mean_latency(self) -> float:
+        """Return the mean time between the first command of a set and its flush."""
+        return self.total_latency / self.flushes if self.flushes else 0.0
+
+
+class CommandMerger:
+    """
+    Collect switch commands across command events, and emit them as one set.
+
+    Commands for the same Crownstone are merged, the latest command wins.
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[list[MergedCommand]], Any],
+        window: float = 0.1,
+        flush_on_switch: bool = True,
+    ) -> None:
+        """
+        Initialize the merger.
+
+        :param on_flush: Called with the consolidated commands.
+        :param window: Time in seconds to collect commands after the first pending command.
+        :param flush_on_switch: Flush immediately when a command turns a Crownstone on or off.
+        """
+        self._on_flush = on_flush
+        self._window = window
+        self._flush_on_switch = flush_on_switch
+        # (sphere id, unique id) -> command, in order of the last command
+        self._pending: dict[tuple[str, int], MergedCommand] = {}
+        self._first_pending: float | None = None
+        self._timer: asyncio.TimerHandle | threading.Timer | None = None
+        self._lock = threading.Lock()
+        self.stats = MergeStats()
+
+    def listen_to(self, bus: EventBus) -> Callable[[], None]:
+        """
+        Merge command events from an event bus, return function to stop.
+
+        When called within a running event loop, events are added on that loop,
+        so the window timer runs on it. Otherwise events are added directly in
+        the thread firing them, and the window timer runs in a thread.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # a coroutine listener would never be awaited by a bus fired without a loop
+            return bus.add_event_listener(EVENT_COMMAND, self.add_event)
+
+        async def async_add_event(event: Event) -> None:
+            """Add the event within the event loop."""
+            self.add_event(event)
+
+        return bus.add_event_listener(EVENT_COMMAND, async_add_event)
+
+    def add_event(self, event: Event) -> None:
+        """Add the switch commands of a multi switch command event."""
+        if not isinstance(event, MultiSwitchCommandEvent):
+            return
+
+        plan = event.switch_plan
+        sphere_id = event.sphere_id
+        flush_now = False
+
+        with self._lock:
+            self.stats.events += 1
+            self.stats.commands_received += len(event.data["switchData"])
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+
+            for index in range(len(plan)):
+                action = SwitchCommandType(plan.actions[index])
+                key = (sphere_id, plan.unique_ids[index])
+                self._pending.pop(key, None)
+                self._pending[key] = MergedCommand(
+                    sphere_id,
+                    plan.unique_ids[index],
+                    plan.cloud_ids[index],
+                    SwitchCommandValue(action, plan.percentages[index]),
+                )
+                if self._flush_on_switch and action in _SWITCH_ON_OFF:
+                    flush_now = True
+
+            if flush_now:
+                self.stats.immediate_flushes += 1
+            elif self._timer is None:
+                self._start_timer()
+
+        if flush_now:
+            self.flush()
+
+    def flush(self) -> None:
+        """Emit all pending commands now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                self._first_pending = None
+                return
+
+            commands = list(self._pending.values())
+            self._pending.clear()
+            latency = time.monotonic() - (self._first_pending or time.monotonic())
+            self._first_pending = None
+
+            self.stats.flushes += 1
+            self.stats.commands_emitted += len(commands)
+            self.stats.total_latency += latency
+            self.stats.max_latency = max(self.stats.max_latency, latency)
+
+        self._on_flush(commands)
+
+    def _start_timer(self) -> None:
+        """Flush after the window, on the event loop when running in one."""
+        try:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self._window, self.flush)
+        except RuntimeError:
+            timer = threading.Timer(self._window, self.flush)
+            timer.daemon = True
+            timer.start()
+            self._timer = timer
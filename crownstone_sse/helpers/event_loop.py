@@ -0,0 +1,68 @@
+"""Select and run the event loop of a client, using uvloop when installed."""
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import Any, Callable, Coroutine, TypeVar
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover
+    uvloop = None
+
+_T = TypeVar("_T")
+
+LoopFactory = Callable[[], asyncio.AbstractEventLoop]
+
+
+def get_loop_factory(
+    loop_factory: LoopFactory | None = None, allow_uvloop: bool = True
+) -> LoopFactory:
+    """
+    Return the factory to create event loops with.
+
+    :param loop_factory: Factory to use. When None, uvloop is used if installed and allowed,
+        otherwise the default asyncio event loop.
+    :param allow_uvloop: Use uvloop when no factory is given and it is installed.
+    """
+    if loop_factory is not None:
+        return loop_factory
+    if allow_uvloop and uvloop is not None:
+        return uvloop.new_event_loop  # type: ignore[no-any-return]
+    return asyncio.new_event_loop
+
+
+def run(
+    main: Coroutine[Any, Any, _T],
+    loop_factory: LoopFactory | None = None,
+    allow_uvloop: bool = True,
+) -> _T:
+    """Run a coroutine like asyncio.run, on an event loop from get_loop_factory."""
+    factory = get_loop_factory(loop_factory, allow_uvloop)
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(main)
+
+    loop = factory()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            _cancel_all_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            if sys.version_info >= (3, 9):
+                loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def _cancel_all_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    """Cancel the tasks left on a loop, and wait for them to finish."""
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    if not tasks:
+        return
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
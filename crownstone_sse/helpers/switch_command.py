@@ -43,18 +43,25 @@ class SwitchCommand:
     @property
     def switch_val(self) -> SwitchCommandValue:
         """Return the switch value based on the type."""
-        if self.data["type"] == "TURN_ON":
-            return SwitchCommandValue(SwitchCommandType.TURN_ON)
+        return SwitchCommandValue(*parse_switch_value(self.data))
 
-        if self.data["type"] == "TURN_OFF":
-            return SwitchCommandValue(SwitchCommandType.TURN_OFF)
 
-        if self.data["type"] == "PERCENTAGE":
-            percentage = int(self.data["percentage"])
-            if percentage < 0:
-                percentage = 0
-            if percentage > 100:
-                percentage = 100
-            return SwitchCommandValue(SwitchCommandType.PERCENTAGE, percentage)
+_SWITCH_TYPES = {
+    "TURN_ON": SwitchCommandType.TURN_ON,
+    "TURN_OFF": SwitchCommandType.TURN_OFF,
+    "PERCENTAGE": SwitchCommandType.PERCENTAGE,
+}
 
-        return SwitchCommandValue(SwitchCommandType.UNKNOWN)
+
+def parse_switch_value(data: dict[str, Any]) -> tuple[SwitchCommandType, int]:
+    """Return the switch type and the percentage clamped to 0-100 of a command."""
+    switch_type = _SWITCH_TYPES.get(data["type"], SwitchCommandType.UNKNOWN)
+    if switch_type is not SwitchCommandType.PERCENTAGE:
+        return switch_type, 0
+
+    percentage = int(data["percentage"])
+    if percentage < 0:
+        percentage = 0
+    if percentage > 100:
+        percentage = 100
+    return switch_type, percentage
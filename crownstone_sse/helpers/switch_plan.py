@@ -0,0 +1,66 @@
+"""Compiled plan of the switch commands in a multi switch command event."""
+from __future__ import annotations
+
+from array import array
+from typing import Any, Iterator, Sequence
+
+from crownstone_sse.helpers.switch_command import (
+    SwitchCommandType,
+    parse_switch_value,
+)
+
+
+class SwitchPlan:
+    """
+    Compact, de-duplicated plan of switch commands.
+
+    Commands are stored in parallel arrays, with only the last command per unique id.
+    Commands with the same action are stored next to each other, in order of arrival.
+    """
+
+    def __init__(self, switch_data: Sequence[dict[str, Any]]) -> None:
+        """Compile the switchData entries of a multi switch command event."""
+        # unique id -> (cloud id, action, percentage), last command wins
+        latest: dict[int, tuple[str, SwitchCommandType, int]] = {}
+        for cmd in switch_data:
+            unique_id = int(cmd["uid"])
+            action, percentage = parse_switch_value(cmd)
+            # re-insert, so the order reflects the last command per unique id
+            latest.pop(unique_id, None)
+            latest[unique_id] = (str(cmd["id"]), action, percentage)
+
+        self.unique_ids = array("l")
+        self.cloud_ids: list[str] = []
+        self.actions = array("b")
+        self.percentages = array("b")
+        self._groups: dict[SwitchCommandType, tuple[int, int]] = {}
+
+        for action in SwitchCommandType:
+            start = len(self.unique_ids)
+            for unique_id, (cloud_id, cmd_action, percentage) in latest.items():
+                if cmd_action is action:
+                    self.unique_ids.append(unique_id)
+                    self.cloud_ids.append(cloud_id)
+                    self.actions.append(action.value)
+                    self.percentages.append(percentage)
+            if len(self.unique_ids) > start:
+                self._groups[action] = (start, len(self.unique_ids))
+
+    def __len__(self) -> int:
+        """Return the amount of commands in the plan."""
+        return len(self.unique_ids)
+
+    @property
+    def group_actions(self) -> list[SwitchCommandType]:
+        """Return the actions that have commands in this plan."""
+        return list(self._groups)
+
+    def group(self, action: SwitchCommandType) -> range:
+        """Return the indices of the commands with an action."""
+        start, end = self._groups.get(action, (0, 0))
+        return range(start, end)
+
+    def iter_group(self, action: SwitchCommandType) -> Iterator[tuple[int, str, int]]:
+        """Yield (unique id, cloud id, percentage) of the commands with an action."""
+        for index in self.group(action):
+            yield self.unique_ids[index], self.cloud_ids[index], self.percentages[index]
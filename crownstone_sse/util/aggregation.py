@@ -0,0 +1,199 @@
+"""
+Incremental windowed aggregation over the event stream.
+
+Events are counted per key in panes. A tumbling window consists of a single pane,
+a sliding window of size/slide panes. Updating a count is O(1) per event,
+windows are emitted as compact records once they are closed.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterable, Callable, Hashable, NamedTuple, Sequence, Union
+
+from crownstone_sse.events import Event
+from crownstone_sse.util.eventbus import EventBus
+
+_LOGGER = logging.getLogger(__name__)
+
+KeyType = Union[str, Sequence[str], Callable[[Event], Hashable]]
+
+
+class WindowRecord(NamedTuple):
+    """Count of events for a key in a closed window."""
+
+    start: float
+    end: float
+    key: Hashable
+    count: int
+
+
+def key_function(key: KeyType) -> Callable[[Event], Hashable]:
+    """Return a function extracting the key of an event, from attribute name(s) or a function."""
+    if callable(key):
+        return key
+    if isinstance(key, str):
+        name = key
+        return lambda event: getattr(event, name)
+    names = tuple(key)
+    return lambda event: tuple(getattr(event, name) for name in names)
+
+
+class WindowedAggregator:
+    """Count events per key in tumbling or sliding time windows."""
+
+    def __init__(
+        self,
+        size: float,
+        slide: float | None = None,
+        key: KeyType = "type",
+        on_window: Callable[[list[WindowRecord]], Any] | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Initialize the aggregator.
+
+        :param size: Window size in seconds.
+        :param slide: Time in seconds between the start of sliding windows.
+            Must divide the size. Windows are tumbling when None.
+        :param key: Event property name, tuple of property names,
+            or a function returning the key of an event.
+        :param on_window: Called with the records of every closed window, holding the lock
+            of the aggregator. When None, records are kept until retrieved with drain().
+        :param clock: Time source for events without explicit time.
+        """
+        slide = size if slide is None else slide
+        panes = size / slide
+        if slide <= 0 or abs(panes - round(panes)) > 1e-9:
+            raise ValueError("Window size must be a multiple of the slide.")
+
+        self._size = size
+        self._slide = slide
+        self._panes_per_window = int(round(panes))
+        self._key = key_function(key)
+        self._on_window = on_window
+        self._clock = clock
+
+        # counts of the closed panes still part of an open window, oldest first
+        self._panes: deque[dict[Hashable, int]] = deque(
+            maxlen=self._panes_per_window - 1 or None
+        )
+        self._pane_start: float | None = None
+        self._counts: dict[Hashable, int] = {}
+        self._closed: list[WindowRecord] = []
+        self.late_events = 0
+        self.skipped_events = 0
+        # the event bus runs process in executor threads
+        self._lock = threading.RLock()
+
+    def listen_to(self, bus: EventBus, *event_types: str) -> Callable[[], None]:
+        """Aggregate events of the given types from an event bus, return function to stop."""
+        removers = [
+            bus.add_event_listener(event_type, self.process) for event_type in event_types
+        ]
+
+        def remove_listeners() -> None:
+            """Stop listening to the event bus."""
+            for remove in removers:
+                remove()
+
+        return remove_listeners
+
+    async def async_run(self, source: AsyncIterable[Event]) -> None:
+        """Aggregate all events from an async source, like CrownstoneSSEAsync."""
+        async for event in source:
+            if event is not None:
+                self.process(event)
+        self.flush()
+
+    def process(self, event: Event, timestamp: float | None = None) -> None:
+        """Count a single event."""
+        if timestamp is None:
+            timestamp = self._clock()
+
+        try:
+            key = self._key(event)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            with self._lock:
+                self.skipped_events += 1
+            return
+
+        with self._lock:
+            if self._pane_start is None:
+                self._pane_start = self._floor(timestamp)
+            elif timestamp >= self._pane_start + self._slide:
+                self.advance(timestamp)
+            elif timestamp < self._pane_start:
+                self.late_events += 1
+                return
+
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def advance(self, now: float | None = None) -> None:
+        """Close all windows that ended before a time, also without new events."""
+        if now is None:
+            now = self._clock()
+        with self._lock:
+            if self._pane_start is None:
+                return
+
+            target = self._floor(now)
+            while self._pane_start < target:
+                self._close_pane()
+                # skip ahead over empty panes once no window has data anymore
+                if not self._counts and not any(self._panes):
+                    self._panes.clear()
+                    self._pane_start = target
+                    break
+
+    def flush(self) -> None:
+        """Close all open windows, including the current one."""
+        with self._lock:
+            if self._pane_start is None:
+                return
+            for _ in range(self._panes_per_window):
+                self._close_pane()
+            self._panes.clear()
+            self._pane_start = None
+
+    def drain(self) -> list[WindowRecord]:
+        """Return and forget the records of closed windows, when no callback is used."""
+        with self._lock:
+            closed = self._closed
+            self._closed = []
+        return closed
+
+    def _floor(self, timestamp: float) -> float:
+        """Return the start of the pane a time falls in."""
+        return math.floor(timestamp / self._slide) * self._slide
+
+    def _close_pane(self) -> None:
+        """Close the current pane, and emit the window ending with it. Must hold the lock."""
+        assert self._pane_start is not None
+        end = self._pane_start + self._slide
+        start = end - self._size
+
+        if self._panes:
+            totals = dict(self._counts)
+            for pane in self._panes:
+                for key, count in pane.items():
+                    totals[key] = totals.get(key, 0) + count
+        else:
+            totals = self._counts
+
+        if totals:
+            records = [
+                WindowRecord(start, end, key, count) for key, count in totals.items()
+            ]
+            if self._on_window is not None:
+                self._on_window(records)
+            else:
+                self._closed.extend(records)
+
+        if self._panes_per_window > 1:
+            self._panes.append(self._counts)
+        self._counts = {}
+        self._pane_start = end
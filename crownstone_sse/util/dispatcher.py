@@ -0,0 +1,271 @@
+"""
+Key-partitioned parallel dispatch of SSE events.
+
+Events are hashed by a key, like the sphere id, to one of N shards. Every shard
+runs the listeners of its events one after the other, in the order they were fired,
+while the shards run in parallel. Events without the key go to the first shard.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import operator
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Hashable, List, Tuple, Union
+
+from crownstone_sse.events import Event
+from crownstone_sse.util.eventbus import EventBus
+from crownstone_sse.util.metrics import DispatcherMetrics, MetricSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+KEY_SPHERE_ID = "sphere_id"
+KEY_CLOUD_ID = "cloud_id"
+KEY_USER_ID = "user_id"
+
+MODE_TASKS = "tasks"
+MODE_THREADS = "threads"
+
+KeyFunction = Callable[[Event], Union[Hashable, None]]
+
+# listeners and the event to run them with
+_Item = Tuple[List[Any], Event]
+
+# stops a shard after the events queued before it
+_STOP = object()
+
+
+class ShardedDispatcher(EventBus):
+    """
+    Event bus running listeners in parallel shards, in order per key.
+
+    In tasks mode, every shard is a task on an event loop. Coroutine listeners are awaited,
+    sync listeners run in the default executor, one at a time per shard.
+    In threads mode, every shard is a thread calling sync listeners directly.
+    Coroutine listeners run on the loop passed to the dispatcher, or else on an event loop of the shard.
+    """
+
+    def __init__(
+        self,
+        shards: int = 4,
+        key: str | KeyFunction = KEY_SPHERE_ID,
+        mode: str = MODE_TASKS,
+        loop: asyncio.AbstractEventLoop | None = None,
+        metrics: bool = False,
+    ) -> None:
+        """
+        Initialize the dispatcher.
+
+        :param shards: Amount of shards running in parallel.
+        :param key: Event attribute to partition by, like sphere_id, cloud_id or user_id,
+            or a function returning the key of an event.
+        :param mode: Run the shards as tasks or as threads.
+        :param loop: In tasks mode, event loop to run the shards on.
+            By default, the loop running when the first event is fired.
+            In threads mode, event loop to run coroutine listeners on.
+        :param metrics: Collect metrics of fired events and shard queues, readable with metrics().
+        """
+        if shards < 1:
+            raise ValueError("A dispatcher requires at least one shard.")
+        if mode not in (MODE_TASKS, MODE_THREADS):
+            raise ValueError(f"Unknown dispatcher mode {mode}.")
+        super().__init__(loop=loop, metrics=False)
+        self._metrics = DispatcherMetrics() if metrics else None
+        self._shard_count = shards
+        self._key: KeyFunction = (
+            operator.attrgetter(key) if isinstance(key, str) else key
+        )
+        self._mode = mode
+        self._closed = False
+
+        # tasks mode, created on the loop of the shards
+        self._worker_loop: asyncio.AbstractEventLoop | None = None
+        self._queues: list[asyncio.Queue[Any]] = []
+        self._workers: list[asyncio.Task[None]] = []
+
+        # threads mode
+        self._thread_queues: list[queue.Queue[Any]] = []
+        self._threads: list[threading.Thread] = []
+        if mode == MODE_THREADS:
+            self._thread_queues = [queue.Queue() for _ in range(shards)]
+            self._threads = [
+                threading.Thread(
+                    target=self._run_shard_thread,
+                    args=(shard_queue,),
+                    name=f"crownstone-sse-shard-{index}",
+                    daemon=True,
+                )
+                for index, shard_queue in enumerate(self._thread_queues)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def metrics(self) -> dict[str, MetricSnapshot] | None:
+        """Return a snapshot of the metrics, or None when metrics are disabled."""
+        if self._metrics is None:
+            return None
+        for shard, depth in enumerate(self.queue_depths()):
+            self._metrics.queue_depth.set(depth, labels=(str(shard),))
+        return self._metrics.snapshot()
+
+    def queue_depths(self) -> list[int]:
+        """Return the amount of events waiting per shard."""
+        if self._mode == MODE_THREADS:
+            return [shard_queue.qsize() for shard_queue in self._thread_queues]
+        if not self._queues:
+            return [0] * self._shard_count
+        return [shard_queue.qsize() for shard_queue in self._queues]
+
+    def shard_of(self, event: Event) -> int:
+        """Return the shard of an event."""
+        try:
+            key = self._key(event)
+        except (AttributeError, KeyError, TypeError):
+            key = None
+        if key is None:
+            return 0
+        return zlib.crc32(str(key).encode()) % self._shard_count
+
+    def fire(self, event_type: str, event: Event) -> None:
+        """Queue the listeners of an event on the shard of its key."""
+        if self._closed:
+            _LOGGER.warning("Dispatcher is shut down, dropping event.")
+            return
+
+        metrics = self._metrics
+        if metrics is not None:
+            started = time.perf_counter()
+
+        listeners = list(self._event_listeners.get(event_type, []))
+        shard = self.shard_of(event)
+        if listeners:
+            item: _Item = (listeners, event)
+            if self._mode == MODE_THREADS:
+                self._thread_queues[shard].put(item)
+            else:
+                self._put_on_loop(shard, item)
+
+        if metrics is not None:
+            metrics.events_fired.inc(labels=(event_type,))
+            metrics.listener_calls.inc(len(listeners), labels=(event_type,))
+            metrics.shard_events.inc(labels=(str(shard),))
+            metrics.dispatch_seconds.observe(time.perf_counter() - started)
+
+    def shutdown(self) -> None:
+        """
+        Stop the shards after the events queued so far.
+
+        In threads mode, wait for the shard threads to finish.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._mode == MODE_THREADS:
+            for shard_queue in self._thread_queues:
+                shard_queue.put(_STOP)
+            current = threading.current_thread()
+            for thread in self._threads:
+                if thread is not current:
+                    thread.join()
+            return
+
+        if self._worker_loop is not None:
+            for shard in range(self._shard_count):
+                self._put_on_loop(shard, _STOP)
+
+    async def async_shutdown(self) -> None:
+        """Stop the shards after the events queued so far, and wait for them to finish."""
+        if self._mode == MODE_THREADS:
+            await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+            return
+
+        self.shutdown()
+        if self._workers and self._worker_loop is asyncio.get_running_loop():
+            await asyncio.gather(*self._workers)
+
+    def _put_on_loop(self, shard: int, item: Any) -> None:
+        """Queue an item on a shard task, starting the shard tasks on first use."""
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if self._worker_loop is None:
+            loop = self._loop or running_loop
+            if loop is None:
+                raise RuntimeError(
+                    "A dispatcher in tasks mode requires a loop, or to be fired from a running loop."
+                )
+            self._worker_loop = loop
+            if running_loop is loop:
+                self._start_workers()
+            else:
+                loop.call_soon_threadsafe(self._start_workers)
+
+        if running_loop is self._worker_loop:
+            self._start_workers()
+            self._queues[shard].put_nowait(item)
+        else:
+            # the queues are created by the first callback, and callbacks run in order
+            self._worker_loop.call_soon_threadsafe(
+                lambda: self._queues[shard].put_nowait(item)
+            )
+
+    def _start_workers(self) -> None:
+        """Create the shard queues and tasks, on the loop of the shards."""
+        if self._queues:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self._shard_count)]
+        self._workers = [
+            asyncio.create_task(self._run_shard(shard_queue)) for shard_queue in self._queues
+        ]
+
+    async def _run_shard(self, shard_queue: asyncio.Queue[Any]) -> None:
+        """Run the listeners of queued events in order, until stopped."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await shard_queue.get()
+            if item is _STOP:
+                return
+            listeners, event = item
+            for listener in listeners:
+                try:
+                    if asyncio.iscoroutine(listener):
+                        await listener
+                    elif asyncio.iscoroutinefunction(listener):
+                        await listener(event)
+                    else:
+                        await loop.run_in_executor(None, listener, event)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error in event listener.")
+
+    def _run_shard_thread(self, shard_queue: queue.Queue[Any]) -> None:
+        """Run the listeners of queued events in order, until stopped."""
+        shard_loop: asyncio.AbstractEventLoop | None = None
+        while True:
+            item = shard_queue.get()
+            if item is _STOP:
+                break
+            listeners, event = item
+            for listener in listeners:
+                try:
+                    if asyncio.iscoroutine(listener) or asyncio.iscoroutinefunction(
+                        listener
+                    ):
+                        coro = listener if asyncio.iscoroutine(listener) else listener(event)
+                        if self._loop is not None:
+                            asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+                        else:
+                            if shard_loop is None:
+                                shard_loop = asyncio.new_event_loop()
+                            shard_loop.run_until_complete(coro)
+                    else:
+                        listener(event)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error in event listener.")
+
+        if shard_loop is not None:
+            shard_loop.close()
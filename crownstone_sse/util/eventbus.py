@@ -3,9 +3,12 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import threading
+import time
 from typing import Any, Awaitable, Callable
 
 from crownstone_sse.events import Event
+from crownstone_sse.util.metrics import EventBusMetrics, MetricSnapshot
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -13,9 +16,28 @@ _LOGGER = logging.getLogger(__name__)
 class EventBus:
     """Event bus that listens to - and fires SSE events."""
 
-    def __init__(self) -> None:
-        """Initialize the event bus."""
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop | None = None, metrics: bool = False
+    ) -> None:
+        """
+        Initialize the event bus.
+
+        :param loop: Event loop to run coroutine listeners on.
+            When firing from another thread, coroutines are handed over to this loop
+            in batches, one wakeup of the loop per batch.
+        :param metrics: Collect metrics of fired events, readable with metrics().
+        """
         self._event_listeners: dict[str, list[Any]] = {}
+        self._loop = loop
+        self._pending: list[tuple[Any, Event]] = []
+        self._pending_lock = threading.Lock()
+        self._metrics = EventBusMetrics() if metrics else None
+
+    def metrics(self) -> dict[str, MetricSnapshot] | None:
+        """Return a snapshot of the metrics, or None when metrics are disabled."""
+        if self._metrics is None:
+            return None
+        return self._metrics.snapshot()
 
     def get_event_listeners(self) -> dict[str, int]:
         """Return all current event listeners and amount of events."""
@@ -39,20 +61,87 @@ class EventBus:
 
     def fire(self, event_type: str, event: Event) -> None:
         """Fire an event."""
-        for listener in self._event_listeners.get(event_type, []):
+        metrics = self._metrics
+        if metrics is not None:
+            started = time.perf_counter()
+
+        listeners = self._event_listeners.get(event_type, [])
+        for listener in listeners:
+            if self._loop is not None and (
+                asyncio.iscoroutine(listener) or asyncio.iscoroutinefunction(listener)
+            ):
+                self._fire_on_target_loop(listener, event)
+                continue
+
             try:
                 loop = asyncio.get_running_loop()
-                # async context only, when an event loop is running
-                if asyncio.iscoroutine(listener):
-                    asyncio.create_task(listener)
-                elif asyncio.iscoroutinefunction(listener):
-                    asyncio.create_task(listener(event))
-                else:
-                    loop.run_in_executor(None, listener, event)
-
             except RuntimeError:
                 # no running loop, just call the function normally
                 listener(event)
+                continue
+
+            # async context only, when an event loop is running
+            self._schedule(loop, listener, event)
+
+        if metrics is not None:
+            metrics.events_fired.inc(labels=(event_type,))
+            metrics.listener_calls.inc(len(listeners), labels=(event_type,))
+            metrics.dispatch_seconds.observe(time.perf_counter() - started)
+
+    def _schedule(
+        self, loop: asyncio.AbstractEventLoop, listener: Any, event: Event
+    ) -> None:
+        """Run a listener on the running event loop."""
+        if asyncio.iscoroutine(listener):
+            asyncio.create_task(listener)
+        elif asyncio.iscoroutinefunction(listener):
+            asyncio.create_task(listener(event))
+        else:
+            loop.run_in_executor(None, listener, event)
+
+    def _fire_on_target_loop(self, listener: Any, event: Event) -> None:
+        """Run a coroutine listener on the target event loop."""
+        assert self._loop is not None
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._create_listener_task(listener, event)
+            return
+
+        # only wake up the target loop for the first event of a batch
+        with self._pending_lock:
+            schedule = not self._pending
+            self._pending.append((listener, event))
+
+        if schedule:
+            if self._metrics is not None:
+                self._metrics.handovers.inc()
+            try:
+                self._loop.call_soon_threadsafe(self._dispatch_pending)
+            except RuntimeError:
+                _LOGGER.warning("Target event loop is closed, dropping events.")
+                with self._pending_lock:
+                    self._pending.clear()
+
+    def _dispatch_pending(self) -> None:
+        """Create tasks for all listeners handed over since the last wakeup."""
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = []
+
+        for listener, event in pending:
+            self._create_listener_task(listener, event)
+
+    @staticmethod
+    def _create_listener_task(listener: Any, event: Event) -> None:
+        """Create a task for a coroutine (function) listener."""
+        if asyncio.iscoroutine(listener):
+            asyncio.create_task(listener)
+        else:
+            asyncio.create_task(listener(event))
 
     def _remove_event_listener(
         self, event_type: str, listener: Callable[..., Any] | Awaitable[Any]
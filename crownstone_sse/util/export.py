@@ -0,0 +1,362 @@
+"""
+Columnar batch export of events.
+
+Events are converted into one column per field, grouped by event type.
+Id and name strings are dictionary encoded. Every column has a validity bitmap,
+in the Arrow layout, marking the rows that have a value. Batches can be exported
+as NumPy masked structured arrays or Arrow record batches when those are installed.
+"""
+from __future__ import annotations
+
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from crownstone_sse.const import (
+    EVENT_ABILITY_CHANGE,
+    EVENT_COMMAND,
+    EVENT_DATA_CHANGE,
+    EVENT_PING,
+    EVENT_PRESENCE,
+    EVENT_SWITCH_STATE_UPDATE,
+    EVENT_SYSTEM,
+)
+from crownstone_sse.events import Event, ReceiveInfo
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+# column kinds, with their array typecode and NumPy dtype
+KIND_STRING = "string"
+KIND_INT = "int"
+KIND_FLOAT = "float"
+KIND_BOOL = "bool"
+
+_TYPECODES = {KIND_STRING: "i", KIND_INT: "q", KIND_FLOAT: "d", KIND_BOOL: "b"}
+_DTYPES = {KIND_STRING: "i4", KIND_INT: "i8", KIND_FLOAT: "f8", KIND_BOOL: "?"}
+
+# stored for missing strings and integers, missing floats are NaN
+# missing values are marked in the validity bitmap, as -1 can be a valid value
+MISSING = -1
+
+RECEIVE_TIME = "receive_time"
+GENERATION = "generation"
+SEQUENCE = "sequence"
+
+# event type -> columns of (name, kind, path in the event data)
+COLUMNS: dict[str, list[tuple[str, str, tuple[str, ...]]]] = {
+    EVENT_SWITCH_STATE_UPDATE: [
+        ("sub_type", KIND_STRING, ("subType",)),
+        ("sphere_id", KIND_STRING, ("sphere", "id")),
+        ("cloud_id", KIND_STRING, ("crownstone", "id")),
+        ("uid", KIND_INT, ("crownstone", "uid")),
+        ("percentage", KIND_INT, ("crownstone", "percentage")),
+    ],
+    EVENT_PRESENCE: [
+        ("sub_type", KIND_STRING, ("subType",)),
+        ("sphere_id", KIND_STRING, ("sphere", "id")),
+        ("location_id", KIND_STRING, ("location", "id")),
+        ("user_id", KIND_STRING, ("user", "id")),
+    ],
+    EVENT_ABILITY_CHANGE: [
+        ("sub_type", KIND_STRING, ("subType",)),
+        ("sphere_id", KIND_STRING, ("sphere", "id")),
+        ("cloud_id", KIND_STRING, ("stone", "id")),
+        ("uid", KIND_INT, ("stone", "uid")),
+        ("ability_type", KIND_STRING, ("ability", "type")),
+        ("enabled", KIND_BOOL, ("ability", "enabled")),
+        ("synced_to_crownstone", KIND_BOOL, ("ability", "syncedToCrownstone")),
+    ],
+    EVENT_DATA_CHANGE: [
+        ("sub_type", KIND_STRING, ("subType",)),
+        ("operation", KIND_STRING, ("operation",)),
+        ("sphere_id", KIND_STRING, ("sphere", "id")),
+        ("item_id", KIND_STRING, ("changedItem", "id")),
+        ("item_name", KIND_STRING, ("changedItem", "name")),
+    ],
+    # a row per switched Crownstone, paths are relative to the switchData entry
+    EVENT_COMMAND: [
+        ("sub_type", KIND_STRING, ("..", "subType")),
+        ("sphere_id", KIND_STRING, ("..", "sphere", "id")),
+        ("cloud_id", KIND_STRING, ("id",)),
+        ("uid", KIND_INT, ("uid",)),
+        ("switch_type", KIND_STRING, ("type",)),
+        ("percentage", KIND_INT, ("percentage",)),
+    ],
+    EVENT_SYSTEM: [
+        ("sub_type", KIND_STRING, ("subType",)),
+        ("code", KIND_INT, ("code",)),
+        ("message", KIND_STRING, ("message",)),
+    ],
+    EVENT_PING: [
+        ("counter", KIND_INT, ("counter",)),
+    ],
+}
+
+
+@dataclass
+class ColumnBatch:
+    """Columns of a single event type."""
+
+    event_type: str
+    kinds: dict[str, str]
+    columns: dict[str, Any]
+    # column name -> strings, indexed by the codes in the column
+    dictionaries: dict[str, list[str]] = field(default_factory=dict)
+    # column name -> validity bitmap, bit i (least significant first) is set when row i has a value
+    validity: dict[str, bytearray] = field(default_factory=dict)
+    # column name -> amount of missing values
+    null_counts: dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        """Return the amount of rows."""
+        return len(self.columns[RECEIVE_TIME])
+
+    def is_valid(self, name: str, row: int) -> bool:
+        """Return whether a row has a value in a column."""
+        return bool(self.validity[name][row >> 3] & (1 << (row & 7)))
+
+    def decode(self, name: str) -> list[str | None]:
+        """Return the strings of a dictionary encoded column."""
+        values = self.dictionaries[name]
+        return [
+            values[code] if self.is_valid(name, row) else None
+            for row, code in enumerate(self.columns[name])
+        ]
+
+
+def _lookup(data: Any, path: tuple[str, ...]) -> Any:
+    """Return the value at a path in nested event data, or None."""
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+        if data is None:
+            return None
+    return data
+
+
+class _TypeBuilder:
+    """Accumulates the columns of a single event type."""
+
+    def __init__(self, event_type: str) -> None:
+        """Initialize empty columns."""
+        self.event_type = event_type
+        self.spec = COLUMNS[event_type]
+        self.kinds = {name: kind for name, kind, _ in self.spec}
+        self.kinds[RECEIVE_TIME] = KIND_FLOAT
+        self.kinds[GENERATION] = KIND_INT
+        self.kinds[SEQUENCE] = KIND_INT
+        self.columns = {
+            name: array(_TYPECODES[kind]) for name, kind in self.kinds.items()
+        }
+        self.encoders: dict[str, dict[str, int]] = {
+            name: {} for name, kind in self.kinds.items() if kind == KIND_STRING
+        }
+        self.validity = {name: bytearray() for name in self.kinds}
+        self.null_counts = dict.fromkeys(self.kinds, 0)
+        self.rows = 0
+
+    def add_row(
+        self,
+        data: dict[str, Any],
+        parent: dict[str, Any],
+        receive_time: float,
+        receive_info: ReceiveInfo | None,
+    ) -> None:
+        """Add a row from (nested) event data."""
+        row = self.rows
+        self.rows += 1
+        byte = row >> 3
+        bit = 1 << (row & 7)
+        validity = self.validity
+        if bit == 1:
+            for bitmap in validity.values():
+                bitmap.append(0)
+
+        for name, kind, path in self.spec:
+            if path[0] == "..":
+                value = _lookup(parent, path[1:])
+            else:
+                value = _lookup(data, path)
+
+            column = self.columns[name]
+            if value is None:
+                column.append(float("nan") if kind == KIND_FLOAT else MISSING)
+                self.null_counts[name] += 1
+                continue
+
+            validity[name][byte] |= bit
+            if kind == KIND_STRING:
+                encoder = self.encoders[name]
+                text = str(value)
+                code = encoder.get(text)
+                if code is None:
+                    code = len(encoder)
+                    encoder[text] = code
+                column.append(code)
+            elif kind == KIND_INT:
+                column.append(int(value))
+            elif kind == KIND_FLOAT:
+                column.append(float(value))
+            else:
+                column.append(bool(value))
+
+        self.columns[RECEIVE_TIME].append(receive_time)
+        validity[RECEIVE_TIME][byte] |= bit
+        if receive_info is None:
+            self.columns[GENERATION].append(MISSING)
+            self.columns[SEQUENCE].append(MISSING)
+            self.null_counts[GENERATION] += 1
+            self.null_counts[SEQUENCE] += 1
+        else:
+            self.columns[GENERATION].append(receive_info.generation)
+            self.columns[SEQUENCE].append(receive_info.sequence)
+            validity[GENERATION][byte] |= bit
+            validity[SEQUENCE][byte] |= bit
+
+    def build(self) -> ColumnBatch:
+        """Return the accumulated columns."""
+        return ColumnBatch(
+            self.event_type,
+            self.kinds,
+            self.columns,
+            {name: list(encoder) for name, encoder in self.encoders.items()},
+            self.validity,
+            self.null_counts,
+        )
+
+
+class EventColumnBuilder:
+    """Convert batches of events into columns per event type."""
+
+    def __init__(self) -> None:
+        """Initialize an empty builder."""
+        self._builders: dict[str, _TypeBuilder] = {}
+
+    def append(self, event: Event, receive_time: float | None = None) -> None:
+        """
+        Add an event.
+
+        :param event: Event to add.
+        :param receive_time: Wall clock time the event was received.
+            Defaults to the receive info of the event, or now.
+        """
+        if event is None or not isinstance(event.data, dict):
+            return
+        event_type = event.data.get("type")
+        if event_type not in COLUMNS:
+            return
+        receive_info = event.receive_info
+        if receive_time is None:
+            receive_time = receive_info.wall if receive_info is not None else time.time()
+
+        builder = self._builders.get(event_type)
+        if builder is None:
+            builder = _TypeBuilder(event_type)
+            self._builders[event_type] = builder
+
+        if event_type == EVENT_COMMAND:
+            for entry in event.data.get("switchData", []):
+                builder.add_row(entry, event.data, receive_time, receive_info)
+        else:
+            builder.add_row(event.data, event.data, receive_time, receive_info)
+
+    def extend(self, events: Iterable[Event]) -> None:
+        """Add multiple events, received now when they have no receive info."""
+        receive_time = time.time()
+        for event in events:
+            if event is not None and event.receive_info is not None:
+                self.append(event)
+            else:
+                self.append(event, receive_time)
+
+    def to_columns(self) -> dict[str, ColumnBatch]:
+        """Return the columns per event type, as arrays of the array module."""
+        return {
+            event_type: builder.build() for event_type, builder in self._builders.items()
+        }
+
+    def to_numpy(self) -> dict[str, tuple[Any, dict[str, list[str]]]]:
+        """
+        Return a NumPy masked structured array and the string dictionaries per event type.
+
+        Missing values are masked.
+        """
+        if np is None:
+            raise ImportError("NumPy is not installed.")
+
+        result: dict[str, tuple[Any, dict[str, list[str]]]] = {}
+        for event_type, batch in self.to_columns().items():
+            size = len(batch)
+            dtype = np.dtype(
+                [(name, _DTYPES[kind]) for name, kind in batch.kinds.items()]
+            )
+            records = np.empty(size, dtype=dtype)
+            mask = np.zeros(size, dtype=[(name, "?") for name in batch.kinds])
+            for name, column in batch.columns.items():
+                records[name] = np.frombuffer(column, dtype=column.typecode)
+                if batch.null_counts[name]:
+                    valid = np.unpackbits(
+                        np.frombuffer(batch.validity[name], dtype=np.uint8),
+                        count=size,
+                        bitorder="little",
+                    )
+                    mask[name] = valid == 0
+            result[event_type] = (np.ma.array(records, mask=mask), batch.dictionaries)
+        return result
+
+    def to_arrow(self) -> dict[str, Any]:
+        """Return an Arrow record batch per event type, with dictionary encoded strings."""
+        if pa is None:
+            raise ImportError("PyArrow is not installed.")
+
+        result: dict[str, Any] = {}
+        for event_type, batch in self.to_columns().items():
+            arrays: list[Any] = []
+            for name, kind in batch.kinds.items():
+                arrays.append(_arrow_array(batch, name, kind))
+            result[event_type] = pa.RecordBatch.from_arrays(
+                arrays, names=list(batch.kinds)
+            )
+        return result
+
+    def clear(self) -> None:
+        """Remove all added events."""
+        self._builders.clear()
+
+
+# column kind -> Arrow type of the column buffer
+_ARROW_TYPES = {
+    KIND_STRING: "int32",
+    KIND_INT: "int64",
+    KIND_FLOAT: "float64",
+    KIND_BOOL: "int8",
+}
+
+
+def _arrow_array(batch: ColumnBatch, name: str, kind: str) -> Any:
+    """Return an Arrow array of a column buffer and its validity bitmap."""
+    size = len(batch)
+    null_count = batch.null_counts[name]
+    # the buffers are copied, exported buffers of the builder could no longer grow
+    validity = pa.py_buffer(bytes(batch.validity[name])) if null_count else None
+    array_type = pa.type_for_alias(_ARROW_TYPES[kind])
+    values = pa.Array.from_buffers(
+        array_type, size, [validity, pa.py_buffer(bytes(batch.columns[name]))], null_count
+    )
+    if kind == KIND_STRING:
+        return pa.DictionaryArray.from_arrays(
+            values, pa.array(batch.dictionaries[name], pa.string())
+        )
+    if kind == KIND_BOOL:
+        return values.cast(pa.bool_())
+    return values
@@ -0,0 +1,328 @@
+"""
+Append-only on-disk journal of received events.
+
+Raw event payloads are stored length-prefixed in rotating segment files.
+Appending only writes to the buffered segment file, fsyncs, segment rotation and
+retention are done by a background thread.
+The journal can be replayed into the same event objects the client returns,
+so consumers can catch up from disk after a crash.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import IO, Iterator
+
+from crownstone_sse.events import Event, ReceiveInfo, parse_event
+
+_LOGGER = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".journal"
+SEGMENT_MAGIC = b"CSJRNL\0\0"
+SEGMENT_VERSION = 1
+
+# magic, version, flags
+_SEGMENT_HEADER = struct.Struct("<8sHH")
+# payload length, crc32 of payload, then the receive info:
+# wall clock time, monotonic time, connection generation, sequence in the connection
+_RECORD_HEADER = struct.Struct("<IIddIQ")
+
+
+class JournalError(Exception):
+    """Segment file that can not be read."""
+
+
+def _segment_start(file_name: str) -> int:
+    """Return the creation time in ns from a segment file name."""
+    return int(file_name[: -len(SEGMENT_SUFFIX)])
+
+
+def list_segments(directory: str) -> list[str]:
+    """Return the paths of all segments in a directory, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    segments = sorted(
+        (name for name in names if name.endswith(SEGMENT_SUFFIX)), key=_segment_start
+    )
+    return [os.path.join(directory, name) for name in segments]
+
+
+class EventJournal:
+    """Append-only journal of raw event payloads."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_segment_age: float | None = 3600,
+        retention_bytes: int | None = None,
+        retention_age: float | None = 7 * 24 * 3600,
+        fsync_interval: float | None = 1.0,
+    ) -> None:
+        """
+        Initialize the journal and open a new segment.
+
+        :param directory: Directory to store the segment files in.
+        :param max_segment_bytes: Segment size after which a new segment is started.
+        :param max_segment_age: Segment age in seconds after which a new segment is started.
+        :param retention_bytes: Total size of all segments after which the oldest are removed.
+        :param retention_age: Age in seconds after which segments are removed.
+        :param fsync_interval: Time in seconds between fsyncs, done in a background thread.
+            Use 0 to fsync every record while appending, or None to leave syncing to the OS.
+        """
+        self._directory = directory
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segment_age = max_segment_age
+        self._retention_bytes = retention_bytes
+        self._retention_age = retention_age
+        self._fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._file: IO[bytes] | None = None
+        self._segment_opened = 0.0
+        self._segment_size = 0
+        self._dirty = False
+        # set by append, the background thread starts the next segment
+        self._rotate_requested = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._file, self._segment_opened = self._open_segment()
+        self._segment_size = _SEGMENT_HEADER.size
+
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._sync_thread: threading.Thread | None = threading.Thread(
+            target=self._run_sync_thread, name="crownstone-sse-journal", daemon=True
+        )
+        self._sync_thread.start()
+
+    @property
+    def directory(self) -> str:
+        """Return the journal directory."""
+        return self._directory
+
+    def append(self, payload: bytes, receive_info: ReceiveInfo | None = None) -> None:
+        """Append a raw event payload to the journal, received now when no info is given."""
+        if receive_info is None:
+            receive_info = ReceiveInfo(time.monotonic(), time.time(), 0, 0)
+        record = _RECORD_HEADER.pack(
+            len(payload),
+            zlib.crc32(payload),
+            receive_info.wall,
+            receive_info.monotonic,
+            receive_info.generation,
+            receive_info.sequence,
+        )
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Journal is closed.")
+            self._file.write(record)
+            self._file.write(payload)
+            self._segment_size += len(record) + len(payload)
+            self._dirty = True
+            if self._fsync_interval == 0:
+                self._sync()
+
+            rotate = not self._rotate_requested and (
+                self._segment_size >= self._max_segment_bytes
+                or (
+                    self._max_segment_age is not None
+                    and time.monotonic() - self._segment_opened >= self._max_segment_age
+                )
+            )
+            if rotate:
+                self._rotate_requested = True
+        if rotate:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Write buffered records to disk."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Sync and close the journal."""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+            self._sync_thread = None
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> EventJournal:
+        """Use the journal as context manager."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the journal when leaving the context."""
+        self.close()
+
+    def _open_segment(self) -> tuple[IO[bytes], float]:
+        """Create a new segment file with its header, return it and its open time."""
+        path = os.path.join(self._directory, f"{time.time_ns():020d}{SEGMENT_SUFFIX}")
+        file = open(path, "ab")
+        file.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, 0))
+        return file, time.monotonic()
+
+    def _rotate(self) -> None:
+        """Switch to a new segment and apply retention. Runs in the background thread."""
+        new_file, opened = self._open_segment()
+        with self._lock:
+            # the file is only closed by close, after joining this thread
+            old_file = self._file
+            assert old_file is not None
+            # only flush while holding the lock, appends continue in the new segment
+            old_file.flush()
+            self._file = new_file
+            self._segment_opened = opened
+            self._segment_size = _SEGMENT_HEADER.size
+            self._dirty = True
+            self._rotate_requested = False
+
+        os.fsync(old_file.fileno())
+        old_file.close()
+        self._apply_retention()
+
+    def _apply_retention(self) -> None:
+        """Remove the oldest segments exceeding the retention size or age."""
+        # the last segment is the one being written
+        segments = list_segments(self._directory)[:-1]
+        sizes = [os.path.getsize(path) for path in segments]
+        with self._lock:
+            total = sum(sizes) + self._segment_size
+        now_ns = time.time_ns()
+
+        for index, path in enumerate(segments):
+            # a segment ends when the next one starts
+            next_path = segments[index + 1] if index + 1 < len(segments) else None
+            ended = (
+                _segment_start(os.path.basename(next_path)) if next_path else now_ns
+            )
+            expired = (
+                self._retention_age is not None
+                and now_ns - ended > self._retention_age * 1e9
+            )
+            too_large = self._retention_bytes is not None and total > self._retention_bytes
+            if not expired and not too_large:
+                break
+            try:
+                os.remove(path)
+            except OSError as err:
+                _LOGGER.warning(f"Failed to remove journal segment {path}: {err}")
+            total -= sizes[index]
+
+    def _sync(self) -> None:
+        """Flush and fsync the current segment. Must hold the lock."""
+        if self._file is None or not self._dirty:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def _sync_unlocked(self) -> None:
+        """Flush the current segment while holding the lock, and fsync it after releasing it."""
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+            self._file.flush()
+            # the file is only closed by this thread, or by close after joining it
+            fileno = self._file.fileno()
+            self._dirty = False
+        os.fsync(fileno)
+
+    def _run_sync_thread(self) -> None:
+        """Fsync every interval and rotate segments when requested, until closed."""
+        interval = self._fsync_interval or None
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            stopping = self._stop_event.is_set()
+            try:
+                if self._fsync_interval:
+                    self._sync_unlocked()
+                if self._rotate_requested and not stopping:
+                    self._rotate()
+            except (OSError, ValueError) as err:
+                _LOGGER.warning(f"Failed to sync journal: {err}")
+            if stopping:
+                return
+
+
+def iter_segment(path: str) -> Iterator[tuple[ReceiveInfo, bytes]]:
+    """
+    Yield (receive info, payload) records of a single segment.
+
+    Stops at the first incomplete or corrupt record, which is left by a crash during a write.
+    Raises JournalError when the file is not a segment, or of an unsupported version.
+    """
+    with open(path, "rb") as file:
+        # a crash right after creating the segment leaves it without complete header
+        if os.fstat(file.fileno()).st_size < _SEGMENT_HEADER.size:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, _ = _SEGMENT_HEADER.unpack_from(mapped, 0)
+            if magic != SEGMENT_MAGIC:
+                raise JournalError(f"{path} is not a Crownstone event journal segment.")
+            if version != SEGMENT_VERSION:
+                raise JournalError(f"Unsupported journal segment version {version} in {path}.")
+
+            offset = _SEGMENT_HEADER.size
+            end = len(mapped)
+            while offset + _RECORD_HEADER.size <= end:
+                header = _RECORD_HEADER.unpack_from(mapped, offset)
+                length, crc, wall, monotonic, generation, sequence = header
+                offset += _RECORD_HEADER.size
+                if offset + length > end:
+                    _LOGGER.warning(f"Journal segment {path} ends with an incomplete record.")
+                    return
+                payload = mapped[offset : offset + length]
+                if zlib.crc32(payload) != crc:
+                    _LOGGER.warning(f"Journal segment {path} contains a corrupt record.")
+                    return
+                offset += length
+                yield ReceiveInfo(monotonic, wall, generation, sequence), payload
+
+
+def iter_records(
+    directory: str, since: float | None = None
+) -> Iterator[tuple[ReceiveInfo, bytes]]:
+    """Yield (receive info, payload) of all records, optionally from a wall clock time."""
+    segments = list_segments(directory)
+    if since is not None:
+        since_ns = since * 1e9
+        # skip segments that ended before the requested time
+        starts = [_segment_start(os.path.basename(path)) for path in segments]
+        first = 0
+        for index in range(1, len(segments)):
+            if starts[index] <= since_ns:
+                first = index
+        segments = segments[first:]
+
+    for path in segments:
+        for receive_info, payload in iter_segment(path):
+            if since is None or receive_info.wall >= since:
+                yield receive_info, payload
+
+
+def replay_journal(directory: str, since: float | None = None) -> Iterator[Event]:
+    """Yield the journaled events with their original receive info."""
+    for receive_info, payload in iter_records(directory, since):
+        try:
+            event = parse_event(json.loads(payload), receive_info)
+        except (ValueError, KeyError):
+            _LOGGER.warning("Skipping journal record with an invalid event.")
+            continue
+        yield event
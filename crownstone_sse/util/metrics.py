@@ -0,0 +1,383 @@
+"""
+Counters, gauges and histograms of the client and event bus.
+
+Metrics are plain in-memory values updated by the thread running the client or
+event bus. A snapshot can be taken at any time, and rendered in the Prometheus
+text exposition format without extra dependencies.
+"""
+from __future__ import annotations
+
+import abc
+import math
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, Sequence, Tuple, TypeVar, Union
+
+METRIC_PREFIX = "crownstone_sse"
+
+KIND_COUNTER = "counter"
+KIND_GAUGE = "gauge"
+KIND_HISTOGRAM = "histogram"
+
+# upper bounds in seconds, for timings of a single event
+TIMING_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0)
+# upper bounds in seconds, for gaps in the stream
+GAP_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# reasons of reconnects
+RECONNECT_STREAM_ENDED = "stream_ended"
+RECONNECT_PAYLOAD_ERROR = "payload_error"
+RECONNECT_READ_TIMEOUT = "read_timeout"
+RECONNECT_TOKEN_EXPIRED = "token_expired"
+RECONNECT_TOKEN_INVALID = "token_invalid"
+RECONNECT_NO_CONNECTION = "no_connection"
+RECONNECT_CONNECT_FAILED = "connect_failed"
+
+LabelValues = Tuple[str, ...]
+
+
+@dataclass
+class HistogramValue:
+    """Observations of a histogram, bucket counts are not cumulative."""
+
+    buckets: Sequence[float]
+    counts: list[int]
+    sum: float = 0.0
+    count: int = 0
+
+
+@dataclass
+class MetricSnapshot:
+    """Values of a metric at the time of the snapshot."""
+
+    name: str
+    kind: str
+    help: str
+    label_names: LabelValues = ()
+    values: Dict[LabelValues, Union[float, HistogramValue]] = field(default_factory=dict)
+
+
+class _Metric(abc.ABC):
+    """Base of all metrics, values per combination of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: LabelValues = ()) -> None:
+        """Initialize the metric."""
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+
+    @abc.abstractmethod
+    def snapshot(self) -> MetricSnapshot:
+        """Return a copy of the current values."""
+
+
+_MetricType = TypeVar("_MetricType", bound=_Metric)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = KIND_COUNTER
+
+    def __init__(self, name: str, help_text: str, label_names: LabelValues = ()) -> None:
+        """Initialize the counter."""
+        super().__init__(name, help_text, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()) -> None:
+        """Increase the counter."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: LabelValues = ()) -> float:
+        """Return the current value."""
+        return self._values.get(labels, 0)
+
+    def snapshot(self) -> MetricSnapshot:
+        """Return a copy of the current values."""
+        return MetricSnapshot(
+            self.name, self.kind, self.help, self.label_names, dict(self._values)
+        )
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = KIND_GAUGE
+
+    def set(self, value: float, labels: LabelValues = ()) -> None:
+        """Set the gauge."""
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = KIND_HISTOGRAM
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = TIMING_BUCKETS,
+        label_names: LabelValues = (),
+    ) -> None:
+        """Initialize the histogram."""
+        super().__init__(name, help_text, label_names)
+        self._buckets = tuple(sorted(buckets))
+        self._values: dict[LabelValues, HistogramValue] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()) -> None:
+        """Add an observation."""
+        histogram = self._values.get(labels)
+        if histogram is None:
+            # the last count is for the +Inf bucket
+            histogram = HistogramValue(self._buckets, [0] * (len(self._buckets) + 1))
+            self._values[labels] = histogram
+        histogram.counts[bisect_left(self._buckets, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    def snapshot(self) -> MetricSnapshot:
+        """Return a copy of the current values."""
+        return MetricSnapshot(
+            self.name,
+            self.kind,
+            self.help,
+            self.label_names,
+            {
+                labels: HistogramValue(value.buckets, list(value.counts), value.sum, value.count)
+                for labels, value in self._values.items()
+            },
+        )
+
+
+class MetricsRegistry:
+    """Collection of metrics, to snapshot them together."""
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        """Initialize an empty registry."""
+        self._prefix = prefix
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, help_text: str, label_names: LabelValues = ()) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(self._name(name), help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: LabelValues = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(self._name(name), help_text, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = TIMING_BUCKETS,
+        label_names: LabelValues = (),
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(
+            Histogram(self._name(name), help_text, buckets, label_names)
+        )
+
+    def snapshot(self) -> dict[str, MetricSnapshot]:
+        """Return the current values of all metrics, by metric name."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def _name(self, name: str) -> str:
+        """Return the full name of a metric."""
+        return f"{self._prefix}_{name}" if self._prefix else name
+
+    def _register(self, metric: _MetricType) -> _MetricType:
+        """Add a metric to the registry."""
+        self._metrics.append(metric)
+        return metric
+
+
+class ClientMetrics(MetricsRegistry):
+    """Metrics of CrownstoneSSEAsync."""
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        """Create the client metrics."""
+        super().__init__(prefix)
+        self.events = self.counter(
+            "events_total", "Events received.", ("type", "sub_type")
+        )
+        self.bytes_read = self.counter("bytes_read_total", "Bytes read from the stream.")
+        self.invalid_data = self.counter(
+            "invalid_data_total", "Data lines that could not be decoded into an event object."
+        )
+        self.json_decode_seconds = self.histogram(
+            "json_decode_seconds", "Time to decode the JSON of an event."
+        )
+        self.parse_seconds = self.histogram(
+            "parse_seconds", "Time to create an event from the decoded data."
+        )
+        self.reconnects = self.counter(
+            "reconnects_total", "Reconnects to the SSE server.", ("reason",)
+        )
+        self.gap_seconds = self.histogram(
+            "gap_seconds",
+            "Time from losing the connection until connected again.",
+            GAP_BUCKETS,
+        )
+        self.token_refreshes = self.counter(
+            "token_refreshes_total", "Logins to renew an expired or invalid access token."
+        )
+        self.state = self.gauge(
+            "state", "Current state of the client, 1 for the current state.", ("state",)
+        )
+        self.invalid_events = self.counter(
+            "invalid_events_total", "Events skipped because validation failed.", ("type",)
+        )
+        self.events_shed = self.counter(
+            "events_shed_total", "Events dropped while the consumer lags.", ("reason",)
+        )
+        self.consumer_lag_bytes = self.gauge(
+            "consumer_lag_bytes", "Bytes received but not yet read by the consumer."
+        )
+        self.consumer_lag_seconds = self.gauge(
+            "consumer_lag_seconds", "Time since the consumer last read everything received."
+        )
+
+
+class EventBusMetrics(MetricsRegistry):
+    """Metrics of EventBus."""
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        """Create the event bus metrics."""
+        super().__init__(prefix)
+        self.events_fired = self.counter(
+            "bus_events_fired_total", "Events fired on the event bus.", ("type",)
+        )
+        self.listener_calls = self.counter(
+            "bus_listener_calls_total", "Listeners called or scheduled.", ("type",)
+        )
+        self.dispatch_seconds = self.histogram(
+            "bus_dispatch_seconds", "Time to call or schedule all listeners of an event."
+        )
+        self.handovers = self.counter(
+            "bus_loop_handovers_total",
+            "Wakeups of the target event loop to hand over coroutine listeners.",
+        )
+
+
+class DispatcherMetrics(EventBusMetrics):
+    """Metrics of ShardedDispatcher."""
+
+    def __init__(self, prefix: str = METRIC_PREFIX) -> None:
+        """Create the dispatcher metrics."""
+        super().__init__(prefix)
+        self.shard_events = self.counter(
+            "dispatcher_shard_events_total", "Events queued per shard.", ("shard",)
+        )
+        self.queue_depth = self.gauge(
+            "dispatcher_queue_depth", "Events waiting per shard.", ("shard",)
+        )
+
+
+def render_prometheus(*snapshots: dict[str, MetricSnapshot]) -> str:
+    """
+    Return snapshots in the Prometheus text exposition format.
+
+    Metrics with the same name in several snapshots, like those of several clients,
+    are rendered as one family. Values with the same labels are added up.
+    """
+    families = _merge_snapshots(snapshots)
+    lines: list[str] = []
+    for metric in families.values():
+        lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for label_values, value in metric.values.items():
+            labels = list(zip(metric.label_names, label_values))
+            if isinstance(value, HistogramValue):
+                lines.extend(_render_histogram(metric.name, labels, value))
+            else:
+                lines.append(f"{metric.name}{_render_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _merge_snapshots(
+    snapshots: Sequence[dict[str, MetricSnapshot]]
+) -> dict[str, MetricSnapshot]:
+    """Return the metrics of all snapshots by name, adding up values with the same labels."""
+    families: dict[str, MetricSnapshot] = {}
+    for snapshot in snapshots:
+        for metric in snapshot.values():
+            family = families.get(metric.name)
+            if family is None:
+                families[metric.name] = MetricSnapshot(
+                    metric.name, metric.kind, metric.help, metric.label_names, {}
+                )
+                family = families[metric.name]
+            elif (family.kind, family.label_names) != (metric.kind, metric.label_names):
+                raise ValueError(f"Metric {metric.name} has a different kind or labels.")
+            for labels, value in metric.values.items():
+                family.values[labels] = _add_values(family.values.get(labels), value)
+    return families
+
+
+def _add_values(
+    total: float | HistogramValue | None, value: float | HistogramValue
+) -> float | HistogramValue:
+    """Add a value to the merged total of a metric, return the new total."""
+    if isinstance(value, HistogramValue):
+        if total is None:
+            return HistogramValue(value.buckets, list(value.counts), value.sum, value.count)
+        assert isinstance(total, HistogramValue)
+        if tuple(total.buckets) != tuple(value.buckets):
+            raise ValueError("Cannot add up histograms with different buckets.")
+        total.counts = [first + second for first, second in zip(total.counts, value.counts)]
+        total.sum += value.sum
+        total.count += value.count
+        return total
+    if total is None:
+        return value
+    assert not isinstance(total, HistogramValue)
+    return total + value
+
+
+def _render_histogram(
+    name: str, labels: list[tuple[str, str]], value: HistogramValue
+) -> list[str]:
+    """Return the sample lines of a histogram."""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(value.buckets, value.counts):
+        cumulative += count
+        bucket_labels = _render_labels(labels + [("le", _number(bound))])
+        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+    lines.append(f"{name}_bucket{_render_labels(labels + [('le', '+Inf')])} {value.count}")
+    lines.append(f"{name}_sum{_render_labels(labels)} {_number(value.sum)}")
+    lines.append(f"{name}_count{_render_labels(labels)} {value.count}")
+    return lines
+
+
+def _render_labels(labels: list[tuple[str, str]]) -> str:
+    """Return labels in the exposition format, empty without labels."""
+    if not labels:
+        return ""
+    rendered = ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in labels)
+    return f"{{{rendered}}}"
+
+
+def _escape_label(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _escape_help(text: str) -> str:
+    """Escape a help text."""
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """Return a number in the exposition format."""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,262 @@
+"""
+Presence occupancy index with dwell time tracking.
+
+The index is maintained from presence events, and answers occupancy
+questions like "who is in location X" in constant time.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from crownstone_sse.const import (
+    EVENT_PRESENCE,
+    EVENT_PRESENCE_ENTER_LOCATION,
+    EVENT_PRESENCE_ENTER_SPHERE,
+    EVENT_PRESENCE_EXIT_LOCATION,
+    EVENT_PRESENCE_EXIT_SPHERE,
+)
+from crownstone_sse.events import Event, PresenceEvent
+from crownstone_sse.util.eventbus import EventBus
+
+
+class _Occupants:
+    """Users present in a location or sphere, with their entry time."""
+
+    __slots__ = ("users", "entry_time_sum")
+
+    def __init__(self) -> None:
+        """Initialize empty occupants."""
+        self.users: dict[str, float] = {}
+        # sum of entry times, to compute the current dwell time of all users at once
+        self.entry_time_sum = 0.0
+
+    def add(self, user_id: str, now: float) -> None:
+        """Add a user."""
+        if user_id not in self.users:
+            self.users[user_id] = now
+            self.entry_time_sum += now
+
+    def remove(self, user_id: str) -> float | None:
+        """Remove a user, return the entry time."""
+        entered = self.users.pop(user_id, None)
+        if entered is not None:
+            self.entry_time_sum -= entered
+        return entered
+
+
+class OccupancyIndex:
+    """Index of users per location and sphere, with dwell times."""
+
+    def __init__(self, timeout: float | None = None) -> None:
+        """
+        Initialize the index.
+
+        :param timeout: Time in seconds after the last presence event of a user,
+            after which the user is considered to have left, in case the exit event is missing.
+            Users never time out when None.
+        """
+        self._timeout = timeout
+        self._locations: dict[str, _Occupants] = {}
+        self._spheres: dict[str, _Occupants] = {}
+        # user id -> (location id, entry time)
+        self._user_locations: dict[str, tuple[str, float]] = {}
+        # user id -> sphere ids
+        self._user_spheres: dict[str, set[str]] = {}
+        # location id -> sphere id
+        self._location_spheres: dict[str, str] = {}
+        # (user id, location id) -> total time of completed stays
+        self._user_dwell: dict[tuple[str, str], float] = {}
+        # location id -> total time of completed stays of all users
+        self._location_dwell: dict[str, float] = {}
+        # user id -> time of last presence event, oldest first
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def listen_to(self, bus: EventBus) -> Callable[[], None]:
+        """Keep the index updated from an event bus, return function to stop."""
+        return bus.add_event_listener(EVENT_PRESENCE, self.apply)
+
+    def apply(self, event: Event, now: float | None = None) -> None:
+        """Apply a presence event to the index."""
+        if not isinstance(event, PresenceEvent):
+            return
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            user_id = event.user_id
+            sphere_id = event.sphere_id
+
+            if event.sub_type == EVENT_PRESENCE_ENTER_SPHERE:
+                self._enter_sphere(user_id, sphere_id, now)
+
+            elif event.sub_type == EVENT_PRESENCE_EXIT_SPHERE:
+                self._exit_sphere(user_id, sphere_id, now)
+
+            elif event.sub_type == EVENT_PRESENCE_ENTER_LOCATION:
+                self._enter_sphere(user_id, sphere_id, now)
+                self._enter_location(user_id, sphere_id, event.location_id, now)
+
+            elif event.sub_type == EVENT_PRESENCE_EXIT_LOCATION:
+                current = self._user_locations.get(user_id)
+                if current is not None and current[0] == event.location_id:
+                    self._exit_location(user_id, now)
+
+            else:
+                return
+
+            if user_id in self._user_spheres:
+                self._last_seen[user_id] = now
+                self._last_seen.move_to_end(user_id)
+            else:
+                self._last_seen.pop(user_id, None)
+
+    def expire(self, now: float | None = None) -> None:
+        """Remove users of which the last presence event is older than the timeout."""
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+
+    def users_in_location(
+        self, location_id: str, now: float | None = None
+    ) -> dict[str, float]:
+        """Return a copy of user id -> entry time for a location."""
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+            occupants = self._locations.get(location_id)
+            return dict(occupants.users) if occupants is not None else {}
+
+    def users_in_sphere(
+        self, sphere_id: str, now: float | None = None
+    ) -> dict[str, float]:
+        """Return a copy of user id -> entry time for a sphere."""
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+            occupants = self._spheres.get(sphere_id)
+            return dict(occupants.users) if occupants is not None else {}
+
+    def location_count(self, location_id: str, now: float | None = None) -> int:
+        """Return the amount of users in a location."""
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+            occupants = self._locations.get(location_id)
+            return len(occupants.users) if occupants is not None else 0
+
+    def location_of(self, user_id: str, now: float | None = None) -> str | None:
+        """Return the location a user is currently in."""
+        with self._lock:
+            self._expire(time.monotonic() if now is None else now)
+            current = self._user_locations.get(user_id)
+            return current[0] if current is not None else None
+
+    def time_in_location(self, user_id: str, now: float | None = None) -> float:
+        """Return how long a user has been in the current location."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            current = self._user_locations.get(user_id)
+            return now - current[1] if current is not None else 0.0
+
+    def dwell_time(
+        self, user_id: str, location_id: str, now: float | None = None
+    ) -> float:
+        """Return the total time a user has spent in a location, including now."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            total = self._user_dwell.get((user_id, location_id), 0.0)
+            current = self._user_locations.get(user_id)
+            if current is not None and current[0] == location_id:
+                total += now - current[1]
+            return total
+
+    def location_dwell_time(self, location_id: str, now: float | None = None) -> float:
+        """Return the total time all users have spent in a location, including now."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            total = self._location_dwell.get(location_id, 0.0)
+            occupants = self._locations.get(location_id)
+            if occupants is not None:
+                total += len(occupants.users) * now - occupants.entry_time_sum
+            return total
+
+    def _enter_sphere(self, user_id: str, sphere_id: str, now: float) -> None:
+        """Register a user entering a sphere."""
+        self._spheres.setdefault(sphere_id, _Occupants()).add(user_id, now)
+        self._user_spheres.setdefault(user_id, set()).add(sphere_id)
+
+    def _exit_sphere(self, user_id: str, sphere_id: str, now: float) -> None:
+        """Register a user leaving a sphere, and the location in it."""
+        occupants = self._spheres.get(sphere_id)
+        if occupants is not None:
+            occupants.remove(user_id)
+            if not occupants.users:
+                del self._spheres[sphere_id]
+
+        spheres = self._user_spheres.get(user_id)
+        if spheres is not None:
+            spheres.discard(sphere_id)
+            if not spheres:
+                del self._user_spheres[user_id]
+
+        current = self._user_locations.get(user_id)
+        if current is not None and self._location_spheres.get(current[0]) == sphere_id:
+            self._exit_location(user_id, now)
+
+    def _enter_location(
+        self, user_id: str, sphere_id: str, location_id: str, now: float
+    ) -> None:
+        """Register a user entering a location, leaving the previous one."""
+        self._location_spheres[location_id] = sphere_id
+        current = self._user_locations.get(user_id)
+        if current is not None:
+            if current[0] == location_id:
+                return
+            self._exit_location(user_id, now)
+
+        self._locations.setdefault(location_id, _Occupants()).add(user_id, now)
+        self._user_locations[user_id] = (location_id, now)
+
+    def _exit_location(self, user_id: str, now: float) -> None:
+        """Register a user leaving its current location."""
+        current = self._user_locations.pop(user_id, None)
+        if current is None:
+            return
+
+        location_id, entered = current
+        occupants = self._locations.get(location_id)
+        if occupants is not None:
+            occupants.remove(user_id)
+            if not occupants.users:
+                del self._locations[location_id]
+
+        stay = max(now - entered, 0.0)
+        key = (user_id, location_id)
+        self._user_dwell[key] = self._user_dwell.get(key, 0.0) + stay
+        self._location_dwell[location_id] = (
+            self._location_dwell.get(location_id, 0.0) + stay
+        )
+
+    def _expire(self, now: float) -> None:
+        """Let users without presence events for longer than the timeout leave."""
+        if self._timeout is None:
+            return
+
+        deadline = now - self._timeout
+        while self._last_seen:
+            user_id, last_seen = next(iter(self._last_seen.items()))
+            if last_seen > deadline:
+                break
+            del self._last_seen[user_id]
+            # the user is considered to have left when the timeout expired
+            left = last_seen + self._timeout
+            self._exit_location(user_id, left)
+            for sphere_id in list(self._user_spheres.get(user_id, ())):
+                self._exit_sphere(user_id, sphere_id, left)
@@ -0,0 +1,471 @@
+"""
+Composable push-based operators over an async event source.
+
+A Stream wraps an async iterable like CrownstoneSSEAsync or CrownstoneSSEReplay.
+Operators return new streams, and the result is consumed with async iteration:
+
+    stream = Stream(client)
+    async for event in stream.filter(is_switch_state).debounce_by("cloud_id", 0.5):
+        ...
+
+A single task reads the source and pushes every event through the operators.
+All operators with a time component share one TimerWheel, which keeps a heap of
+deadlines and a single loop.call_at for the earliest, instead of a task or sleep per key.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import heapq
+import itertools
+from typing import Any, AsyncIterable, Callable, Deque, Hashable, List
+
+from crownstone_sse.util.aggregation import KeyType, key_function
+
+# marks the absence of a previous value
+_MISSING = object()
+
+
+class TimerWheel:
+    """Deadlines of all operators of a stream, served by a single loop timer."""
+
+    def __init__(self) -> None:
+        """Initialize the timer wheel."""
+        # entries are [when, order, callback], the callback is None when cancelled
+        self._heap: list[list[Any]] = []
+        self._order = itertools.count()
+        self._handle: asyncio.TimerHandle | None = None
+        self._handle_when: float | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def __len__(self) -> int:
+        """Return the amount of scheduled deadlines, including cancelled ones not yet removed."""
+        return len(self._heap)
+
+    def time(self) -> float:
+        """Return the current time of the event loop."""
+        return self._get_loop().time()
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> list[Any]:
+        """Call a function after a delay, return the entry to cancel it with."""
+        entry = [self.time() + delay, next(self._order), callback]
+        heapq.heappush(self._heap, entry)
+        if self._handle_when is None or entry[0] < self._handle_when:
+            self._arm()
+        return entry
+
+    @staticmethod
+    def cancel(entry: list[Any]) -> None:
+        """Cancel a scheduled call, it is removed from the heap once due."""
+        entry[2] = None
+
+    def close(self) -> None:
+        """Cancel all scheduled calls."""
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self._handle_when = None
+        self._heap.clear()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the loop of the wheel, the running loop on first use."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._loop
+
+    def _arm(self) -> None:
+        """Set the loop timer to the earliest deadline."""
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._handle_when = None
+        if heap:
+            self._handle_when = heap[0][0]
+            self._handle = self._get_loop().call_at(self._handle_when, self._fire)
+
+    def _fire(self) -> None:
+        """Run all calls that are due, and set the timer to the next deadline."""
+        self._handle = None
+        self._handle_when = None
+        now = self.time()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            callback = heapq.heappop(heap)[2]
+            if callback is not None:
+                callback()
+        self._arm()
+
+
+class Stream:
+    """A stream of items, pushed from a source through operators."""
+
+    def __init__(self, source: AsyncIterable[Any], max_buffered: int = 1000) -> None:
+        """
+        Initialize the stream over a source.
+
+        :param source: Async iterable of events, like CrownstoneSSEAsync. None items are skipped.
+        :param max_buffered: Stop reading the source while a consumer has this many items waiting.
+            With tee, consume every branch, or the other branches stop too.
+        """
+        self._root = self
+        self._children: list[Stream] = []
+        self._source: AsyncIterable[Any] | None = source
+        self._max_buffered = max_buffered
+        self._wheel = TimerWheel()
+        self._sinks: list[_Sink] = []
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def wheel(self) -> TimerWheel:
+        """Return the timer wheel shared by the operators of this stream."""
+        return self._root._wheel
+
+    def filter(self, predicate: Callable[[Any], bool]) -> Stream:
+        """Pass the items for which the predicate is true."""
+        return _Filter(self, predicate)
+
+    def map(self, function: Callable[[Any], Any]) -> Stream:
+        """Pass the result of a function of every item."""
+        return _Map(self, function)
+
+    def debounce_by(self, key: KeyType, delay: float) -> Stream:
+        """
+        Pass the last item of a key once no item of that key arrived for a delay.
+
+        :param key: Attribute name(s) of the item or function returning the key, like "cloud_id".
+        :param delay: Seconds without items of a key before its last item is passed.
+        """
+        return _Debounce(self, key, delay)
+
+    def throttle(self, interval: float, key: KeyType | None = None) -> Stream:
+        """
+        Pass an item, then drop the items arriving within the interval.
+
+        :param interval: Seconds after a passed item in which items are dropped.
+        :param key: Throttle per key instead of over all items.
+        """
+        return _Throttle(self, interval, key)
+
+    def window(self, seconds: float | None = None, count: int | None = None) -> Stream:
+        """
+        Pass lists of items, collected for a time, up to a count, or whichever comes first.
+
+        :param seconds: Duration of a window, starting at its first item.
+        :param count: Maximum amount of items in a window.
+        """
+        if seconds is None and count is None:
+            raise ValueError("A window requires seconds, count or both.")
+        if count is not None and count < 1:
+            raise ValueError("count must be at least 1.")
+        return _Window(self, seconds, count)
+
+    def distinct_until_changed(
+        self, key: KeyType | None = None, by: KeyType | None = None
+    ) -> Stream:
+        """
+        Pass the items that differ from the previous item.
+
+        :param key: Compare this attribute (or function) of the items, instead of the items.
+        :param by: Compare with the previous item with the same value of this key,
+            like the previous switch state of the same crownstone.
+        """
+        return _DistinctUntilChanged(self, key, by)
+
+    def tee(self, count: int = 2) -> tuple[Stream, ...]:
+        """Return streams that each receive every item of this stream."""
+        return tuple(_Operator(self) for _ in range(count))
+
+    def close(self) -> None:
+        """Stop reading the source, cancel pending timers, and end all consumers."""
+        root = self._root
+        if root._task is not None:
+            root._task.cancel()
+        root._wheel.close()
+        root._complete()
+
+    def __aiter__(self) -> _Sink:
+        """Return a consumer of this stream, and start reading the source."""
+        sink = _Sink(self)
+        root = self._root
+        root._sinks.append(sink)
+        if root._task is None:
+            root._task = asyncio.create_task(root._run())
+        return sink
+
+    async def _run(self) -> None:
+        """Push all items of the source through the stream."""
+        assert self._source is not None
+        try:
+            async for item in self._source:
+                if item is None:
+                    continue
+                self._push(item)
+                for sink in self._sinks:
+                    if len(sink) >= self._max_buffered:
+                        await sink.wait_for_space(self._max_buffered)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            self._fail(err)
+        else:
+            self._complete()
+        # nothing is pending after the operators completed
+        self._wheel.close()
+
+    def _push(self, item: Any) -> None:
+        """Handle an item, the stream itself passes it on."""
+        self._emit(item)
+
+    def _emit(self, item: Any) -> None:
+        """Push an item to the streams fed by this stream."""
+        for child in self._children:
+            child._push(item)
+
+    def _complete(self) -> None:
+        """End the stream after the source ended, flushing pending items first."""
+        for child in self._children:
+            child._complete()
+
+    def _fail(self, err: BaseException) -> None:
+        """End the stream with an error."""
+        for child in self._children:
+            child._fail(err)
+
+    def _guard(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Wrap a timer callback, failing the stream when it raises."""
+
+        def guarded() -> None:
+            """Run the callback."""
+            try:
+                callback()
+            except Exception as err:  # pylint: disable=broad-except
+                self._fail(err)
+
+        return guarded
+
+
+class _Operator(Stream):
+    """Stream fed by a parent stream, passing every item on."""
+
+    def __init__(self, parent: Stream) -> None:
+        """Attach the operator to its parent."""
+        # pylint: disable=super-init-not-called
+        self._root = parent._root
+        self._children = []
+        parent._children.append(self)
+
+
+class _Filter(_Operator):
+    """Pass the items for which a predicate is true."""
+
+    def __init__(self, parent: Stream, predicate: Callable[[Any], bool]) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._predicate = predicate
+
+    def _push(self, item: Any) -> None:
+        """Pass the item when the predicate is true."""
+        if self._predicate(item):
+            self._emit(item)
+
+
+class _Map(_Operator):
+    """Pass the result of a function of every item."""
+
+    def __init__(self, parent: Stream, function: Callable[[Any], Any]) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._function = function
+
+    def _push(self, item: Any) -> None:
+        """Pass the result of the function."""
+        self._emit(self._function(item))
+
+
+class _Debounce(_Operator):
+    """Pass the last item of a key once the key was quiet for a delay."""
+
+    def __init__(self, parent: Stream, key: KeyType, delay: float) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._key = key_function(key)
+        self._delay = delay
+        # key -> [last item, deadline]
+        self._pending: dict[Hashable, list[Any]] = {}
+
+    def _push(self, item: Any) -> None:
+        """Remember the item, and restart the delay of its key."""
+        key = self._key(item)
+        wheel = self.wheel
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = [item, wheel.time() + self._delay]
+            self._pending[key] = pending
+            self._schedule(key, self._delay)
+        else:
+            # the timer of the key is not moved, it checks the deadline when it fires
+            pending[0] = item
+            pending[1] = wheel.time() + self._delay
+
+    def _schedule(self, key: Hashable, delay: float) -> None:
+        """Check the key once its delay may have passed."""
+        self.wheel.call_later(delay, self._guard(lambda: self._expire(key)))
+
+    def _expire(self, key: Hashable) -> None:
+        """Pass the last item of a key when it was quiet for the delay."""
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        remaining = pending[1] - self.wheel.time()
+        if remaining > 0:
+            self._schedule(key, remaining)
+            return
+        del self._pending[key]
+        self._emit(pending[0])
+
+    def _complete(self) -> None:
+        """Pass the pending items before completing."""
+        pending = self._pending
+        self._pending = {}
+        for item, _ in pending.values():
+            self._emit(item)
+        super()._complete()
+
+
+class _Throttle(_Operator):
+    """Pass an item, then drop the items of the interval after it."""
+
+    def __init__(self, parent: Stream, interval: float, key: KeyType | None) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._interval = interval
+        self._key = key_function(key) if key is not None else None
+        # key -> time until which items are dropped
+        self._until: dict[Hashable, float] = {}
+
+    def _push(self, item: Any) -> None:
+        """Pass the item unless its key passed an item within the interval."""
+        key = self._key(item) if self._key is not None else None
+        now = self.wheel.time()
+        if now < self._until.get(key, now):
+            return
+        if len(self._until) > 1024:
+            # forget the keys that are no longer throttled
+            self._until = {k: until for k, until in self._until.items() if until > now}
+        self._until[key] = now + self._interval
+        self._emit(item)
+
+
+class _Window(_Operator):
+    """Pass lists of items collected for a time or up to a count."""
+
+    def __init__(self, parent: Stream, seconds: float | None, count: int | None) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._seconds = seconds
+        self._count = count
+        self._items: list[Any] = []
+        self._timer: list[Any] | None = None
+
+    def _push(self, item: Any) -> None:
+        """Add the item to the window, and pass the window when full."""
+        self._items.append(item)
+        if len(self._items) == 1 and self._seconds is not None:
+            self._timer = self.wheel.call_later(self._seconds, self._guard(self._close))
+        if self._count is not None and len(self._items) >= self._count:
+            self._close()
+
+    def _close(self) -> None:
+        """Pass the collected items, if any."""
+        if self._timer is not None:
+            TimerWheel.cancel(self._timer)
+            self._timer = None
+        if self._items:
+            items: List[Any] = self._items
+            self._items = []
+            self._emit(items)
+
+    def _complete(self) -> None:
+        """Pass the last window before completing."""
+        self._close()
+        super()._complete()
+
+
+class _DistinctUntilChanged(_Operator):
+    """Pass the items that differ from the previous item."""
+
+    def __init__(self, parent: Stream, key: KeyType | None, by: KeyType | None) -> None:
+        """Initialize the operator."""
+        super().__init__(parent)
+        self._key = key_function(key) if key is not None else None
+        self._by = key_function(by) if by is not None else None
+        # group -> previous value
+        self._previous: dict[Hashable, Any] = {}
+
+    def _push(self, item: Any) -> None:
+        """Pass the item when its value changed."""
+        value = self._key(item) if self._key is not None else item
+        group = self._by(item) if self._by is not None else None
+        if self._previous.get(group, _MISSING) == value:
+            return
+        self._previous[group] = value
+        self._emit(item)
+
+
+class _Sink(_Operator):
+    """Consumer of a stream, buffering the items until they are iterated."""
+
+    def __init__(self, parent: Stream) -> None:
+        """Initialize the consumer."""
+        super().__init__(parent)
+        self._items: Deque[Any] = collections.deque()
+        self._done = False
+        self._error: BaseException | None = None
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+    def __len__(self) -> int:
+        """Return the amount of items waiting."""
+        return len(self._items)
+
+    def __aiter__(self) -> _Sink:
+        """Return instance."""
+        return self
+
+    async def __anext__(self) -> Any:
+        """Return the next item."""
+        while not self._items:
+            if self._error is not None:
+                raise self._error
+            if self._done:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        item = self._items.popleft()
+        self._space.set()
+        return item
+
+    async def wait_for_space(self, limit: int) -> None:
+        """Wait until less than limit items are waiting."""
+        while len(self._items) >= limit and not self._done:
+            self._space.clear()
+            await self._space.wait()
+
+    def _push(self, item: Any) -> None:
+        """Buffer the item."""
+        self._items.append(item)
+        self._ready.set()
+
+    def _complete(self) -> None:
+        """End the iteration after the buffered items."""
+        self._done = True
+        self._ready.set()
+        self._space.set()
+
+    def _fail(self, err: BaseException) -> None:
+        """End the iteration with an error, after the buffered items."""
+        self._error = err
+        self._complete()
@@ -0,0 +1,285 @@
+"""
+Priority-aware delivery of SSE events.
+
+Events are put in priority classes by their type, for example switch commands
+before system events, before switch state updates, before presence, before data
+changes and pings. Delivery takes the oldest event of the highest non-empty class,
+so events keep their order within a class, and with that the order per crownstone,
+sphere or other key, as long as they are handled one at a time.
+
+A starvation guard delivers the oldest event of a lower class first once it waited
+longer than the maximum delay, so bulk events are delayed but never held forever.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Deque, Sequence, Tuple
+
+from crownstone_sse.const import (
+    EVENT_ABILITY_CHANGE,
+    EVENT_COMMAND,
+    EVENT_DATA_CHANGE,
+    EVENT_PING,
+    EVENT_PRESENCE,
+    EVENT_SWITCH_STATE_UPDATE,
+    EVENT_SYSTEM,
+)
+from crownstone_sse.events import Event
+from crownstone_sse.util.eventbus import EventBus
+
+_LOGGER = logging.getLogger(__name__)
+
+# event types per class, highest priority first
+DEFAULT_PRIORITY_CLASSES: list[list[str]] = [
+    [EVENT_COMMAND],
+    [EVENT_SYSTEM],
+    [EVENT_SWITCH_STATE_UPDATE],
+    [EVENT_PRESENCE],
+    [EVENT_DATA_CHANGE, EVENT_ABILITY_CHANGE],
+    [EVENT_PING],
+]
+
+# enqueue time and buffered item
+_Entry = Tuple[float, Any]
+
+
+class PriorityPolicy:
+    """Assign events to priority classes by their type."""
+
+    def __init__(
+        self,
+        classes: Sequence[Sequence[str]] = DEFAULT_PRIORITY_CLASSES,
+        max_delay: float | None = 1.0,
+    ) -> None:
+        """
+        Initialize the policy.
+
+        :param classes: Event types per class, highest priority first.
+            Event types not in any class get the lowest priority.
+        :param max_delay: Seconds an event of a lower class may wait while higher classes
+            are delivered, or None to always deliver the highest class first.
+        """
+        self.max_delay = max_delay
+        self._ranks = {
+            event_type: rank
+            for rank, event_types in enumerate(classes)
+            for event_type in event_types
+        }
+        # the extra class holds the unknown event types
+        self.class_count = len(classes) + 1
+
+    def classify(self, event: Event) -> int:
+        """Return the class of an event, 0 being the highest priority."""
+        return self._ranks.get(event.type, self.class_count - 1)
+
+
+class PriorityBuffer:
+    """Buffer delivering items in priority order of their events."""
+
+    def __init__(self, policy: PriorityPolicy | None = None) -> None:
+        """
+        Initialize the buffer.
+
+        :param policy: Priority classes and starvation guard, the default classes when None.
+        """
+        self._policy = policy or PriorityPolicy()
+        self._queues: list[Deque[_Entry]] = [
+            collections.deque() for _ in range(self._policy.class_count)
+        ]
+        self._size = 0
+        # items delivered ahead of higher classes by the starvation guard
+        self.promoted = 0
+
+    def __len__(self) -> int:
+        """Return the amount of buffered items."""
+        return self._size
+
+    def push(self, event: Event, item: Any = None) -> None:
+        """
+        Add an item to the class of its event.
+
+        :param event: Event to classify.
+        :param item: Item to deliver, the event itself when None.
+        """
+        self._queues[self._policy.classify(event)].append(
+            (time.monotonic(), event if item is None else item)
+        )
+        self._size += 1
+
+    def pop(self) -> Any:
+        """Remove and return the next item to deliver."""
+        if not self._size:
+            raise IndexError("pop from an empty priority buffer")
+
+        queues = [queue for queue in self._queues if queue]
+        chosen = queues[0]
+        max_delay = self._policy.max_delay
+        if max_delay is not None and len(queues) > 1:
+            # the starvation guard takes the longest waiting event that is overdue
+            oldest = min(queues[1:], key=lambda queue: queue[0][0])
+            if time.monotonic() - oldest[0][0] > max_delay and oldest[0][0] < chosen[0][0]:
+                chosen = oldest
+                self.promoted += 1
+
+        self._size -= 1
+        return chosen.popleft()[1]
+
+    def depths(self) -> list[int]:
+        """Return the amount of buffered items per class."""
+        return [len(queue) for queue in self._queues]
+
+
+async def prioritize(
+    events: AsyncIterator[Event | None],
+    policy: PriorityPolicy | None = None,
+    max_buffered: int = 1000,
+) -> AsyncIterator[Event]:
+    """
+    Iterate events in priority order, for example of CrownstoneSSEAsync.
+
+    The source is read in a background task while the consumer is busy,
+    so events that arrive meanwhile are delivered by priority instead of arrival.
+
+    :param events: Source of events. None events are skipped.
+    :param policy: Priority classes and starvation guard, the default classes when None.
+    :param max_buffered: Stop reading the source while this many events are buffered.
+    """
+    buffer = PriorityBuffer(policy)
+    condition = asyncio.Condition()
+    finished = False
+
+    async def read() -> None:
+        """Move events from the source to the buffer."""
+        nonlocal finished
+        try:
+            async for event in events:
+                if event is None:
+                    continue
+                async with condition:
+                    await condition.wait_for(lambda: len(buffer) < max_buffered)
+                    buffer.push(event)
+                    condition.notify_all()
+        finally:
+            async with condition:
+                finished = True
+                condition.notify_all()
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: len(buffer) > 0 or finished)
+                if not buffer:
+                    break
+                event = buffer.pop()
+                condition.notify_all()
+            yield event
+        # raise the error of the source, if any
+        await reader
+    finally:
+        reader.cancel()
+
+
+class _LoopQueue:
+    """Queued listeners and running listener count of one event loop."""
+
+    def __init__(self, policy: PriorityPolicy | None) -> None:
+        """Initialize an empty queue."""
+        self.buffer = PriorityBuffer(policy)
+        self.running = 0
+
+
+class PriorityEventBus(EventBus):
+    """
+    Event bus running listeners with bounded concurrency, in priority order of their events.
+
+    Listeners that run on an event loop are queued while the maximum amount runs,
+    and started by the priority of their event when a running listener finishes.
+    Listeners are started in order within a class, but with more than one running at
+    the same time they can finish out of order. Use max_concurrent=1 to handle the
+    events of a crownstone or sphere strictly in order.
+    Every event loop has its own queue, so listeners handed over to the target loop
+    only run on that loop, and the queue of a loop is only used from its own thread.
+    Listeners fired without a running event loop are called directly, as with EventBus.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop | None = None,
+        metrics: bool = False,
+        policy: PriorityPolicy | None = None,
+        max_concurrent: int = 8,
+    ) -> None:
+        """
+        Initialize the event bus.
+
+        :param policy: Priority classes and starvation guard, the default classes when None.
+        :param max_concurrent: Maximum amount of listeners running at the same time, per event loop.
+            Only 1 keeps listeners of events in the same class from overlapping.
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1.")
+        super().__init__(loop=loop, metrics=metrics)
+        self._policy = policy
+        self._max_concurrent = max_concurrent
+        self._loop_queues: dict[asyncio.AbstractEventLoop, _LoopQueue] = {}
+        self._loop_queues_lock = threading.Lock()
+
+    def queue_depths(self) -> list[int]:
+        """Return the amount of queued listener calls per priority class, of all loops."""
+        with self._loop_queues_lock:
+            queues = list(self._loop_queues.values())
+        depths = [0] * (self._policy or PriorityPolicy()).class_count
+        for loop_queue in queues:
+            for index, depth in enumerate(loop_queue.buffer.depths()):
+                depths[index] += depth
+        return depths
+
+    def _schedule(
+        self, loop: asyncio.AbstractEventLoop, listener: Any, event: Event
+    ) -> None:
+        """Queue a listener, and start listeners while below the concurrency limit."""
+        loop_queue = self._loop_queue(loop)
+        loop_queue.buffer.push(event, (listener, event))
+        self._start_listeners(loop, loop_queue)
+
+    def _create_listener_task(self, listener: Any, event: Event) -> None:
+        """Queue a coroutine listener handed over to the target event loop."""
+        self._schedule(asyncio.get_running_loop(), listener, event)
+
+    def _loop_queue(self, loop: asyncio.AbstractEventLoop) -> _LoopQueue:
+        """Return the queue of an event loop."""
+        loop_queue = self._loop_queues.get(loop)
+        if loop_queue is None:
+            with self._loop_queues_lock:
+                loop_queue = self._loop_queues.setdefault(loop, _LoopQueue(self._policy))
+        return loop_queue
+
+    def _start_listeners(
+        self, loop: asyncio.AbstractEventLoop, loop_queue: _LoopQueue
+    ) -> None:
+        """Start queued listeners of a loop by priority, up to the concurrency limit."""
+        while loop_queue.running < self._max_concurrent and loop_queue.buffer:
+            listener, event = loop_queue.buffer.pop()
+            future: asyncio.Future[Any]
+            if asyncio.iscoroutine(listener):
+                future = loop.create_task(listener)
+            elif asyncio.iscoroutinefunction(listener):
+                future = loop.create_task(listener(event))
+            else:
+                future = loop.run_in_executor(None, listener, event)
+            loop_queue.running += 1
+            future.add_done_callback(self._listener_done)
+
+    def _listener_done(self, future: asyncio.Future[Any]) -> None:
+        """Start the next queued listener of the loop the finished listener ran on."""
+        loop = future.get_loop()
+        loop_queue = self._loop_queue(loop)
+        loop_queue.running -= 1
+        if not future.cancelled() and future.exception() is not None:
+            _LOGGER.error("Error in event listener", exc_info=future.exception())
+        self._start_listeners(loop, loop_queue)
@@ -0,0 +1,225 @@
+"""
+Per-stage profiling of the event pipeline of CrownstoneSSEAsync.
+
+Every Nth event is sampled. For a sampled event, the time spent in each stage is
+recorded: waiting for the line, reading it from the socket, decoding it,
+json.loads, parse_event, and dispatch, the time the consumer takes before asking
+for the next event (like EventBus.fire in CrownstoneSSE).
+
+Waiting and reading happen in the same await. Reading is the CPU time of the
+thread during that await, waiting the rest. Other tasks running on the same event
+loop meanwhile are counted as reading. Waiting is idle time, not a cost of the
+pipeline, and is left out of the shares.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from crownstone_sse.events import Event
+
+_LOGGER = logging.getLogger(__name__)
+
+STAGE_WAIT = "wait"
+STAGE_READ = "read"
+STAGE_DECODE = "decode"
+STAGE_JSON = "json"
+STAGE_PARSE = "parse"
+STAGE_DISPATCH = "dispatch"
+
+STAGES = [STAGE_WAIT, STAGE_READ, STAGE_DECODE, STAGE_JSON, STAGE_PARSE, STAGE_DISPATCH]
+# stages that cost CPU time, all but waiting
+COST_STAGES = STAGES[1:]
+
+
+@dataclass
+class PipelineSample:
+    """Stage timings in seconds of a single sampled event."""
+
+    # monotonic time the sample started
+    started: float
+    event_type: str | None = None
+    timings: dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+    _last: float = field(default=0.0, repr=False)
+    # thread CPU time at the previous lap
+    _last_cpu: float = field(default=0.0, repr=False)
+
+    def lap(self, stage: str) -> None:
+        """Add the time since the previous lap to a stage."""
+        now = time.perf_counter()
+        self.timings[stage] += now - self._last
+        self._last = now
+        self._last_cpu = time.thread_time()
+
+    def lap_read(self) -> None:
+        """Split the time since the previous lap into reading and waiting for a line."""
+        now = time.perf_counter()
+        cpu = time.thread_time()
+        elapsed = now - self._last
+        read = min(max(cpu - self._last_cpu, 0.0), elapsed)
+        self.timings[STAGE_READ] += read
+        self.timings[STAGE_WAIT] += elapsed - read
+        self._last = now
+        self._last_cpu = cpu
+
+    def restart(self) -> None:
+        """Forget the timings so far, after a reconnect."""
+        self.started = time.monotonic()
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self._last = time.perf_counter()
+        self._last_cpu = time.thread_time()
+
+
+@dataclass
+class StageSummary:
+    """Cost of a stage over the sampled events of a period."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """Return the mean time in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class PipelineSummary:
+    """Cost per stage over a period."""
+
+    start: float
+    end: float
+    samples: int
+    stages: dict[str, StageSummary]
+
+    def shares(self) -> dict[str, float]:
+        """Return the fraction of the sampled cost spent in each stage, without waiting."""
+        costs = {name: self.stages[name] for name in COST_STAGES if name in self.stages}
+        total = sum(stage.total for stage in costs.values())
+        return {name: stage.total / total if total else 0.0 for name, stage in costs.items()}
+
+
+class PipelineProfiler:
+    """Sample the stage timings of the event pipeline."""
+
+    def __init__(
+        self,
+        sample_every: int = 100,
+        on_sample: Callable[[PipelineSample], Any] | None = None,
+        on_summary: Callable[[PipelineSummary], Any] | None = None,
+        summary_interval: float | None = 60.0,
+    ) -> None:
+        """
+        Initialize the profiler.
+
+        :param sample_every: Sample one of every this many events.
+        :param on_sample: Called with every completed sample, for tracing integrations.
+        :param on_summary: Called with the summary of every interval.
+            When None, the summary is logged.
+        :param summary_interval: Seconds between summaries, or None for no periodic summaries.
+        """
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1.")
+        self._sample_every = sample_every
+        self._on_sample = on_sample
+        self._on_summary = on_summary
+        self._summary_interval = summary_interval
+
+        self._counter = 0
+        # sampled event returned to the consumer, waiting for its dispatch time
+        self._dispatching: PipelineSample | None = None
+        self._lock = threading.Lock()
+        self._period_start = time.monotonic()
+        self._samples = 0
+        self._stages = {stage: StageSummary() for stage in STAGES}
+
+    def begin(self) -> PipelineSample | None:
+        """
+        Start the next event, return a sample when it is sampled.
+
+        Completes the dispatch stage of the previous sampled event.
+        """
+        if self._dispatching is not None:
+            sample = self._dispatching
+            self._dispatching = None
+            sample.lap(STAGE_DISPATCH)
+            self._complete(sample)
+
+        self._counter += 1
+        if self._counter < self._sample_every:
+            return None
+        self._counter = 0
+        return PipelineSample(
+            time.monotonic(), _last=time.perf_counter(), _last_cpu=time.thread_time()
+        )
+
+    def end(self, sample: PipelineSample, event: Event | None) -> None:
+        """Mark a sampled event as returned to the consumer."""
+        sample.event_type = event.type if event is not None else None
+        self._dispatching = sample
+
+    def close(self) -> None:
+        """Complete the last sample without dispatch time, when the client closes."""
+        if self._dispatching is not None:
+            sample = self._dispatching
+            self._dispatching = None
+            self._complete(sample)
+
+    def summary(self, reset: bool = False) -> PipelineSummary:
+        """Return the summary of the current period, optionally starting a new period."""
+        now = time.monotonic()
+        with self._lock:
+            summary = PipelineSummary(
+                self._period_start,
+                now,
+                self._samples,
+                {
+                    name: StageSummary(stage.count, stage.total, stage.max)
+                    for name, stage in self._stages.items()
+                },
+            )
+            if reset:
+                self._period_start = now
+                self._samples = 0
+                self._stages = {stage: StageSummary() for stage in STAGES}
+        return summary
+
+    def _complete(self, sample: PipelineSample) -> None:
+        """Add a completed sample to the summary, and emit the summary when due."""
+        with self._lock:
+            self._samples += 1
+            for name, duration in sample.timings.items():
+                stage = self._stages[name]
+                stage.count += 1
+                stage.total += duration
+                stage.max = max(stage.max, duration)
+
+        if self._on_sample is not None:
+            self._on_sample(sample)
+
+        if (
+            self._summary_interval is not None
+            and time.monotonic() - self._period_start >= self._summary_interval
+        ):
+            self._emit_summary(self.summary(reset=True))
+
+    def _emit_summary(self, summary: PipelineSummary) -> None:
+        """Hand a summary to the callback, or log it."""
+        if self._on_summary is not None:
+            self._on_summary(summary)
+            return
+
+        shares = summary.shares()
+        stages = ", ".join(
+            f"{name} {summary.stages[name].mean * 1e6:.1f}us ({share:.0%})"
+            for name, share in shares.items()
+        )
+        waited = summary.stages[STAGE_WAIT].mean * 1e3
+        _LOGGER.info(
+            f"Pipeline cost per event over {summary.samples} samples: {stages}, "
+            f"waited {waited:.1f}ms"
+        )
@@ -0,0 +1,204 @@
+"""
+Record and replay the raw SSE byte stream.
+
+A recording stores every line of the stream with its arrival time.
+Replaying feeds the recording through the parsing and dispatch path of
+CrownstoneSSEAsync, at real time, a multiple of it, or as fast as possible.
+"""
+from __future__ import annotations
+
+import asyncio
+import struct
+import threading
+import time
+from typing import IO, Any, AsyncIterator, Iterator
+
+from crownstone_sse.async_client import AsyncClientState, CrownstoneSSEAsync
+
+RECORDING_MAGIC = b"CSSREC\0\0"
+RECORDING_VERSION = 1
+
+_FILE_HEADER = struct.Struct("<8sH")
+# seconds since start of the recording, line length
+_LINE_HEADER = struct.Struct("<dI")
+
+# status code used by the replay to end the iteration, like a closed stream
+_STATUS_DONE = 204
+# lines replayed between yielding to the event loop, when replaying as fast as possible
+_YIELD_EVERY = 64
+
+
+class RecordingError(Exception):
+    """Recording file is invalid or of an unsupported version."""
+
+
+class StreamRecorder:
+    """Record the raw lines of the SSE stream with their arrival time."""
+
+    def __init__(self, path: str) -> None:
+        """Create a new recording file."""
+        self._file: IO[bytes] | None = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, line: bytes) -> None:
+        """Record a single line of the stream."""
+        offset = time.monotonic() - self._started
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_LINE_HEADER.pack(offset, len(line)))
+            self._file.write(line)
+
+    def close(self) -> None:
+        """Close the recording file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> StreamRecorder:
+        """Use the recorder as context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the recording when leaving the context."""
+        self.close()
+
+
+def iter_recording(path: str) -> Iterator[tuple[float, bytes]]:
+    """Yield (seconds since start, line) of a recording."""
+    with open(path, "rb") as file:
+        header = file.read(_FILE_HEADER.size)
+        if len(header) < _FILE_HEADER.size:
+            raise RecordingError("Recording is truncated.")
+        magic, version = _FILE_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC:
+            raise RecordingError("Not a Crownstone SSE recording.")
+        if version != RECORDING_VERSION:
+            raise RecordingError(f"Unsupported recording version {version}.")
+
+        while True:
+            line_header = file.read(_LINE_HEADER.size)
+            if len(line_header) < _LINE_HEADER.size:
+                return
+            arrival, length = _LINE_HEADER.unpack(line_header)
+            line = file.read(length)
+            if len(line) < length:
+                # recording was interrupted during a write
+                return
+            yield arrival, line
+
+
+class _ReplayContent:
+    """Replays recorded lines, paced like the original stream."""
+
+    def __init__(self, response: _ReplayResponse, path: str, speed: float | None) -> None:
+        """Initialize the replay content."""
+        self._response = response
+        self._path = path
+        self._speed = speed
+        self._exception: BaseException | None = None
+        self._lines: Iterator[tuple[float, bytes]] | None = None
+        self._started = 0.0
+        self._count = 0
+
+    def set_exception(self, exc: BaseException) -> None:
+        """Stop the replay with an exception, like aiohttp's StreamReader."""
+        self._exception = exc
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        """Return the line iterator."""
+        return self
+
+    async def __anext__(self) -> bytes:
+        """Return the next line once it is due."""
+        if self._exception is not None:
+            raise self._exception
+        if self._lines is None:
+            self._lines = iter_recording(self._path)
+            self._started = time.monotonic()
+
+        try:
+            arrival, line = next(self._lines)
+        except StopIteration:
+            self._response.status = _STATUS_DONE
+            raise StopAsyncIteration from None
+
+        if self._speed:
+            delay = self._started + arrival / self._speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # as fast as possible, but still let other tasks run once in a while
+            self._count += 1
+            if self._count % _YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+
+        if self._exception is not None:
+            raise self._exception
+        return line
+
+
+class _ReplayResponse:
+    """Stand-in for the aiohttp ClientResponse of the SSE stream."""
+
+    def __init__(self, path: str, speed: float | None) -> None:
+        """Initialize the response."""
+        self.status = 200
+        self.content = _ReplayContent(self, path, speed)
+
+    def close(self) -> None:
+        """Nothing to close for a replay."""
+
+
+class _ReplaySession:
+    """Stand-in for the aiohttp ClientSession, a replay makes no requests."""
+
+    auto_decompress = True
+
+    async def close(self) -> None:
+        """Nothing to close for a replay."""
+
+
+class CrownstoneSSEReplay(CrownstoneSSEAsync):
+    """Async iterator replaying a recorded stream, without network."""
+
+    def __init__(self, path: str, speed: float | None = 1.0, **kwargs: Any) -> None:
+        """
+        Initialize the replay client.
+
+        :param path: Path of a recording made with StreamRecorder.
+        :param speed: Replay speed as multiple of real time.
+            Use None to replay as fast as possible.
+        :param kwargs: Additional arguments for CrownstoneSSEAsync.
+        """
+        kwargs.setdefault("email", "")
+        kwargs.setdefault("password", "")
+        kwargs.setdefault("access_token", "replay")
+        # no HTTP session is created, so a replay can be set up outside an event loop
+        kwargs.setdefault("websession", _ReplaySession())
+        super().__init__(**kwargs)
+        self._path = path
+        self._speed = speed
+
+    async def __aenter__(self) -> CrownstoneSSEReplay:
+        """Start replaying the recording."""
+        await self._async_connect()
+        return self
+
+    async def _async_login(self) -> None:
+        """No login required for a replay."""
+
+    async def _async_connect(self) -> None:
+        """Open the recording instead of a connection."""
+        self._client_response = _ReplayResponse(  # type: ignore[assignment]
+            self._path, self._speed
+        )
+        self._generation += 1
+        self._sequence = 0
+        self._set_state(AsyncClientState.RUNNING)
+
+    async def _async_reconnect(self, reason: str = "") -> None:
+        """Continue with the recording, like the server cached the missed events."""
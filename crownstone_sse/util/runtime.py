@@ -0,0 +1,190 @@
+"""
+Shared background runtime for threaded Crownstone SSE clients.
+
+A runtime owns one or more event loop threads. Many CrownstoneSSE
+instances can be hosted on the same runtime, so a sync application
+with many accounts does not need a thread and event loop per account.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, TypeVar
+
+import aiohttp
+
+from crownstone_sse.helpers.aiohttp_client import create_client_session
+from crownstone_sse.helpers.event_loop import LoopFactory, get_loop_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class _LoopThread(threading.Thread):
+    """Thread running a single event loop forever."""
+
+    def __init__(self, name: str, loop_factory: LoopFactory) -> None:
+        """Initialize the loop thread."""
+        super().__init__(name=name, daemon=True)
+        self.loop = loop_factory()
+        self.websession: aiohttp.ClientSession | None = None
+        self.task_count = 0
+        # threading.Thread has its own _started event
+        self._loop_running = threading.Event()
+
+    def run(self) -> None:
+        """Run the event loop until it is stopped."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._loop_running.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def wait_until_started(self) -> None:
+        """Block until the event loop is running."""
+        self._loop_running.wait()
+
+    def get_websession(self) -> aiohttp.ClientSession:
+        """Return the session shared by all clients on this loop."""
+        # only called from within the loop, no locking required
+        if self.websession is None or self.websession.closed:
+            self.websession = create_client_session()
+        return self.websession
+
+    async def async_close_websession(self) -> None:
+        """Close the shared session of this loop."""
+        if self.websession is not None:
+            await self.websession.close()
+            self.websession = None
+
+
+class SSERuntime:
+    """Pool of background event loops hosting many SSE client streams."""
+
+    def __init__(
+        self,
+        loops: int = 1,
+        name: str = "crownstone-sse",
+        loop_factory: LoopFactory | None = None,
+        allow_uvloop: bool = True,
+    ) -> None:
+        """
+        Initialize and start the runtime.
+
+        :param loops: Amount of event loop threads in the pool.
+            Clients are distributed over the loops with the least clients.
+        :param name: Name prefix for the loop threads.
+        :param loop_factory: Factory of the event loops.
+        :param allow_uvloop: Use uvloop when it is installed and no loop_factory is provided.
+        """
+        if loops < 1:
+            raise ValueError("A runtime requires at least one event loop.")
+
+        self._lock = threading.Lock()
+        self._closed = False
+        factory = get_loop_factory(loop_factory, allow_uvloop)
+        self._threads = [
+            _LoopThread(f"{name}-{index}", factory) for index in range(loops)
+        ]
+        for thread in self._threads:
+            thread.start()
+        for thread in self._threads:
+            thread.wait_until_started()
+
+    @property
+    def is_running(self) -> bool:
+        """Return whether the runtime accepts new clients."""
+        return not self._closed
+
+    def get_load(self) -> list[int]:
+        """Return the amount of running clients per event loop."""
+        return [thread.task_count for thread in self._threads]
+
+    def submit(
+        self, coro: Coroutine[Any, Any, _T]
+    ) -> tuple[asyncio.AbstractEventLoop, concurrent.futures.Future[_T]]:
+        """
+        Schedule a coroutine on the least loaded event loop.
+
+        Return the loop the coroutine runs on, and a future for its result.
+        """
+        with self._lock:
+            if self._closed:
+                coro.close()
+                raise RuntimeError("Cannot submit to a runtime that is shut down.")
+
+            thread = min(self._threads, key=lambda item: item.task_count)
+            thread.task_count += 1
+
+        future = asyncio.run_coroutine_threadsafe(coro, thread.loop)
+
+        def _task_done(_: concurrent.futures.Future[_T]) -> None:
+            """Release the slot of the finished task."""
+            with self._lock:
+                thread.task_count -= 1
+
+        future.add_done_callback(_task_done)
+        return thread.loop, future
+
+    def get_websession(self) -> aiohttp.ClientSession:
+        """
+        Return the aiohttp session of the running loop.
+
+        Must be called from within one of the runtime's event loops.
+        """
+        loop = asyncio.get_running_loop()
+        for thread in self._threads:
+            if thread.loop is loop:
+                return thread.get_websession()
+
+        raise RuntimeError("Not called from an event loop of this runtime.")
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """
+        Stop all event loops and wait for their threads to finish.
+
+        Clients that are still running should be stopped before,
+        their tasks are cancelled otherwise.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        for thread in self._threads:
+            future = asyncio.run_coroutine_threadsafe(
+                self._async_shutdown_loop(thread), thread.loop
+            )
+            try:
+                future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                _LOGGER.warning(f"Timeout shutting down event loop of {thread.name}.")
+            thread.loop.call_soon_threadsafe(thread.loop.stop)
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        _LOGGER.debug("Crownstone SSE runtime shut down.")
+
+    @staticmethod
+    async def _async_shutdown_loop(thread: _LoopThread) -> None:
+        """Cancel remaining tasks and close the session of a loop."""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await thread.async_close_websession()
+
+    def __enter__(self) -> SSERuntime:
+        """Use the runtime as context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Shut down the runtime when leaving the context."""
+        self.shutdown()
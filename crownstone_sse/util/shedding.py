@@ -0,0 +1,221 @@
+"""
+Consumer lag detection and load shedding for CrownstoneSSEAsync.
+
+The lag of the consumer is measured as the bytes received but not yet read,
+and the age of the oldest unread bytes. Past a threshold, the bytes waiting in
+the stream are read ahead, and events that carry no new information are dropped
+until the lag is below half the threshold again:
+pings, data changes followed by the same data change, and switch states
+followed by a newer switch state of the same crownstone.
+"""
+from __future__ import annotations
+
+import collections
+import json
+import time
+from typing import Any, Counter, Deque, Hashable, NamedTuple, Optional, Tuple
+
+from crownstone_sse.const import EVENT_DATA_CHANGE, EVENT_PING, EVENT_SWITCH_STATE_UPDATE
+
+SHED_PING = "ping"
+SHED_DUPLICATE_DATA_CHANGE = "duplicate_data_change"
+SHED_INTERMEDIATE_SWITCH_STATE = "intermediate_switch_state"
+
+SHED_REASONS = [SHED_PING, SHED_DUPLICATE_DATA_CHANGE, SHED_INTERMEDIATE_SWITCH_STATE]
+
+# line read ahead, its decoded data and supersede key
+_Entry = Tuple[bytes, Optional[dict], Optional[Hashable]]
+
+
+class ConsumerLag(NamedTuple):
+    """How far the consumer is behind the stream."""
+
+    # bytes received but not yet read by the consumer
+    buffered_bytes: int
+    # age of the oldest unread bytes, at the time of the last read
+    seconds: float
+
+
+class LoadShedder:
+    """Measure consumer lag, and drop low value events while lagging."""
+
+    def __init__(
+        self,
+        max_buffered_bytes: int = 256 * 1024,
+        max_lag: float = 2.0,
+        shed_pings: bool = True,
+        shed_data_changes: bool = True,
+        shed_switch_states: bool = True,
+    ) -> None:
+        """
+        Initialize the load shedder.
+
+        :param max_buffered_bytes: Start shedding when more bytes wait to be read.
+        :param max_lag: Start shedding when the oldest unread bytes are this many seconds old.
+        :param shed_pings: Drop ping events while lagging.
+        :param shed_data_changes: Drop data changes followed by the same data change while lagging.
+        :param shed_switch_states: Drop switch states followed by a newer switch state
+            of the same crownstone while lagging.
+        """
+        self._max_buffered_bytes = max_buffered_bytes
+        self._max_lag = max_lag
+        self._shed_pings = shed_pings
+        self._shed_data_changes = shed_data_changes
+        self._shed_switch_states = shed_switch_states
+        self._reader: _LookaheadReader | None = None
+        self._lag = ConsumerLag(0, 0.0)
+        self.lagging = False
+        self.shed_counts: dict[str, int] = dict.fromkeys(SHED_REASONS, 0)
+
+    def lag(self) -> ConsumerLag:
+        """Return the lag of the consumer, measured at the last read."""
+        return self._lag
+
+    def reader(self, content: Any) -> _LookaheadReader:
+        """Return the line reader of a stream, a new one after a reconnect."""
+        if self._reader is None or self._reader.content is not content:
+            self._reader = _LookaheadReader(self, content)
+            self._update(ConsumerLag(0, 0.0))
+        return self._reader
+
+    def shed(self, data: dict[str, Any]) -> str | None:
+        """Return the reason to drop the data of the line just read, or None to keep it."""
+        if not self.lagging or not isinstance(data, dict):
+            return None
+        event_type = data.get("type")
+        if event_type == EVENT_PING:
+            reason = SHED_PING if self._shed_pings else None
+        elif self._reader is None or not self._reader.superseded:
+            reason = None
+        elif event_type == EVENT_DATA_CHANGE:
+            reason = SHED_DUPLICATE_DATA_CHANGE
+        else:
+            reason = SHED_INTERMEDIATE_SWITCH_STATE
+
+        if reason is not None:
+            self.shed_counts[reason] += 1
+        return reason
+
+    def supersede_key(self, data: dict[str, Any]) -> Hashable | None:
+        """Return the key of events replacing each other, or None when never replaced."""
+        try:
+            event_type = data["type"]
+            if event_type == EVENT_SWITCH_STATE_UPDATE and self._shed_switch_states:
+                return (event_type, str(data["crownstone"]["id"]))
+            if event_type == EVENT_DATA_CHANGE and self._shed_data_changes:
+                return (
+                    event_type,
+                    data["subType"],
+                    data["operation"],
+                    str(data["sphere"]["id"]),
+                    str(data["changedItem"]["id"]),
+                )
+        except (KeyError, TypeError):
+            pass
+        return None
+
+    def _update(self, lag: ConsumerLag) -> bool:
+        """Update the lag, return whether to read ahead."""
+        self._lag = lag
+        if self.lagging:
+            # once lagging, shed until the lag is well below the threshold
+            self.lagging = (
+                lag.buffered_bytes > self._max_buffered_bytes / 2
+                or lag.seconds > self._max_lag / 2
+            )
+        else:
+            self.lagging = (
+                lag.buffered_bytes > self._max_buffered_bytes or lag.seconds > self._max_lag
+            )
+        return self.lagging
+
+
+class _LookaheadReader:
+    """Line iterator over the stream, reading ahead while the consumer lags."""
+
+    def __init__(self, shedder: LoadShedder, content: Any) -> None:
+        """Initialize the reader."""
+        self.content = content
+        # the decoded data of the line just returned when read ahead, to skip decoding it again
+        self.data: dict[str, Any] | None = None
+        # whether a later event read ahead replaces the line just returned
+        self.superseded = False
+        self._shedder = shedder
+        self._lines = content.__aiter__()
+        # replays have no buffer to measure
+        self._measured = hasattr(content, "total_bytes") and hasattr(content, "read_nowait")
+        # bytes returned to the consumer
+        self._position = 0
+        # stream size and time it was first seen, for the age of the unread bytes
+        self._arrivals: Deque[Tuple[int, float]] = collections.deque()
+        self._lookahead: Deque[_Entry] = collections.deque()
+        self._pending_keys: Counter[Hashable] = collections.Counter()
+        self._partial = b""
+
+    def __aiter__(self) -> _LookaheadReader:
+        """Return instance."""
+        return self
+
+    async def __anext__(self) -> bytes:
+        """Return the next line."""
+        if self._lookahead:
+            line, self.data, key = self._lookahead.popleft()
+            self.superseded = False
+            if key is not None:
+                self._pending_keys[key] -= 1
+                self.superseded = self._pending_keys[key] > 0
+        else:
+            self.data = None
+            self.superseded = False
+            try:
+                line = await self._lines.__anext__()
+            except StopAsyncIteration:
+                if not self._partial:
+                    raise
+                line = b""
+            if self._partial:
+                line = self._partial + line
+                self._partial = b""
+
+        self._position += len(line)
+        if self._measured:
+            if self._shedder._update(self._measure()) and not self._lookahead:
+                self._read_ahead()
+        return line
+
+    def _measure(self) -> ConsumerLag:
+        """Return the bytes not yet returned, and the age of the oldest of them."""
+        now = time.monotonic()
+        total = self.content.total_bytes
+        arrivals = self._arrivals
+        if not arrivals or total > arrivals[-1][0]:
+            arrivals.append((total, now))
+        while arrivals and arrivals[0][0] <= self._position:
+            arrivals.popleft()
+        # the oldest unread byte was received at the latest when first seen
+        seconds = now - arrivals[0][1] if arrivals else 0.0
+        return ConsumerLag(total - self._position, seconds)
+
+    def _read_ahead(self) -> None:
+        """Move the complete lines waiting in the stream to the lookahead."""
+        chunk = self.content.read_nowait(-1)
+        if not chunk:
+            return
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            line += b"\n"
+            data = None
+            key = None
+            if line.startswith(b"data:"):
+                try:
+                    data = json.loads(line[5:])
+                except ValueError:
+                    data = None
+                if isinstance(data, dict):
+                    key = self._shedder.supersede_key(data)
+                    if key is not None:
+                        self._pending_keys[key] += 1
+                else:
+                    data = None
+            self._lookahead.append((line, data, key))
@@ -0,0 +1,404 @@
+"""
+Snapshot and restore of the state model, for warm restarts.
+
+Snapshots use a compact, versioned binary format. All strings are stored
+once in a string table, records refer to them by index. Restoring maps
+the file in memory and decodes it in a single pass.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from crownstone_sse.util.state import (
+    AbilityState,
+    CrownstoneState,
+    LocationState,
+    SphereState,
+    StateStore,
+    UserState,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"CSSTATE\0"
+SNAPSHOT_VERSION = 2
+
+# magic, version, flags, crc32 of body, body length,
+# receive time, connection generation and sequence of the last applied event
+_HEADER = struct.Struct("<8sHHIQdIQ")
+_COUNT = struct.Struct("<I")
+_SPHERE = struct.Struct("<IIi")
+_CROWNSTONE = struct.Struct("<IIIihB")
+_ABILITY = struct.Struct("<IB")
+_LOCATION = struct.Struct("<III")
+_USER = struct.Struct("<IIIH")
+
+_NONE = 0xFFFFFFFF
+# header flag: the generation and sequence of the last event are set
+_FLAG_POSITION = 0x01
+_ABILITY_ENABLED = 0x01
+_ABILITY_SYNCED = 0x02
+
+
+class SnapshotError(Exception):
+    """Snapshot file is invalid or of an unsupported version."""
+
+
+@dataclass
+class SnapshotInfo:
+    """Metadata of a restored snapshot."""
+
+    version: int
+    # wall clock time the last applied event was received, to replay a journal from
+    last_event_time: float | None
+    # connection generation and sequence of the last applied event
+    last_event_position: tuple[int, int] | None
+
+
+class _StringTable:
+    """Deduplicating string table used while encoding."""
+
+    def __init__(self) -> None:
+        """Initialize an empty table."""
+        self.index: dict[str, int] = {}
+        self.strings: list[str] = []
+
+    def add(self, value: str | None) -> int:
+        """Return the index of a string, add it if new."""
+        if value is None:
+            return _NONE
+        index = self.index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.index[value] = index
+            self.strings.append(value)
+        return index
+
+
+def _copy_state(store: StateStore) -> tuple[Any, ...]:
+    """Take a consistent copy of the state, holding the lock as short as possible."""
+    with store.lock:
+        spheres = [
+            (item.sphere_id, item.name, item.unique_id)
+            for item in store.spheres.values()
+        ]
+        crownstones = [
+            (
+                item.cloud_id,
+                item.sphere_id,
+                item.name,
+                item.unique_id,
+                item.switch_state,
+                [
+                    (ability_type, ability.enabled, ability.synced_to_crownstone)
+                    for ability_type, ability in item.abilities.items()
+                ],
+            )
+            for item in store.crownstones.values()
+        ]
+        locations = [
+            (item.location_id, item.sphere_id, item.name)
+            for item in store.locations.values()
+        ]
+        users = [
+            (item.user_id, item.name, item.location_id, list(item.spheres))
+            for item in store.users.values()
+        ]
+        last_event = (store.last_event_time, store.last_event_position)
+
+    return spheres, crownstones, locations, users, last_event
+
+
+def encode_snapshot(store: StateStore) -> bytes:
+    """Encode the state in the binary snapshot format."""
+    spheres, crownstones, locations, users, last_event = _copy_state(store)
+    last_event_time, last_event_position = last_event
+
+    table = _StringTable()
+    records: list[bytes] = [_COUNT.pack(len(spheres))]
+    for sphere_id, name, unique_id in spheres:
+        records.append(
+            _SPHERE.pack(
+                table.add(sphere_id),
+                table.add(name),
+                -1 if unique_id is None else unique_id,
+            )
+        )
+
+    records.append(_COUNT.pack(len(crownstones)))
+    for cloud_id, sphere_id, name, unique_id, switch_state, abilities in crownstones:
+        records.append(
+            _CROWNSTONE.pack(
+                table.add(cloud_id),
+                table.add(sphere_id),
+                table.add(name),
+                -1 if unique_id is None else unique_id,
+                -1 if switch_state is None else switch_state,
+                len(abilities),
+            )
+        )
+        for ability_type, enabled, synced in abilities:
+            flags = (_ABILITY_ENABLED if enabled else 0) | (
+                _ABILITY_SYNCED if synced else 0
+            )
+            records.append(_ABILITY.pack(table.add(ability_type), flags))
+
+    records.append(_COUNT.pack(len(locations)))
+    for location_id, sphere_id, name in locations:
+        records.append(
+            _LOCATION.pack(table.add(location_id), table.add(sphere_id), table.add(name))
+        )
+
+    records.append(_COUNT.pack(len(users)))
+    for user_id, name, location_id, user_spheres in users:
+        records.append(
+            _USER.pack(
+                table.add(user_id),
+                table.add(name),
+                table.add(location_id),
+                len(user_spheres),
+            )
+        )
+        records.extend(_COUNT.pack(table.add(sphere_id)) for sphere_id in user_spheres)
+
+    # the string table is written before the records, so it can be decoded first
+    strings: list[bytes] = [_COUNT.pack(len(table.strings))]
+    for value in table.strings:
+        encoded = value.encode("utf-8")
+        strings.append(_COUNT.pack(len(encoded)))
+        strings.append(encoded)
+
+    body = b"".join(strings) + b"".join(records)
+    generation, sequence = last_event_position or (0, 0)
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        0 if last_event_position is None else _FLAG_POSITION,
+        zlib.crc32(body),
+        len(body),
+        math.nan if last_event_time is None else last_event_time,
+        generation,
+        sequence,
+    )
+    return header + body
+
+
+def write_snapshot(store: StateStore, path: str) -> None:
+    """Write a snapshot of the state to a file, atomically replacing the old one."""
+    data = encode_snapshot(store)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def decode_snapshot(
+    buffer: bytes | mmap.mmap, store: StateStore | None = None
+) -> tuple[StateStore, SnapshotInfo]:
+    """Decode a snapshot into a (new) state store."""
+    if len(buffer) < _HEADER.size:
+        raise SnapshotError("Snapshot is truncated.")
+
+    (
+        magic,
+        version,
+        flags,
+        crc,
+        body_length,
+        last_event_time,
+        generation,
+        sequence,
+    ) = _HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a Crownstone state snapshot.")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}.")
+
+    result = store if store is not None else StateStore()
+    # views must be released before a memory mapped buffer can be closed
+    with memoryview(buffer) as view, view[
+        _HEADER.size : _HEADER.size + body_length
+    ] as body:
+        if len(body) != body_length or zlib.crc32(body) != crc:
+            raise SnapshotError("Snapshot is corrupt.")
+
+        with result.lock:
+            _decode_body(body, result)
+            result.last_event_time = (
+                None if math.isnan(last_event_time) else last_event_time
+            )
+            result.last_event_position = (
+                (generation, sequence) if flags & _FLAG_POSITION else None
+            )
+
+    return result, SnapshotInfo(
+        version, result.last_event_time, result.last_event_position
+    )
+
+
+def _decode_body(body: memoryview, result: StateStore) -> None:
+    """Decode the string table and records into a state store."""
+    offset = 0
+    (string_count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    strings: list[str] = []
+    for _ in range(string_count):
+        (length,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        strings.append(str(body[offset : offset + length], "utf-8"))
+        offset += length
+
+    def string(index: int) -> str | None:
+        """Return the string at an index of the string table."""
+        return None if index == _NONE else strings[index]
+
+    result.spheres.clear()
+    result.crownstones.clear()
+    result.locations.clear()
+    result.users.clear()
+    result._crownstones_by_uid.clear()
+
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    end = offset + count * _SPHERE.size
+    for sphere_id, name, unique_id in _SPHERE.iter_unpack(body[offset:end]):
+        result.spheres[strings[sphere_id]] = SphereState(
+            strings[sphere_id], string(name), None if unique_id < 0 else unique_id
+        )
+    offset = end
+
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        (
+            cloud_id,
+            sphere_id,
+            name,
+            unique_id,
+            switch_state,
+            ability_count,
+        ) = _CROWNSTONE.unpack_from(body, offset)
+        offset += _CROWNSTONE.size
+        crownstone = CrownstoneState(
+            strings[cloud_id],
+            strings[sphere_id],
+            None if unique_id < 0 else unique_id,
+            string(name),
+            None if switch_state < 0 else switch_state,
+        )
+        for _ in range(ability_count):
+            ability_type, flags = _ABILITY.unpack_from(body, offset)
+            offset += _ABILITY.size
+            crownstone.abilities[strings[ability_type]] = AbilityState(
+                bool(flags & _ABILITY_ENABLED), bool(flags & _ABILITY_SYNCED)
+            )
+        result.crownstones[crownstone.cloud_id] = crownstone
+        if crownstone.unique_id is not None:
+            result._crownstones_by_uid[
+                (crownstone.sphere_id, crownstone.unique_id)
+            ] = crownstone
+
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    end = offset + count * _LOCATION.size
+    for location_id, sphere_id, name in _LOCATION.iter_unpack(body[offset:end]):
+        result.locations[strings[location_id]] = LocationState(
+            strings[location_id], strings[sphere_id], string(name)
+        )
+    offset = end
+
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        user_id, name, location_id, sphere_count = _USER.unpack_from(body, offset)
+        offset += _USER.size
+        user = UserState(strings[user_id], string(name))
+        for _ in range(sphere_count):
+            (sphere_id,) = _COUNT.unpack_from(body, offset)
+            offset += _COUNT.size
+            user.spheres.add(strings[sphere_id])
+            sphere = result.spheres.get(strings[sphere_id])
+            if sphere is not None:
+                sphere.users.add(user.user_id)
+        location = result.locations.get(string(location_id) or "")
+        if location is not None:
+            user.location_id = location.location_id
+            location.users.add(user.user_id)
+        result.users[user.user_id] = user
+
+
+def read_snapshot(
+    path: str, store: StateStore | None = None
+) -> tuple[StateStore, SnapshotInfo]:
+    """Restore the state from a snapshot file."""
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_snapshot(mapped, store)
+
+
+class SnapshotCheckpointer:
+    """Periodically write snapshots of a state store in a background thread."""
+
+    def __init__(self, store: StateStore, path: str, interval: float = 60) -> None:
+        """
+        Initialize the checkpointer.
+
+        :param store: State store to write snapshots of.
+        :param path: Path of the snapshot file.
+        :param interval: Time in seconds between checkpoints.
+            A checkpoint is skipped when the state didn't change.
+        """
+        self._store = store
+        self._path = path
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_checkpoint: tuple[float, tuple[int, int] | None] | None = None
+
+    def start(self) -> None:
+        """Start writing checkpoints."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="crownstone-sse-checkpoint", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, checkpoint: bool = True) -> None:
+        """Stop writing checkpoints, optionally write a final one."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if checkpoint:
+            self.checkpoint()
+
+    def checkpoint(self) -> bool:
+        """Write a snapshot if the state changed, return whether one was written."""
+        with self._store.lock:
+            last_event = (self._store.last_event_time, self._store.last_event_position)
+        if last_event[0] is None or last_event == self._last_checkpoint:
+            return False
+        try:
+            write_snapshot(self._store, self._path)
+        except OSError as err:
+            _LOGGER.warning(f"Failed to write state snapshot: {err}")
+            return False
+        self._last_checkpoint = last_event
+        return True
+
+    def _run(self) -> None:
+        """Write a checkpoint every interval until stopped."""
+        while not self._stop_event.wait(self._interval):
+            self.checkpoint()
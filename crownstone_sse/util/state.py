@@ -0,0 +1,509 @@
+"""
+In-memory state model of spheres, Crownstones, locations and users.
+
+The state is maintained incrementally from received SSE events,
+and indexed for constant time lookups.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from crownstone_sse.const import (
+    EVENT_ABILITY_CHANGE,
+    EVENT_DATA_CHANGE,
+    EVENT_DATA_CHANGE_CROWNSTONE,
+    EVENT_DATA_CHANGE_LOCATIONS,
+    EVENT_DATA_CHANGE_SPHERES,
+    EVENT_DATA_CHANGE_USERS,
+    EVENT_PRESENCE,
+    EVENT_PRESENCE_ENTER_LOCATION,
+    EVENT_PRESENCE_ENTER_SPHERE,
+    EVENT_PRESENCE_EXIT_LOCATION,
+    EVENT_PRESENCE_EXIT_SPHERE,
+    EVENT_SWITCH_STATE_UPDATE,
+    OPERATION_CREATE,
+    OPERATION_DELETE,
+    OPERATION_UPDATE,
+)
+from crownstone_sse.events import (
+    AbilityChangeEvent,
+    DataChangeEvent,
+    Event,
+    PresenceEvent,
+    SwitchStateUpdateEvent,
+)
+from crownstone_sse.util.eventbus import EventBus
+
+_LOGGER = logging.getLogger(__name__)
+
+# kinds of items in the state
+KIND_SPHERE = "sphere"
+KIND_CROWNSTONE = "crownstone"
+KIND_LOCATION = "location"
+KIND_USER = "user"
+
+# event types the state is maintained from
+STATE_EVENT_TYPES = [
+    EVENT_SWITCH_STATE_UPDATE,
+    EVENT_ABILITY_CHANGE,
+    EVENT_PRESENCE,
+    EVENT_DATA_CHANGE,
+]
+
+
+@dataclass
+class AbilityState:
+    """State of a single ability of a Crownstone."""
+
+    enabled: bool
+    synced_to_crownstone: bool
+
+
+@dataclass
+class CrownstoneState:
+    """State of a Crownstone."""
+
+    cloud_id: str
+    sphere_id: str
+    unique_id: int | None = None
+    name: str | None = None
+    switch_state: int | None = None
+    abilities: dict[str, AbilityState] = field(default_factory=dict)
+
+
+@dataclass
+class LocationState:
+    """State of a location, including the users present."""
+
+    location_id: str
+    sphere_id: str
+    name: str | None = None
+    users: set[str] = field(default_factory=set)
+
+
+@dataclass
+class UserState:
+    """State of a user, including the spheres and location the user is in."""
+
+    user_id: str
+    name: str | None = None
+    spheres: set[str] = field(default_factory=set)
+    location_id: str | None = None
+
+
+@dataclass
+class SphereState:
+    """State of a sphere, including the users present."""
+
+    sphere_id: str
+    name: str | None = None
+    unique_id: int | None = None
+    users: set[str] = field(default_factory=set)
+
+
+@dataclass
+class StateChange:
+    """Describes a single change made to the state."""
+
+    kind: str
+    operation: str
+    item_id: str
+    sphere_id: str
+
+
+class StateStore:
+    """Shared state model, updated incrementally from SSE events."""
+
+    def __init__(self) -> None:
+        """Initialize an empty state."""
+        self.spheres: dict[str, SphereState] = {}
+        self.crownstones: dict[str, CrownstoneState] = {}
+        self.locations: dict[str, LocationState] = {}
+        self.users: dict[str, UserState] = {}
+        # (sphere id, unique id) -> crownstone
+        self._crownstones_by_uid: dict[tuple[str, int], CrownstoneState] = {}
+        self._change_listeners: list[Callable[[StateChange], Any]] = []
+        # wall clock time the last applied event was received, and its connection
+        # generation and sequence, to continue from when replaying a journal
+        self.last_event_time: float | None = None
+        self.last_event_position: tuple[int, int] | None = None
+        # events may be applied from executor threads by the event bus
+        self.lock = threading.RLock()
+
+    def get_crownstone(self, cloud_id: str) -> CrownstoneState | None:
+        """Return a Crownstone by cloud id."""
+        return self.crownstones.get(cloud_id)
+
+    def get_crownstone_by_uid(
+        self, sphere_id: str, unique_id: int
+    ) -> CrownstoneState | None:
+        """Return a Crownstone by its unique id within a sphere."""
+        return self._crownstones_by_uid.get((sphere_id, int(unique_id)))
+
+    def get_sphere(self, sphere_id: str) -> SphereState | None:
+        """Return a sphere by id."""
+        return self.spheres.get(sphere_id)
+
+    def get_location(self, location_id: str) -> LocationState | None:
+        """Return a location by id."""
+        return self.locations.get(location_id)
+
+    def get_user(self, user_id: str) -> UserState | None:
+        """Return a user by id."""
+        return self.users.get(user_id)
+
+    def add_change_listener(
+        self, callback: Callable[[StateChange], Any]
+    ) -> Callable[[], None]:
+        """Listen to changes of the state, return function to remove the listener."""
+        self._change_listeners.append(callback)
+
+        def remove_listener() -> None:
+            """Remove the listener."""
+            try:
+                self._change_listeners.remove(callback)
+            except ValueError:
+                _LOGGER.warning("Error removing unknown listener.")
+
+        return remove_listener
+
+    def listen_to(self, bus: EventBus) -> Callable[[], None]:
+        """Keep the state updated from an event bus, return function to stop."""
+        removers = [
+            bus.add_event_listener(event_type, self.apply)
+            for event_type in STATE_EVENT_TYPES
+        ]
+
+        def remove_listeners() -> None:
+            """Stop listening to the event bus."""
+            for remove in removers:
+                remove()
+
+        return remove_listeners
+
+    def apply(self, event: Event) -> None:
+        """Apply a single event to the state."""
+        with self.lock:
+            changes: list[StateChange] = []
+            if isinstance(event, SwitchStateUpdateEvent):
+                self._apply_switch_state(event, changes)
+            elif isinstance(event, AbilityChangeEvent):
+                self._apply_ability(event, changes)
+            elif isinstance(event, PresenceEvent):
+                self._apply_presence(event, changes)
+            elif isinstance(event, DataChangeEvent):
+                self._apply_data_change(event, changes)
+            else:
+                return
+
+            receive_info = event.receive_info
+            if receive_info is not None:
+                self.last_event_time = receive_info.wall
+                self.last_event_position = (receive_info.generation, receive_info.sequence)
+            else:
+                self.last_event_time = time.time()
+                self.last_event_position = None
+
+        for change in changes:
+            for listener in self._change_listeners:
+                listener(change)
+
+    def _ensure_sphere(
+        self, data: dict[str, Any], changes: list[StateChange]
+    ) -> SphereState:
+        """Return the sphere of event data, create it if unknown."""
+        sphere_data = data["sphere"]
+        sphere_id = str(sphere_data["id"])
+        sphere = self.spheres.get(sphere_id)
+        if sphere is None:
+            sphere = SphereState(sphere_id)
+            self.spheres[sphere_id] = sphere
+            changes.append(
+                StateChange(KIND_SPHERE, OPERATION_CREATE, sphere_id, sphere_id)
+            )
+        if "name" in sphere_data:
+            sphere.name = str(sphere_data["name"])
+        if "uid" in sphere_data:
+            sphere.unique_id = int(sphere_data["uid"])
+        return sphere
+
+    def _ensure_crownstone(
+        self,
+        sphere_id: str,
+        stone_data: dict[str, Any],
+        changes: list[StateChange],
+    ) -> CrownstoneState:
+        """Return the Crownstone of event data, create it if unknown."""
+        cloud_id = str(stone_data["id"])
+        crownstone = self.crownstones.get(cloud_id)
+        if crownstone is None:
+            crownstone = CrownstoneState(cloud_id, sphere_id)
+            self.crownstones[cloud_id] = crownstone
+            changes.append(
+                StateChange(KIND_CROWNSTONE, OPERATION_CREATE, cloud_id, sphere_id)
+            )
+        if "name" in stone_data:
+            crownstone.name = str(stone_data["name"])
+        if "uid" in stone_data:
+            self._set_crownstone_uid(crownstone, int(stone_data["uid"]))
+        return crownstone
+
+    def _set_crownstone_uid(self, crownstone: CrownstoneState, unique_id: int) -> None:
+        """Set the unique id of a Crownstone, and keep the index updated."""
+        if crownstone.unique_id == unique_id:
+            return
+        if crownstone.unique_id is not None:
+            self._crownstones_by_uid.pop(
+                (crownstone.sphere_id, crownstone.unique_id), None
+            )
+        crownstone.unique_id = unique_id
+        self._crownstones_by_uid[(crownstone.sphere_id, unique_id)] = crownstone
+
+    def _ensure_user(self, user_id: str) -> UserState:
+        """Return a user, create it if unknown."""
+        user = self.users.get(user_id)
+        if user is None:
+            user = UserState(user_id)
+            self.users[user_id] = user
+        return user
+
+    def _apply_switch_state(
+        self, event: SwitchStateUpdateEvent, changes: list[StateChange]
+    ) -> None:
+        """Update the switch state of a Crownstone."""
+        sphere = self._ensure_sphere(event.data, changes)
+        crownstone = self._ensure_crownstone(
+            sphere.sphere_id, event.data["crownstone"], changes
+        )
+        switch_state = event.switch_state
+        if crownstone.switch_state != switch_state:
+            crownstone.switch_state = switch_state
+            changes.append(
+                StateChange(
+                    KIND_CROWNSTONE,
+                    OPERATION_UPDATE,
+                    crownstone.cloud_id,
+                    sphere.sphere_id,
+                )
+            )
+
+    def _apply_ability(
+        self, event: AbilityChangeEvent, changes: list[StateChange]
+    ) -> None:
+        """Update an ability of a Crownstone."""
+        sphere = self._ensure_sphere(event.data, changes)
+        crownstone = self._ensure_crownstone(
+            sphere.sphere_id, event.data["stone"], changes
+        )
+        ability = AbilityState(event.ability_enabled, event.ability_synced_to_crownstone)
+        if crownstone.abilities.get(event.ability_type) != ability:
+            crownstone.abilities[event.ability_type] = ability
+            changes.append(
+                StateChange(
+                    KIND_CROWNSTONE,
+                    OPERATION_UPDATE,
+                    crownstone.cloud_id,
+                    sphere.sphere_id,
+                )
+            )
+
+    def _apply_presence(self, event: PresenceEvent, changes: list[StateChange]) -> None:
+        """Update the users present in spheres and locations."""
+        sphere = self._ensure_sphere(event.data, changes)
+        user = self._ensure_user(event.user_id)
+        if "name" in event.data["user"]:
+            user.name = str(event.data["user"]["name"])
+
+        if event.sub_type == EVENT_PRESENCE_ENTER_SPHERE:
+            sphere.users.add(user.user_id)
+            user.spheres.add(sphere.sphere_id)
+
+        elif event.sub_type == EVENT_PRESENCE_EXIT_SPHERE:
+            sphere.users.discard(user.user_id)
+            user.spheres.discard(sphere.sphere_id)
+            # leaving a sphere also means leaving the location in it
+            current = self.locations.get(user.location_id or "")
+            if current is not None and current.sphere_id == sphere.sphere_id:
+                self._leave_location(user, changes)
+
+        elif event.sub_type == EVENT_PRESENCE_ENTER_LOCATION:
+            sphere.users.add(user.user_id)
+            user.spheres.add(sphere.sphere_id)
+            if user.location_id != event.location_id:
+                self._leave_location(user, changes)
+                location = self._ensure_location(
+                    sphere.sphere_id, event.data["location"], changes
+                )
+                location.users.add(user.user_id)
+                user.location_id = location.location_id
+
+        elif event.sub_type == EVENT_PRESENCE_EXIT_LOCATION:
+            if user.location_id == event.location_id:
+                self._leave_location(user, changes)
+
+        else:
+            return
+
+        changes.append(
+            StateChange(KIND_USER, OPERATION_UPDATE, user.user_id, sphere.sphere_id)
+        )
+
+    def _ensure_location(
+        self,
+        sphere_id: str,
+        location_data: dict[str, Any],
+        changes: list[StateChange],
+    ) -> LocationState:
+        """Return the location of event data, create it if unknown."""
+        location_id = str(location_data["id"])
+        location = self.locations.get(location_id)
+        if location is None:
+            location = LocationState(location_id, sphere_id)
+            self.locations[location_id] = location
+            changes.append(
+                StateChange(KIND_LOCATION, OPERATION_CREATE, location_id, sphere_id)
+            )
+        if "name" in location_data:
+            location.name = str(location_data["name"])
+        return location
+
+    def _leave_location(self, user: UserState, changes: list[StateChange]) -> None:
+        """Remove a user from its current location."""
+        if user.location_id is None:
+            return
+        location = self.locations.get(user.location_id)
+        if location is not None:
+            location.users.discard(user.user_id)
+            changes.append(
+                StateChange(
+                    KIND_LOCATION,
+                    OPERATION_UPDATE,
+                    location.location_id,
+                    location.sphere_id,
+                )
+            )
+        user.location_id = None
+
+    def _apply_data_change(
+        self, event: DataChangeEvent, changes: list[StateChange]
+    ) -> None:
+        """Create, update or delete items in the state."""
+        operation = event.operation
+        item_id = event.changed_item_id
+        item_name = event.data["changedItem"].get("name")
+
+        if event.sub_type == EVENT_DATA_CHANGE_SPHERES:
+            if operation == OPERATION_DELETE:
+                self._delete_sphere(item_id, changes)
+                return
+            sphere = self._ensure_sphere(event.data, changes)
+            if item_name is not None:
+                sphere.name = str(item_name)
+            if operation == OPERATION_UPDATE:
+                changes.append(
+                    StateChange(KIND_SPHERE, operation, item_id, sphere.sphere_id)
+                )
+            return
+
+        sphere = self._ensure_sphere(event.data, changes)
+        sphere_id = sphere.sphere_id
+
+        if event.sub_type == EVENT_DATA_CHANGE_CROWNSTONE:
+            if operation == OPERATION_DELETE:
+                self._delete_crownstone(item_id, changes)
+                return
+            crownstone = self._ensure_crownstone(
+                sphere_id, event.data["changedItem"], changes
+            )
+            if operation == OPERATION_UPDATE:
+                changes.append(
+                    StateChange(KIND_CROWNSTONE, operation, crownstone.cloud_id, sphere_id)
+                )
+
+        elif event.sub_type == EVENT_DATA_CHANGE_LOCATIONS:
+            if operation == OPERATION_DELETE:
+                self._delete_location(item_id, changes)
+                return
+            location = self._ensure_location(
+                sphere_id, event.data["changedItem"], changes
+            )
+            if operation == OPERATION_UPDATE:
+                changes.append(
+                    StateChange(KIND_LOCATION, operation, location.location_id, sphere_id)
+                )
+
+        elif event.sub_type == EVENT_DATA_CHANGE_USERS:
+            if operation == OPERATION_DELETE:
+                self._delete_user(item_id, sphere_id, changes)
+                return
+            user = self._ensure_user(item_id)
+            if item_name is not None:
+                user.name = str(item_name)
+            changes.append(StateChange(KIND_USER, operation, item_id, sphere_id))
+
+    def _delete_crownstone(self, cloud_id: str, changes: list[StateChange]) -> None:
+        """Remove a Crownstone from the state."""
+        crownstone = self.crownstones.pop(cloud_id, None)
+        if crownstone is None:
+            return
+        if crownstone.unique_id is not None:
+            self._crownstones_by_uid.pop(
+                (crownstone.sphere_id, crownstone.unique_id), None
+            )
+        changes.append(
+            StateChange(KIND_CROWNSTONE, OPERATION_DELETE, cloud_id, crownstone.sphere_id)
+        )
+
+    def _delete_location(self, location_id: str, changes: list[StateChange]) -> None:
+        """Remove a location from the state."""
+        location = self.locations.pop(location_id, None)
+        if location is None:
+            return
+        for user_id in location.users:
+            user = self.users.get(user_id)
+            if user is not None and user.location_id == location_id:
+                user.location_id = None
+        changes.append(
+            StateChange(KIND_LOCATION, OPERATION_DELETE, location_id, location.sphere_id)
+        )
+
+    def _delete_user(
+        self, user_id: str, sphere_id: str, changes: list[StateChange]
+    ) -> None:
+        """Remove a user from a sphere, and from the state if in no sphere anymore."""
+        user = self.users.get(user_id)
+        if user is None:
+            return
+        sphere = self.spheres.get(sphere_id)
+        if sphere is not None:
+            sphere.users.discard(user_id)
+        user.spheres.discard(sphere_id)
+        current = self.locations.get(user.location_id or "")
+        if current is not None and current.sphere_id == sphere_id:
+            self._leave_location(user, changes)
+        if not user.spheres:
+            self.users.pop(user_id)
+        changes.append(StateChange(KIND_USER, OPERATION_DELETE, user_id, sphere_id))
+
+    def _delete_sphere(self, sphere_id: str, changes: list[StateChange]) -> None:
+        """Remove a sphere and everything in it from the state."""
+        sphere = self.spheres.pop(sphere_id, None)
+        if sphere is None:
+            return
+        for crownstone in [
+            item for item in self.crownstones.values() if item.sphere_id == sphere_id
+        ]:
+            self._delete_crownstone(crownstone.cloud_id, changes)
+        for location in [
+            item for item in self.locations.values() if item.sphere_id == sphere_id
+        ]:
+            self._delete_location(location.location_id, changes)
+        for user_id in sphere.users:
+            user = self.users.get(user_id)
+            if user is not None:
+                user.spheres.discard(sphere_id)
+        changes.append(StateChange(KIND_SPHERE, OPERATION_DELETE, sphere_id, sphere_id))
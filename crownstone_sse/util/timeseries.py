@@ -0,0 +1,376 @@
+"""
+Per-Crownstone switch state history in ring buffers.
+
+Samples are stored as (monotonic timestamp, percentage) in arrays, using 9 bytes
+per sample. The arrays start small and double in size up to the capacity, after
+which the oldest samples are overwritten. NumPy is used for range queries when it
+is installed, the standard library array module otherwise.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from array import array
+from typing import Any, Callable, Sequence
+
+from crownstone_sse.const import EVENT_SWITCH_STATE_UPDATE
+from crownstone_sse.events import Event, SwitchStateUpdateEvent
+from crownstone_sse.util.eventbus import EventBus
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# one day at a sample per second
+DEFAULT_CAPACITY = 24 * 3600
+# samples allocated for a new buffer, doubled whenever it is full
+INITIAL_CAPACITY = 64
+NO_VALUE = -1
+
+
+def _search(
+    timestamps: Sequence[float], value: float, right: bool, low: int = 0, high: int | None = None
+) -> int:
+    """Binary search in sorted timestamps, like numpy searchsorted."""
+    if high is None:
+        high = len(timestamps)
+    while low < high:
+        middle = (low + high) // 2
+        if timestamps[middle] < value or (right and timestamps[middle] == value):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class SwitchStateBuffer:
+    """
+    Ring buffer of switch state samples of a single Crownstone.
+
+    Samples are addressed by their index in chronological order, from 0 for the
+    oldest to size - 1 for the most recent.
+    """
+
+    def __init__(
+        self, capacity: int, use_numpy: bool, initial_capacity: int = INITIAL_CAPACITY
+    ) -> None:
+        """
+        Initialize an empty buffer.
+
+        :param capacity: Maximum amount of samples, older samples are overwritten.
+        :param use_numpy: Store the samples in NumPy arrays.
+        :param initial_capacity: Amount of samples allocated at first.
+        """
+        self.capacity = capacity
+        self.size = 0
+        # index where the next sample is written
+        self._head = 0
+        self._numpy = use_numpy
+        self._timestamps: Any
+        self._values: Any
+        allocated = max(min(initial_capacity, capacity), 1)
+        if use_numpy:
+            self._timestamps = np.zeros(allocated, dtype=np.float64)
+            self._values = np.zeros(allocated, dtype=np.int8)
+        else:
+            self._timestamps = array("d", bytes(8 * allocated))
+            self._values = array("b", bytes(allocated))
+
+    @property
+    def allocated(self) -> int:
+        """Return the amount of samples the arrays currently hold."""
+        return len(self._timestamps)
+
+    def append(self, timestamp: float, percentage: int) -> None:
+        """Add a sample, overwriting the oldest when the buffer is full."""
+        head = self._head
+        if head == len(self._timestamps):
+            # only reached before the ring wraps, while the samples are stored in order
+            self._grow()
+        self._timestamps[head] = timestamp
+        self._values[head] = percentage
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self.size < self.capacity:
+            self.size += 1
+
+    def latest(self) -> tuple[float, int] | None:
+        """Return the most recent sample."""
+        if self.size == 0:
+            return None
+        index = self._head - 1 if self._head > 0 else self.capacity - 1
+        return float(self._timestamps[index]), int(self._values[index])
+
+    def search(self, value: float, right: bool = False) -> int:
+        """
+        Return the index where a timestamp would be inserted, like numpy searchsorted.
+
+        :param value: Timestamp to search.
+        :param right: Return the index after samples with the same timestamp,
+            instead of before.
+        """
+        if self.size < self.capacity:
+            return self._search_slots(value, right, 0, self.size)
+        # the oldest samples are from the head to the end, the newest before the head
+        head = self._head
+        index = self._search_slots(value, right, head, self.capacity)
+        if index < self.capacity:
+            return index - head
+        return self.capacity - head + self._search_slots(value, right, 0, head)
+
+    def slice(
+        self, first: int = 0, last: int | None = None
+    ) -> tuple[Sequence[float], Sequence[int]]:
+        """Return a copy of the samples from index first up to last."""
+        if last is None or last > self.size:
+            last = self.size
+        first = max(first, 0)
+        if last <= first:
+            return self._copy(0, 0)
+        offset = self._head if self.size == self.capacity else 0
+        begin = offset + first
+        end = offset + last
+        if end <= self.capacity:
+            return self._copy(begin, end)
+        if begin >= self.capacity:
+            return self._copy(begin - self.capacity, end - self.capacity)
+        # the requested samples wrap around the end of the arrays
+        older_timestamps, older_values = self._copy(begin, self.capacity)
+        newer_timestamps, newer_values = self._copy(0, end - self.capacity)
+        if self._numpy:
+            return (
+                np.concatenate((older_timestamps, newer_timestamps)),
+                np.concatenate((older_values, newer_values)),
+            )
+        return older_timestamps + newer_timestamps, older_values + newer_values
+
+    def samples(self) -> tuple[Sequence[float], Sequence[int]]:
+        """Return all samples in chronological order."""
+        return self.slice()
+
+    def _copy(self, begin: int, end: int) -> tuple[Sequence[float], Sequence[int]]:
+        """Return a copy of the samples stored from slot begin up to end."""
+        if self._numpy:
+            # numpy slices are views, copy them so later appends do not show
+            return self._timestamps[begin:end].copy(), self._values[begin:end].copy()
+        return self._timestamps[begin:end], self._values[begin:end]
+
+    def _search_slots(self, value: float, right: bool, low: int, high: int) -> int:
+        """Return the insertion slot of a timestamp in sorted slots from low up to high."""
+        if self._numpy:
+            return low + int(
+                np.searchsorted(
+                    self._timestamps[low:high], value, side="right" if right else "left"
+                )
+            )
+        return _search(self._timestamps, value, right, low, high)
+
+    def _grow(self) -> None:
+        """Double the allocated samples, up to the capacity."""
+        allocated = min(len(self._timestamps) * 2, self.capacity)
+        extra = allocated - len(self._timestamps)
+        if self._numpy:
+            self._timestamps = np.concatenate(
+                (self._timestamps, np.zeros(extra, dtype=np.float64))
+            )
+            self._values = np.concatenate((self._values, np.zeros(extra, dtype=np.int8)))
+        else:
+            self._timestamps.extend(array("d", bytes(8 * extra)))
+            self._values.extend(array("b", bytes(extra)))
+
+
+class SwitchStateHistory:
+    """Recent switch state history of all Crownstones, by sphere id and unique id."""
+
+    def __init__(
+        self, capacity: int = DEFAULT_CAPACITY, use_numpy: bool | None = None
+    ) -> None:
+        """
+        Initialize the history.
+
+        :param capacity: Maximum amount of samples kept per Crownstone.
+        :param use_numpy: Use NumPy arrays. Defaults to True when NumPy is installed.
+        """
+        if use_numpy and np is None:
+            raise ImportError("NumPy is not installed.")
+        self._capacity = capacity
+        self._numpy = np is not None if use_numpy is None else use_numpy
+        # unique ids are only unique within a sphere
+        self._buffers: dict[tuple[str, int], SwitchStateBuffer] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def crownstones(self) -> list[tuple[str, int]]:
+        """Return the sphere id and unique id of Crownstones with history."""
+        with self._lock:
+            return list(self._buffers)
+
+    def listen_to(self, bus: EventBus) -> Callable[[], None]:
+        """Record switch states from an event bus, return function to stop."""
+        return bus.add_event_listener(EVENT_SWITCH_STATE_UPDATE, self.apply)
+
+    def apply(self, event: Event, timestamp: float | None = None) -> None:
+        """Record the switch state of a switch state update event."""
+        if isinstance(event, SwitchStateUpdateEvent):
+            self.append(event.sphere_id, event.unique_id, event.switch_state, timestamp)
+
+    def append(
+        self,
+        sphere_id: str,
+        unique_id: int,
+        percentage: int,
+        timestamp: float | None = None,
+    ) -> None:
+        """Record a switch state sample."""
+        key = (str(sphere_id), int(unique_id))
+        with self._lock:
+            # taken within the lock, so concurrent appends stay in chronological order
+            if timestamp is None:
+                timestamp = time.monotonic()
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = SwitchStateBuffer(self._capacity, self._numpy)
+                self._buffers[key] = buffer
+            buffer.append(timestamp, percentage)
+
+    def latest(self, sphere_id: str, unique_id: int) -> tuple[float, int] | None:
+        """Return the most recent (timestamp, percentage) of a Crownstone."""
+        with self._lock:
+            buffer = self._buffers.get((str(sphere_id), int(unique_id)))
+            return buffer.latest() if buffer is not None else None
+
+    def range(
+        self,
+        sphere_id: str,
+        unique_id: int,
+        start: float | None = None,
+        end: float | None = None,
+    ) -> tuple[Sequence[float], Sequence[int]]:
+        """Return timestamps and percentages with start <= timestamp < end."""
+        with self._lock:
+            buffer = self._buffers.get((str(sphere_id), int(unique_id)))
+            if buffer is None:
+                return self._empty()
+            first = 0 if start is None else buffer.search(start)
+            last = buffer.size if end is None else buffer.search(end)
+            return buffer.slice(first, last)
+
+    def resample(
+        self, sphere_id: str, unique_id: int, start: float, end: float, step: float
+    ) -> tuple[Sequence[float], Sequence[int]]:
+        """
+        Return the switch state at regular intervals between start and end.
+
+        Each value is the last known percentage at that time, or NO_VALUE if unknown.
+        """
+        with self._lock:
+            buffer = self._buffers.get((str(sphere_id), int(unique_id)))
+            if buffer is None:
+                timestamps, values = self._empty()
+            else:
+                # the samples within the period, and the last one before it
+                first = buffer.search(start, True) - 1
+                timestamps, values = buffer.slice(first, buffer.search(end))
+        count = max(int(math.ceil((end - start) / step)), 0)
+
+        if self._numpy:
+            grid = start + np.arange(count, dtype=np.float64) * step
+            indices = np.searchsorted(timestamps, grid, side="right") - 1
+            result = np.where(
+                indices >= 0, np.asarray(values)[np.maximum(indices, 0)], NO_VALUE
+            ).astype(np.int8)
+            return grid, result
+
+        grid_list = [start + index * step for index in range(count)]
+        result_array = array("b")
+        for moment in grid_list:
+            index = _search(timestamps, moment, True) - 1
+            result_array.append(values[index] if index >= 0 else NO_VALUE)
+        return grid_list, result_array
+
+    def downsample(
+        self, sphere_id: str, unique_id: int, start: float, end: float, bucket: float
+    ) -> tuple[Sequence[float], Sequence[float]]:
+        """
+        Return the mean percentage of the samples per bucket between start and end.
+
+        Buckets without samples have a NaN mean.
+        """
+        timestamps, values = self.range(sphere_id, unique_id, start, end)
+        count = max(int(math.ceil((end - start) / bucket)), 0)
+
+        if self._numpy:
+            bucket_starts = start + np.arange(count, dtype=np.float64) * bucket
+            indices = ((np.asarray(timestamps) - start) // bucket).astype(np.int64)
+            sums = np.bincount(indices, weights=values, minlength=count)[:count]
+            counts = np.bincount(indices, minlength=count)[:count]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums / counts
+            return bucket_starts, means
+
+        sums_list = [0.0] * count
+        counts_list = [0] * count
+        for timestamp, value in zip(timestamps, values):
+            index = min(int((timestamp - start) // bucket), count - 1)
+            sums_list[index] += value
+            counts_list[index] += 1
+        return [start + index * bucket for index in range(count)], [
+            total / amount if amount else math.nan
+            for total, amount in zip(sums_list, counts_list)
+        ]
+
+    def average(self, sphere_id: str, unique_id: int, start: float, end: float) -> float:
+        """
+        Return the time weighted mean percentage between start and end.
+
+        The state before the first sample is unknown and not included.
+        Returns NaN when the state is unknown for the whole period.
+        """
+        with self._lock:
+            buffer = self._buffers.get((str(sphere_id), int(unique_id)))
+            if buffer is None:
+                return math.nan
+            first = buffer.search(start, True) - 1
+            last = buffer.search(end)
+            if last <= 0 or first >= last:
+                return math.nan
+            # the samples within the period, and the last one before it
+            timestamps, values = buffer.slice(first, last)
+        last = len(timestamps)
+
+        if self._numpy:
+            times = np.clip(np.asarray(timestamps), start, end)
+            durations = np.diff(np.append(times, end))
+            total_time = float(durations.sum())
+            if total_time <= 0:
+                return math.nan
+            weighted = np.asarray(values, dtype=np.float64) * durations
+            return float(weighted.sum()) / total_time
+
+        weighted_sum = 0.0
+        total = 0.0
+        for index in range(last):
+            begin = min(max(timestamps[index], start), end)
+            finish = timestamps[index + 1] if index + 1 < last else end
+            finish = min(max(finish, start), end)
+            weighted_sum += values[index] * (finish - begin)
+            total += finish - begin
+        return weighted_sum / total if total > 0 else math.nan
+
+    def clear(self, sphere_id: str | None = None, unique_id: int | None = None) -> None:
+        """Remove the history of one Crownstone, of a sphere, or of all Crownstones."""
+        with self._lock:
+            if sphere_id is None:
+                self._buffers.clear()
+            elif unique_id is None:
+                for key in [key for key in self._buffers if key[0] == str(sphere_id)]:
+                    del self._buffers[key]
+            else:
+                self._buffers.pop((str(sphere_id), int(unique_id)), None)
+
+    def _empty(self) -> tuple[Sequence[float], Sequence[int]]:
+        """Return empty timestamps and percentages."""
+        if self._numpy:
+            return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int8)
+        return array("d"), array("b")
@@ -0,0 +1,263 @@
+"""
+Schema validation of event data, at parse time.
+
+The required fields of every event type, like sphere.id or switchData[*].type,
+are checked with a validator compiled once per event type. On valid data, a validator is
+a single generated function of nested lookups and isinstance checks.
+Only when that fails, the data is checked field by field to describe the errors.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Tuple
+
+from crownstone_sse.const import (
+    EVENT_ABILITY_CHANGE,
+    EVENT_COMMAND,
+    EVENT_COMMAND_SWITCH_MULTIPLE_CROWNSTONES,
+    EVENT_DATA_CHANGE,
+    EVENT_PING,
+    EVENT_PRESENCE,
+    EVENT_SWITCH_STATE_UPDATE,
+    EVENT_SYSTEM,
+)
+
+STRING: Tuple[type, ...] = (str,)
+NUMBER: Tuple[type, ...] = (int, float)
+BOOLEAN: Tuple[type, ...] = (bool,)
+# ids are read as strings, but some are numeric
+IDENTIFIER: Tuple[type, ...] = (str, int)
+
+# field path -> accepted types, [*] checks every item of a list
+Schema = Dict[str, Tuple[type, ...]]
+
+SCHEMAS: dict[str, Schema] = {
+    EVENT_PING: {"counter": NUMBER},
+    # only what is needed to handle expired tokens and lost connections
+    EVENT_SYSTEM: {"subType": STRING},
+    EVENT_COMMAND: {"subType": STRING, "sphere.id": IDENTIFIER},
+    EVENT_SWITCH_STATE_UPDATE: {
+        "subType": STRING,
+        "sphere.id": IDENTIFIER,
+        "crownstone.id": IDENTIFIER,
+        "crownstone.uid": NUMBER,
+        "crownstone.percentage": NUMBER,
+    },
+    EVENT_DATA_CHANGE: {
+        "subType": STRING,
+        "operation": STRING,
+        "sphere.id": IDENTIFIER,
+        "changedItem.id": IDENTIFIER,
+        "changedItem.name": STRING,
+    },
+    EVENT_PRESENCE: {"subType": STRING, "sphere.id": IDENTIFIER, "user.id": IDENTIFIER},
+    EVENT_ABILITY_CHANGE: {
+        "subType": STRING,
+        "sphere.id": IDENTIFIER,
+        "stone.id": IDENTIFIER,
+        "stone.uid": NUMBER,
+        "ability.type": STRING,
+        "ability.enabled": BOOLEAN,
+        "ability.syncedToCrownstone": BOOLEAN,
+    },
+}
+
+# (type, sub type) -> fields required in addition to those of the type
+SUB_TYPE_SCHEMAS: dict[tuple[str, str], Schema] = {
+    (EVENT_COMMAND, EVENT_COMMAND_SWITCH_MULTIPLE_CROWNSTONES): {
+        "switchData[*].id": IDENTIFIER,
+        "switchData[*].uid": NUMBER,
+        "switchData[*].type": STRING,
+    },
+}
+
+_LOOKUP_ERRORS = (KeyError, TypeError, IndexError)
+
+# marks a field that is not present
+_MISSING = object()
+
+_Path = Tuple[str, ...]
+
+
+class _CompiledSchema:
+    """Checks of a schema, with a fast path for valid data."""
+
+    def __init__(self, schema: Schema) -> None:
+        """Compile the schema."""
+        self._checks = [(path, _split(path), types) for path, types in schema.items()]
+        self.is_valid = _compile(self._checks)
+        # sub type -> schema including the fields of the type
+        self.sub_types: dict[str, _CompiledSchema] | None = None
+
+    def errors(self, data: dict[str, Any]) -> list[str]:
+        """Return a description of every field that is missing or of the wrong type."""
+        errors: list[str] = []
+        for path, (head, tail), types in self._checks:
+            if tail is None:
+                _check(data, path, head, types, errors)
+                continue
+
+            items = _lookup(data, head)
+            if items is _MISSING or not isinstance(items, list):
+                error = (
+                    f"{_join(head)}: missing"
+                    if items is _MISSING
+                    else f"{_join(head)}: expected a list, got {type(items).__name__}"
+                )
+                # once for all fields of the items
+                if error not in errors:
+                    errors.append(error)
+            else:
+                for index, item in enumerate(items):
+                    value = _lookup(item, tail)
+                    if value is _MISSING or not isinstance(value, types):
+                        _check(item, f"{_join(head)}[{index}].{_join(tail)}", tail, types, errors)
+        return errors
+
+
+class EventValidator:
+    """Validate event data against the schema of its type, counting the results."""
+
+    def __init__(
+        self,
+        schemas: dict[str, Schema] = SCHEMAS,
+        sub_type_schemas: dict[tuple[str, str], Schema] = SUB_TYPE_SCHEMAS,
+    ) -> None:
+        """
+        Compile the validators.
+
+        :param schemas: Required fields and their types per event type.
+            Event types without a schema are not validated.
+        :param sub_type_schemas: Additional required fields per event type and sub type.
+        """
+        self._validators = {
+            event_type: _CompiledSchema(schema) for event_type, schema in schemas.items()
+        }
+        for (event_type, sub_type), schema in sub_type_schemas.items():
+            validator = self._validators.setdefault(event_type, _CompiledSchema({}))
+            if validator.sub_types is None:
+                validator.sub_types = {}
+            validator.sub_types[sub_type] = _CompiledSchema(
+                {**schemas.get(event_type, {}), **schema}
+            )
+        # event type -> amount of invalid events
+        self.invalid_counts: dict[str, int] = {}
+
+    def validate(self, data: Any) -> list[str] | None:
+        """Return None when the data is valid, otherwise the errors found."""
+        try:
+            validator = self._validators.get(data["type"])
+        except (KeyError, TypeError):
+            if not isinstance(data, dict):
+                return self._invalid("", [f"expected an object, got {type(data).__name__}"])
+            return self._invalid(
+                "", ["type: missing" if "type" not in data else "type: expected str"]
+            )
+
+        # event types without a schema are not validated
+        if validator is None:
+            return None
+        if validator.sub_types is not None:
+            sub_type = data.get("subType")
+            if isinstance(sub_type, str):
+                validator = validator.sub_types.get(sub_type, validator)
+        if validator.is_valid(data):
+            return None
+        return self._invalid(data["type"], validator.errors(data))
+
+    def _invalid(self, event_type: str, errors: list[str]) -> list[str]:
+        """Count an invalid event, and return its errors."""
+        self.invalid_counts[event_type] = self.invalid_counts.get(event_type, 0) + 1
+        return errors
+
+
+def _split(path: str) -> tuple[_Path, _Path | None]:
+    """Split a path in the keys up to a list, and the keys within its items."""
+    if "[*]." in path:
+        head, tail = path.split("[*].", 1)
+        return tuple(head.split(".")), tuple(tail.split("."))
+    return tuple(path.split(".")), None
+
+
+def _join(keys: _Path) -> str:
+    """Return the path of keys."""
+    return ".".join(keys)
+
+
+def _lookup(data: Any, keys: _Path) -> Any:
+    """Return the value at the keys, or _MISSING."""
+    value = data
+    for key in keys:
+        try:
+            value = value[key]
+        except _LOOKUP_ERRORS:
+            return _MISSING
+    return value
+
+
+def _check(
+    data: Any, path: str, keys: _Path, types: tuple[type, ...], errors: list[str]
+) -> None:
+    """Add an error when the value at the keys is missing or of the wrong type."""
+    value = _lookup(data, keys)
+    if value is _MISSING:
+        errors.append(f"{path}: missing")
+    elif not isinstance(value, types):
+        expected = " or ".join(kind.__name__ for kind in types)
+        errors.append(f"{path}: expected {expected}, got {type(value).__name__}")
+
+
+def _compile(
+    checks: list[tuple[str, tuple[_Path, _Path | None], tuple[type, ...]]]
+) -> Callable[[dict[str, Any]], bool]:
+    """Return a function checking all fields, with each object looked up once."""
+    namespace: dict[str, Any] = {"_LOOKUP_ERRORS": _LOOKUP_ERRORS}
+    lines: list[str] = []
+    # objects with more than one checked field are kept in a local variable
+    parents: dict[_Path, int] = {}
+    for _, (head, tail), _ in checks:
+        if tail is None and len(head) > 1:
+            parents[head[:-1]] = parents.get(head[:-1], 0) + 1
+    local_names: dict[_Path, str] = {}
+    for parent, count in parents.items():
+        if count > 1:
+            local_names[parent] = f"v{len(local_names)}"
+            lines.append(f"{local_names[parent]} = data{_subscript(parent)}")
+
+    conditions: list[str] = []
+    # list path -> conditions on its items
+    item_conditions: dict[_Path, list[str]] = {}
+    for index, (_, (head, tail), types) in enumerate(checks):
+        namespace[f"T{index}"] = types
+        if tail is not None:
+            item_conditions.setdefault(head, []).append(
+                f"isinstance(item{_subscript(tail)}, T{index})"
+            )
+        elif head[:-1] in local_names:
+            conditions.append(
+                f"isinstance({local_names[head[:-1]]}{_subscript(head[-1:])}, T{index})"
+            )
+        else:
+            conditions.append(f"isinstance(data{_subscript(head)}, T{index})")
+
+    if conditions:
+        lines.append(f"if not ({' and '.join(conditions)}):")
+        lines.append("    return False")
+    for head, item_checks in item_conditions.items():
+        lines.append(f"items = data{_subscript(head)}")
+        lines.append("if not isinstance(items, list):")
+        lines.append("    return False")
+        lines.append("for item in items:")
+        lines.append(f"    if not ({' and '.join(item_checks)}):")
+        lines.append("        return False")
+    lines.append("return True")
+
+    source = "def is_valid(data):\n    try:\n"
+    source += "".join(f"        {line}\n" for line in lines)
+    source += "    except _LOOKUP_ERRORS:\n        return False\n"
+    exec(compile(source, "<event validator>", "exec"), namespace)  # pylint: disable=exec-used
+    return namespace["is_valid"]  # type: ignore[no-any-return]
+
+
+def _subscript(keys: _Path) -> str:
+    """Return the subscripts looking up the keys."""
+    return "".join(f"[{key!r}]" for key in keys)
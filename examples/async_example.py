@@ -7,6 +7,7 @@ Last update on 15-09-2022.
 import asyncio
 import logging
 from crownstone_sse import CrownstoneSSEAsync
+from crownstone_sse.helpers.event_loop import run
 
 # enable logging
 logging.basicConfig(format='%(levelname)s :%(message)s', level=logging.DEBUG)
@@ -47,7 +48,8 @@ async def process_events(sse_client: CrownstoneSSEAsync):
 
 
 try:
-    asyncio.run(main())
+    # like asyncio.run, using uvloop when it is installed.
+    run(main())
 except KeyboardInterrupt:
     pass
 finally:
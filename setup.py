@@ -10,7 +10,7 @@ setup(
     author='Crownstone B.V.',
     long_description=long_description,
     long_description_content_type="text/markdown",
-    packages=find_packages(exclude=['examples', 'tests']),
+    packages=find_packages(exclude=['benchmarks', 'examples', 'tests']),
     install_requires=list(package.strip() for package in open('requirements.txt')),
     classifiers=[
         'Programming Language :: Python :: 3.8',
@@ -0,0 +1,150 @@
+"""
+Stand-in SSE server that compresses the event stream.
+
+The compressor is flushed after every event, so the client can decompress
+and dispatch each event as soon as it arrives.
+"""
+from __future__ import annotations
+
+import asyncio
+import zlib
+from typing import Any, Callable
+
+from aiohttp import web
+
+from tests.mock_classes.standin_server import StandInServer, StreamConfig
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+ENCODING_IDENTITY = "identity"
+ENCODING_GZIP = "gzip"
+ENCODING_DEFLATE = "deflate"
+ENCODING_BROTLI = "br"
+ENCODING_ZSTD = "zstd"
+
+# response key of the compressor of a stream
+try:
+    _COMPRESSOR: Any = web.ResponseKey("compressor", object)
+except AttributeError:  # pragma: no cover
+    # aiohttp before 3.11
+    _COMPRESSOR = "compressor"
+
+Compressor = Callable[[bytes], bytes]
+
+
+def _zlib_compressor(wbits: int) -> Compressor:
+    """Return a gzip or deflate compressor flushing every call."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _brotli_compressor() -> Compressor:
+    """Return a brotli compressor flushing every call."""
+    compressor = brotli.Compressor()
+    return lambda data: bytes(compressor.process(data)) + bytes(compressor.flush())
+
+
+def _zstd_compressor() -> Compressor:
+    """Return a zstd compressor flushing every call."""
+    compressor = zstandard.ZstdCompressor().compressobj()
+    return lambda data: compressor.compress(data) + compressor.flush(
+        zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    )
+
+
+# encoding -> compressor factory, for the encodings available here
+COMPRESSORS: dict[str, Callable[[], Compressor]] = {
+    ENCODING_GZIP: lambda: _zlib_compressor(31),
+    ENCODING_DEFLATE: lambda: _zlib_compressor(15),
+}
+if brotli is not None:
+    COMPRESSORS[ENCODING_BROTLI] = _brotli_compressor
+if zstandard is not None:
+    COMPRESSORS[ENCODING_ZSTD] = _zstd_compressor
+
+ENCODINGS = [ENCODING_IDENTITY, *COMPRESSORS]
+
+
+class CompressingServer(StandInServer):
+    """Stand-in server compressing the stream with a fixed encoding."""
+
+    def __init__(
+        self,
+        config: StreamConfig | None = None,
+        encoding: str = ENCODING_GZIP,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """
+        Initialize the server.
+
+        :param encoding: Encoding to use, when the client accepts it.
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding}.")
+        super().__init__(config, host, port)
+        self.encoding = encoding
+        # compressed bytes written, excluding HTTP framing
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+
+    async def prepare_stream(self, request: web.Request) -> web.StreamResponse:
+        """Start the event stream, compressed when the client accepts the encoding."""
+        accepted = {
+            value.split(";")[0].strip()
+            for value in request.headers.get("Accept-Encoding", "").split(",")
+        }
+        headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        compressor = None
+        if self.encoding in COMPRESSORS and self.encoding in accepted:
+            headers["Content-Encoding"] = self.encoding
+            compressor = COMPRESSORS[self.encoding]()
+
+        response = web.StreamResponse(headers=headers)
+        response[_COMPRESSOR] = compressor
+        await response.prepare(request)
+        return response
+
+    async def write_event(
+        self, response: web.StreamResponse, template: dict[str, Any], sequence: int
+    ) -> None:
+        """Write an event, compressed and flushed on its own."""
+        data = self.encode_event(template, sequence)
+        self.bytes_uncompressed += len(data)
+        compressor = response.get(_COMPRESSOR)
+        if compressor is not None:
+            data = compressor(data)
+        self.bytes_sent += len(data)
+        await response.write(data)
+
+
+def run_compressing_server(
+    config: StreamConfig, host: str, port: int, encoding: str, bytes_sent: Any = None
+) -> None:
+    """
+    Run a compressing server forever, used as target of a separate process.
+
+    :param bytes_sent: Optional multiprocessing.Value to publish the bytes written to.
+    """
+
+    async def serve() -> None:
+        """Start the server, and publish the bytes written."""
+        server = CompressingServer(config, encoding, host, port)
+        await server.start()
+        while True:
+            if bytes_sent is not None:
+                bytes_sent.value = server.bytes_sent
+            await asyncio.sleep(0.05)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
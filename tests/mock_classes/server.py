@@ -0,0 +1,41 @@
+"""Stand-in Crownstone cloud running on its own event loop thread, for tests of the clients."""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any
+
+from tests.mock_classes.standin_server import StandInServer
+
+
+class ServerThread:
+    """Run a stand-in server in a thread, to point threaded clients at."""
+
+    def __init__(self, server: StandInServer) -> None:
+        """Initialize with the server to run."""
+        self.server = server
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self) -> StandInServer:
+        """Start the server."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result(10)
+        return self.server
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop the server and its thread."""
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self._loop).result(10)
+        asyncio.run_coroutine_threadsafe(_cancel_streams(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def _cancel_streams() -> None:
+    """Cancel the stream handlers still waiting for their client to disconnect."""
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,272 @@
+"""
+Local stand-in for the Crownstone cloud login and SSE endpoints.
+
+Streams a configurable mix of the mocked events at a configurable rate and payload size.
+Every event carries a sequence number and the monotonic time it was sent,
+so clients can measure throughput, latency and lost events.
+
+Run standalone with:
+    python -m tests.mock_classes.standin_server --port 8080 --rate 1000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+from tests.mocked_events import data_change_events, presence_events
+from tests.mocked_events.switch_state_update_events import switch_state_data
+from tests.mocked_replies.login_data import login_data
+
+LOGIN_PATH = "/api/users/login"
+SSE_PATH = "/sse"
+
+# fields added to every event by the stand-in server
+SEQUENCE_FIELD = "benchSeq"
+SENT_AT_FIELD = "benchSentAt"
+PADDING_FIELD = "benchPadding"
+
+MULTI_SWITCH_COMMAND = {
+    "type": "command",
+    "subType": "multiSwitch",
+    "sphere": {"id": "sphere_id", "uid": 84, "name": "sphere_name"},
+    "switchData": [
+        {"id": f"crownstone_{uid}", "uid": uid, "type": "PERCENTAGE", "percentage": 50}
+        for uid in range(1, 9)
+    ],
+}
+
+PING_EVENT = {"type": "ping", "counter": 1}
+
+STREAM_START_EVENT = {
+    "type": "system",
+    "subType": "STREAM_START",
+    "code": 200,
+    "message": "Stream Starting.",
+}
+
+
+# event kind -> templates to pick from
+EVENT_TEMPLATES: dict[str, list[dict[str, Any]]] = {
+    "switch_state": [switch_state_data(50)],
+    "presence": [
+        presence_events.enter_sphere,
+        presence_events.enter_location,
+        presence_events.exit_location,
+        presence_events.exit_sphere,
+    ],
+    "data_change": [
+        value
+        for name, value in vars(data_change_events).items()
+        if isinstance(value, dict) and not name.startswith("_")
+    ],
+    "command": [MULTI_SWITCH_COMMAND],
+    "ping": [PING_EVENT],
+}
+
+DEFAULT_MIX = {
+    "switch_state": 0.4,
+    "presence": 0.2,
+    "data_change": 0.2,
+    "command": 0.1,
+    "ping": 0.1,
+}
+
+
+@dataclass
+class StreamConfig:
+    """Configuration of the streamed events."""
+
+    # event kind -> relative weight
+    mix: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    # events per second, 0 for as fast as possible
+    rate: float = 0
+    # total amount of events per connection, 0 for endless
+    count: int = 0
+    # minimum size of the JSON payload in bytes
+    payload_size: int = 0
+    seed: int = 0
+
+
+class StandInServer:
+    """Stand-in Crownstone cloud, to point the client at with event_base_url and login_url."""
+
+    def __init__(
+        self, config: StreamConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        """Initialize the server."""
+        self.config = config or StreamConfig()
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.logins = 0
+        self._runner: web.AppRunner | None = None
+        self._site: web.TCPSite | None = None
+
+    @property
+    def login_url(self) -> str:
+        """Return the URL of the login endpoint."""
+        return f"http://{self.host}:{self.port}{LOGIN_PATH}"
+
+    @property
+    def event_base_url(self) -> str:
+        """Return the URL of the SSE endpoint, up to the access token."""
+        return f"http://{self.host}:{self.port}{SSE_PATH}?accessToken="
+
+    def create_app(self) -> web.Application:
+        """Return the aiohttp application."""
+        app = web.Application()
+        app.router.add_post(LOGIN_PATH, self.handle_login)
+        app.router.add_get(SSE_PATH, self.handle_stream)
+        return app
+
+    async def start(self) -> None:
+        """Start serving."""
+        # streams are kept open forever, do not wait for them when stopping
+        self._runner = web.AppRunner(self.create_app(), shutdown_timeout=0.1)
+        await self._runner.setup()
+        await self.start_listening()
+
+    async def start_listening(self) -> None:
+        """Start accepting connections."""
+        assert self._runner is not None
+        self._site = web.TCPSite(self._runner, self.host, self.port)
+        await self._site.start()
+        if self.port == 0:
+            server = self._site._server  # pylint: disable=protected-access
+            assert server is not None
+            self.port = server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    async def stop_listening(self) -> None:
+        """Stop accepting connections, existing connections stay open."""
+        if self._site is not None:
+            await self._site.stop()
+            self._site = None
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_login(self, request: web.Request) -> web.Response:
+        """Accept any credentials."""
+        self.logins += 1
+        return web.json_response(login_data)
+
+    async def handle_stream(self, request: web.Request) -> web.StreamResponse:
+        """Stream events to a client."""
+        self.connections += 1
+        response = await self.prepare_stream(request)
+        try:
+            await self.write_event(response, STREAM_START_EVENT, 0)
+
+            started = time.monotonic()
+            for sequence, template in enumerate(self.iter_events(), start=1):
+                await self.write_event(response, template, sequence)
+                if self.config.count and sequence >= self.config.count:
+                    break
+                await self.pace(sequence, started)
+
+            # keep the stream open like the real server, until the client disconnects
+            while True:
+                await asyncio.sleep(3600)
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def prepare_stream(self, request: web.Request) -> web.StreamResponse:
+        """Start the event stream response."""
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        return response
+
+    def iter_events(self) -> Any:
+        """Yield event templates according to the configured mix."""
+        rng = random.Random(self.config.seed)
+        kinds = [kind for kind in self.config.mix if self.config.mix[kind] > 0]
+        weights = [self.config.mix[kind] for kind in kinds]
+        while True:
+            for kind in rng.choices(kinds, weights, k=1024):
+                yield rng.choice(EVENT_TEMPLATES[kind])
+
+    async def pace(self, sequence: int, started: float) -> None:
+        """Wait to keep up the configured rate, yield to the loop when unlimited."""
+        if not self.config.rate:
+            if sequence % 64 == 0:
+                await asyncio.sleep(0)
+            return
+        delay = started + sequence / self.config.rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def write_event(
+        self, response: web.StreamResponse, template: dict[str, Any], sequence: int
+    ) -> None:
+        """Write an event with sequence number, send time and padding."""
+        await response.write(self.encode_event(template, sequence))
+
+    def encode_event(self, template: dict[str, Any], sequence: int) -> bytes:
+        """Return the SSE frame of an event."""
+        event = dict(template)
+        event[SEQUENCE_FIELD] = sequence
+        event[SENT_AT_FIELD] = time.monotonic()
+        payload = json.dumps(event)
+        missing = self.config.payload_size - len(payload)
+        if missing > 0:
+            event[PADDING_FIELD] = "x" * max(missing - len(PADDING_FIELD) - 6, 0)
+            payload = json.dumps(event)
+        return f"data:{payload}\n\n".encode("utf-8")
+
+
+def run_server(config: StreamConfig, host: str, port: int) -> None:
+    """Run a stand-in server forever, used as target of a separate process."""
+
+    async def serve() -> None:
+        """Start the server and wait forever."""
+        server = StandInServer(config, host, port)
+        await server.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Parse an event mix like 'switch_state=0.5,ping=0.5'."""
+    mix: dict[str, float] = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in EVENT_TEMPLATES:
+            raise argparse.ArgumentTypeError(f"Unknown event kind {kind}.")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main() -> None:
+    """Run the stand-in server from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rate", type=float, default=0)
+    parser.add_argument("--count", type=int, default=0)
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX))
+    args = parser.parse_args()
+    config = StreamConfig(args.mix, args.rate, args.count, args.payload_size)
+    print(f"Stand-in server on http://{args.host}:{args.port}")
+    run_server(config, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
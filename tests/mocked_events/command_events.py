@@ -1,3 +1,5 @@
+import copy
+
 switch_crownstone_command = {
   "type": "command",
   "subType": "switchCrownstone",
@@ -14,3 +16,26 @@ switch_crownstone_command = {
     "macAddress": "mac_address"
   }
 }
+
+multi_switch_command = {
+  "type": "command",
+  "subType": "multiSwitch",
+  "sphere": {
+    "id": "sphere_id",
+    "uid": 84,
+    "name": "sphere_name"
+  },
+  "switchData": [
+    {"id": "crownstone_id", "uid": 1, "type": "PERCENTAGE", "percentage": 100},
+    {"id": "other_id", "uid": 2, "type": "TURN_OFF"}
+  ]
+}
+
+
+def multi_switch_data(*switch_data, sphere_id="sphere_id"):
+    """Return multi switch command data, with the default switch data when none is given."""
+    data = copy.deepcopy(multi_switch_command)
+    data["sphere"]["id"] = sphere_id
+    if switch_data:
+        data["switchData"] = copy.deepcopy(list(switch_data))
+    return data
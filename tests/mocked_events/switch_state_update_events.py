@@ -1,3 +1,5 @@
+import copy
+
 switch_state_update = {
   "type": "switchStateUpdate",
   "subType": "stone",
@@ -11,6 +13,19 @@ switch_state_update = {
     "uid": 1,
     "name": "crownstone_name",
     "switchState": 1,
+    "percentage": 100,
     "macAddress": "mac_address"
   }
-}
\ No newline at end of file
+}
+
+
+def switch_state_data(
+    percentage=100, cloud_id="crownstone_id", unique_id=1, sphere_id="sphere_id"
+):
+    """Return switch state update data of a Crownstone, without percentage when None."""
+    data = copy.deepcopy(switch_state_update)
+    data["sphere"]["id"] = sphere_id
+    data["crownstone"].update(id=cloud_id, uid=unique_id, percentage=percentage)
+    if percentage is None:
+        del data["crownstone"]["percentage"]
+    return data
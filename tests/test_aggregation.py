@@ -0,0 +1,78 @@
+"""Tests of the windowed aggregation."""
+import asyncio
+import sys
+import unittest
+
+from crownstone_sse.const import EVENT_PING
+from crownstone_sse.events import PingEvent
+from crownstone_sse.util.aggregation import WindowedAggregator, WindowRecord
+from crownstone_sse.util.eventbus import EventBus
+
+PING = PingEvent({"type": EVENT_PING, "counter": 1})
+
+
+class TestWindowedAggregator(unittest.TestCase):
+    """Test counting events in windows."""
+
+    def test_tumbling(self):
+        """Test counts per tumbling window."""
+        aggregator = WindowedAggregator(size=10)
+        for timestamp in (1.0, 2.0, 11.0):
+            aggregator.process(PING, timestamp)
+        aggregator.process(PING, 5.0)
+        aggregator.flush()
+        self.assertEqual(
+            aggregator.drain(),
+            [WindowRecord(0.0, 10.0, EVENT_PING, 2), WindowRecord(10.0, 20.0, EVENT_PING, 1)],
+        )
+        self.assertEqual(aggregator.late_events, 1)
+
+    def test_sliding(self):
+        """Test every event is counted in all sliding windows it falls in."""
+        aggregator = WindowedAggregator(size=10, slide=5)
+        aggregator.process(PING, 1.0)
+        aggregator.process(PING, 6.0)
+        aggregator.advance(15.0)
+        self.assertEqual(
+            [(record.start, record.end, record.count) for record in aggregator.drain()],
+            [(-5.0, 5.0, 1), (0.0, 10.0, 2), (5.0, 15.0, 1)],
+        )
+
+    def test_skipped_events(self):
+        """Test events without the key are skipped."""
+        aggregator = WindowedAggregator(size=10, key="sphere_id")
+        aggregator.process(PING, 1.0)
+        self.assertEqual(aggregator.skipped_events, 1)
+
+
+class TestWindowedAggregatorBus(unittest.TestCase):
+    """Test aggregating events of an event bus."""
+
+    def setUp(self):
+        """Switch threads often, to expose unsynchronized updates."""
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        """Restore the switch interval."""
+        sys.setswitchinterval(self._switch_interval)
+
+    def test_exact_count_from_executor(self):
+        """Test no updates are lost when the bus runs the aggregator in executor threads."""
+        aggregator = WindowedAggregator(size=60, clock=lambda: 0.0)
+        bus = EventBus()
+        aggregator.listen_to(bus, EVENT_PING)
+
+        async def fire():
+            """Fire the events from the running loop, and wait for the executor."""
+            for _ in range(50000):
+                bus.fire(EVENT_PING, PING)
+            await asyncio.get_running_loop().shutdown_default_executor()
+
+        asyncio.run(fire())
+        aggregator.flush()
+        self.assertEqual(aggregator.drain(), [WindowRecord(0.0, 60.0, EVENT_PING, 50000)])
+
+
+if __name__ == "__main__":
+    unittest.main()
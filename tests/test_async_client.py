@@ -0,0 +1,94 @@
+"""Tests of the async client against a stand-in server."""
+import asyncio
+import json
+import unittest
+
+from crownstone_sse.async_client import CrownstoneSSEAsync
+from crownstone_sse.events import PresenceEvent, SwitchStateUpdateEvent
+from tests.mock_classes.standin_server import STREAM_START_EVENT, StandInServer
+from tests.mocked_events import presence_events
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+class RawServer(StandInServer):
+    """Stand-in server streaming fixed data lines."""
+
+    def __init__(self, payloads):
+        """Initialize with the JSON payloads to stream, in order."""
+        super().__init__()
+        self.payloads = payloads
+
+    async def handle_stream(self, request):
+        """Stream the payloads, then keep the stream open."""
+        response = await self.prepare_stream(request)
+        await response.write(f"data:{json.dumps(STREAM_START_EVENT)}\n\n".encode())
+        for payload in self.payloads:
+            await response.write(f"data:{payload}\n\n".encode())
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            pass
+        return response
+
+
+def metric_value(client, name, labels=()):
+    """Return the value of a client metric."""
+    return client.metrics()[f"crownstone_sse_{name}"].values.get(labels, 0)
+
+
+class TestCrownstoneSSEAsync(unittest.IsolatedAsyncioTestCase):
+    """Test the async client."""
+
+    async def receive(self, server, count, **kwargs):
+        """Return the first events received from a server, and the client."""
+        await server.start()
+        try:
+            async with CrownstoneSSEAsync(
+                "email",
+                "password",
+                event_base_url=server.event_base_url,
+                login_url=server.login_url,
+                **kwargs,
+            ) as client:
+                events = [await client.__anext__() for _ in range(count)]
+                client.close_client()
+        finally:
+            await server.stop()
+        return events, client
+
+    async def test_skip_non_object_data(self):
+        """Test valid JSON that is not an object is skipped, with validation and metrics."""
+        broken = switch_state_data()
+        del broken["crownstone"]
+        server = RawServer(
+            [
+                "[]",
+                "1",
+                json.dumps(broken),
+                json.dumps(presence_events.enter_sphere),
+                json.dumps(switch_state_data()),
+            ]
+        )
+        with self.assertLogs("crownstone_sse.async_client", "WARNING") as logs:
+            events, client = await self.receive(server, 3, validate=True, metrics=True)
+        self.assertEqual(len(logs.records), 3)
+
+        self.assertEqual(events[0].sub_type, STREAM_START_EVENT["subType"])
+        self.assertIsInstance(events[1], PresenceEvent)
+        self.assertIsInstance(events[2], SwitchStateUpdateEvent)
+        self.assertEqual(metric_value(client, "invalid_data_total"), 2)
+        self.assertEqual(
+            metric_value(client, "invalid_events_total", ("switchStateUpdate",)), 1
+        )
+        self.assertEqual(client.invalid_event_counts(), {"switchStateUpdate": 1})
+
+    async def test_skip_non_object_data_without_validation(self):
+        """Test valid JSON that is not an object is skipped without validation."""
+        server = RawServer(["[]", "null", json.dumps(presence_events.enter_sphere)])
+        with self.assertLogs("crownstone_sse.async_client", "WARNING"):
+            events, _ = await self.receive(server, 2)
+        self.assertIsInstance(events[1], PresenceEvent)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""Tests of the threaded client."""
+import socket
+import threading
+import time
+import unittest
+
+from crownstone_sse.async_client import AsyncClientState
+from crownstone_sse.client import CrownstoneSSE
+from crownstone_sse.const import EVENT_PRESENCE
+from crownstone_sse.exceptions import CrownstoneConnectionException
+from crownstone_sse.util.runtime import SSERuntime
+from tests.mock_classes.server import ServerThread
+from tests.mock_classes.standin_server import StandInServer, StreamConfig
+from tests.test_event_loop import CountingFactory
+
+
+def closed_port_url(path="/api/users/login") -> str:
+    """Return a URL on localhost that refuses connections."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}{path}"
+
+
+class TestCrownstoneSSE(unittest.TestCase):
+    """Test the threaded client against a stand-in server."""
+
+    def setUp(self):
+        """Record errors ending the client thread, instead of printing them."""
+        self.thread_errors = []
+        self._excepthook = threading.excepthook
+        threading.excepthook = self.thread_errors.append
+
+    def tearDown(self):
+        """Restore the thread exception hook."""
+        threading.excepthook = self._excepthook
+
+    def test_wait_until_ready(self):
+        """Test the client is ready once connected, and fires events."""
+        received = threading.Event()
+        config = StreamConfig(mix={"presence": 1}, count=5)
+        with ServerThread(StandInServer(config)) as server:
+            client = CrownstoneSSE(
+                "email",
+                "password",
+                event_base_url=server.event_base_url,
+                login_url=server.login_url,
+                reconnection_time=0,
+            )
+            client.add_event_listener(EVENT_PRESENCE, lambda event: received.set())
+            try:
+                self.assertTrue(client.wait_until_ready(10))
+                self.assertTrue(received.wait(10))
+            finally:
+                client.stop()
+                client.join(10)
+        self.assertFalse(client.is_alive())
+
+    def test_wait_until_ready_login_failed(self):
+        """Test the login error is raised instead of reporting the client ready."""
+        client = CrownstoneSSE("email", "password", login_url=closed_port_url())
+        with self.assertRaises(CrownstoneConnectionException):
+            client.wait_until_ready(10)
+        client.join(10)
+        self.assertFalse(client._ready.is_set())
+        self.assertEqual(len(self.thread_errors), 1)
+
+    def test_loop_factory(self):
+        """Test the client thread runs on a loop of the given factory."""
+        factory = CountingFactory()
+        client = CrownstoneSSE(
+            "email", "password", login_url=closed_port_url(), loop_factory=factory
+        )
+        with self.assertRaises(CrownstoneConnectionException):
+            client.wait_until_ready(10)
+        client.join(10)
+        self.assertEqual(len(factory.loops), 1)
+        self.assertTrue(factory.loops[0].is_closed())
+
+    def test_stop_while_connecting(self):
+        """Test stopping while the first connection is retried ends the client cleanly."""
+        client = CrownstoneSSE(
+            "email",
+            "password",
+            access_token="access_token",
+            event_base_url=closed_port_url("/sse?accessToken="),
+            reconnection_time=60,
+        )
+        deadline = time.monotonic() + 10
+        with self.assertLogs("crownstone_sse.async_client", "WARNING"):
+            while getattr(client, "_client", None) is None or client._client._sleep_task is None:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        self.assertEqual(client._client._state, AsyncClientState.CONNECTING)
+
+        client.stop()
+        client.join(10)
+        self.assertFalse(client.is_alive())
+        self.assertFalse(client.wait_until_ready(0))
+        self.assertEqual(self.thread_errors, [])
+
+
+class TestCrownstoneSSERuntime(unittest.TestCase):
+    """Test threaded clients hosted on a shared runtime."""
+
+    def setUp(self):
+        """Start a runtime."""
+        self.runtime = SSERuntime(allow_uvloop=False)
+
+    def tearDown(self):
+        """Shut the runtime down."""
+        self.runtime.shutdown(10)
+
+    def test_clients_on_runtime(self):
+        """Test clients hosted on the runtime connect, fire events and stop."""
+        config = StreamConfig(mix={"presence": 1}, count=5)
+        with ServerThread(StandInServer(config)) as server:
+            clients = [
+                CrownstoneSSE(
+                    "email",
+                    "password",
+                    event_base_url=server.event_base_url,
+                    login_url=server.login_url,
+                    runtime=self.runtime,
+                )
+                for _ in range(2)
+            ]
+            received = [threading.Event() for _ in clients]
+            try:
+                for client, event in zip(clients, received):
+                    client.add_event_listener(EVENT_PRESENCE, lambda _, event=event: event.set())
+                for client, event in zip(clients, received):
+                    self.assertTrue(client.wait_until_ready(10))
+                    self.assertTrue(event.wait(10))
+                self.assertEqual(self.runtime.get_load(), [2])
+            finally:
+                for client in clients:
+                    client.stop()
+                    client.join(10)
+        for client in clients:
+            self.assertFalse(client.is_alive())
+
+    def test_login_failed_on_runtime(self):
+        """Test join does not raise the login error, wait_until_ready does."""
+        client = CrownstoneSSE(
+            "email", "password", login_url=closed_port_url(), runtime=self.runtime
+        )
+        client.join(10)
+        self.assertFalse(client.is_alive())
+        with self.assertRaises(CrownstoneConnectionException):
+            client.wait_until_ready(0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests of merging switch commands across command events."""
+import asyncio
+import threading
+import unittest
+
+from crownstone_sse.const import EVENT_COMMAND
+from crownstone_sse.events import MultiSwitchCommandEvent
+from crownstone_sse.helpers.command_merger import CommandMerger, MergedCommand
+from crownstone_sse.helpers.switch_command import SwitchCommandType, SwitchCommandValue
+from crownstone_sse.util.eventbus import EventBus
+from tests.mocked_events.command_events import multi_switch_data
+
+
+def dim(unique_id, percentage, sphere_id="sphere_id"):
+    """Return a multi switch command event dimming a single Crownstone."""
+    command = {"id": f"id_{unique_id}", "uid": unique_id, "type": "PERCENTAGE"}
+    command["percentage"] = percentage
+    return MultiSwitchCommandEvent(multi_switch_data(command, sphere_id=sphere_id))
+
+
+def turn_off(unique_id):
+    """Return a multi switch command event turning off a single Crownstone."""
+    return MultiSwitchCommandEvent(
+        multi_switch_data({"id": f"id_{unique_id}", "uid": unique_id, "type": "TURN_OFF"})
+    )
+
+
+def merged_dim(unique_id, percentage, sphere_id="sphere_id"):
+    """Return the merged command of a dim command."""
+    return MergedCommand(
+        sphere_id,
+        unique_id,
+        f"id_{unique_id}",
+        SwitchCommandValue(SwitchCommandType.PERCENTAGE, percentage),
+    )
+
+
+class TestCommandMerger(unittest.TestCase):
+    """Test merging commands without an event loop."""
+
+    def test_merge_within_window(self):
+        """Test commands within the window are emitted once, with the latest per Crownstone."""
+        flushed = []
+        merger = CommandMerger(flushed.append, window=3600)
+        for event in (dim(1, 10), dim(2, 20), dim(1, 30), dim(1, 40, sphere_id="other")):
+            merger.add_event(event)
+        self.assertEqual(flushed, [])
+
+        merger.flush()
+        self.assertEqual(
+            flushed,
+            [[merged_dim(2, 20), merged_dim(1, 30), merged_dim(1, 40, sphere_id="other")]],
+        )
+        self.assertEqual(merger.stats.events, 4)
+        self.assertEqual(merger.stats.commands_merged, 1)
+        self.assertEqual(merger.stats.flushes, 1)
+
+        # nothing pending is not flushed
+        merger.flush()
+        self.assertEqual(len(flushed), 1)
+
+    def test_flush_on_switch(self):
+        """Test a command turning a Crownstone on or off flushes immediately."""
+        flushed = []
+        merger = CommandMerger(flushed.append, window=3600)
+        merger.add_event(dim(1, 10))
+        merger.add_event(turn_off(2))
+        self.assertEqual(len(flushed), 1)
+        self.assertEqual([command.unique_id for command in flushed[0]], [1, 2])
+        self.assertEqual(merger.stats.immediate_flushes, 1)
+
+        merger = CommandMerger(flushed.append, window=3600, flush_on_switch=False)
+        merger.add_event(turn_off(2))
+        self.assertEqual(len(flushed), 1)
+        merger.flush()
+
+    def test_flush_after_window(self):
+        """Test pending commands are flushed by a timer thread after the window."""
+        flushed = threading.Event()
+        merger = CommandMerger(lambda commands: flushed.set(), window=0.01)
+        merger.add_event(dim(1, 10))
+        self.assertTrue(flushed.wait(5))
+        self.assertGreater(merger.stats.max_latency, 0)
+
+    def test_listen_to_bus_without_loop(self):
+        """Test events of a bus fired without an event loop are merged."""
+        flushed = []
+        bus = EventBus()
+        merger = CommandMerger(flushed.append, window=3600)
+        remove = merger.listen_to(bus)
+        bus.fire(EVENT_COMMAND, dim(1, 10))
+        bus.fire(EVENT_COMMAND, dim(1, 20))
+        merger.flush()
+        self.assertEqual(flushed, [[merged_dim(1, 20)]])
+
+        remove()
+        self.assertEqual(bus.get_event_listeners(), {})
+
+
+class TestCommandMergerAsync(unittest.IsolatedAsyncioTestCase):
+    """Test merging commands within an event loop."""
+
+    async def test_listen_to_bus_in_loop(self):
+        """Test events fired within the loop are merged, and flushed by a loop timer."""
+        loop_thread = threading.get_ident()
+        flushed = asyncio.Event()
+        commands = []
+
+        def on_flush(merged):
+            """Record the merged commands, and whether they are flushed on the loop."""
+            commands.append((merged, threading.get_ident() == loop_thread))
+            flushed.set()
+
+        bus = EventBus()
+        merger = CommandMerger(on_flush, window=0.01)
+        merger.listen_to(bus)
+        bus.fire(EVENT_COMMAND, dim(1, 10))
+        bus.fire(EVENT_COMMAND, dim(1, 20))
+        await asyncio.wait_for(flushed.wait(), 5)
+        self.assertEqual(commands, [([merged_dim(1, 20)], True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
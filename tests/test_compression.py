@@ -0,0 +1,91 @@
+"""Tests of the compressed stream negotiation."""
+import unittest
+
+from aiohttp import hdrs
+
+from crownstone_sse.async_client import CrownstoneSSEAsync
+from crownstone_sse.const import IDENTITY
+from crownstone_sse.helpers.aiohttp_client import get_accept_encoding
+from tests.mock_classes.compressing_server import (
+    COMPRESSORS,
+    ENCODING_BROTLI,
+    ENCODING_DEFLATE,
+    ENCODING_GZIP,
+    CompressingServer,
+)
+from tests.mock_classes.standin_server import SENT_AT_FIELD, StreamConfig
+
+EVENT_COUNT = 200
+
+
+class RecordingServer(CompressingServer):
+    """Compressing server keeping the Accept-Encoding header of every stream request."""
+
+    def __init__(self, encoding):
+        """Initialize the server."""
+        super().__init__(StreamConfig(count=EVENT_COUNT, seed=1), encoding)
+        self.accept_encodings = []
+
+    async def prepare_stream(self, request):
+        """Keep the header, and start the stream."""
+        self.accept_encodings.append(request.headers.get(hdrs.ACCEPT_ENCODING))
+        return await super().prepare_stream(request)
+
+
+class TestCompression(unittest.IsolatedAsyncioTestCase):
+    """Test CrownstoneSSEAsync against a compressing stand-in server."""
+
+    async def receive(self, server, **kwargs):
+        """Return the data of all streamed events, without the send time."""
+        await server.start()
+        try:
+            async with CrownstoneSSEAsync(
+                "email",
+                "password",
+                event_base_url=server.event_base_url,
+                login_url=server.login_url,
+                **kwargs,
+            ) as client:
+                # the stream start event and the configured events
+                events = [await client.__anext__() for _ in range(EVENT_COUNT + 1)]
+                client.close_client()
+        finally:
+            await server.stop()
+        return [
+            {key: value for key, value in event.data.items() if key != SENT_AT_FIELD}
+            for event in events
+        ]
+
+    async def assert_same_events(self, encoding):
+        """Test a compressed stream results in the same events as an uncompressed one."""
+        plain_server = RecordingServer(encoding)
+        expected = await self.receive(plain_server, compression=False)
+        self.assertEqual(plain_server.accept_encodings, [IDENTITY])
+        self.assertEqual(plain_server.bytes_sent, plain_server.bytes_uncompressed)
+
+        server = RecordingServer(encoding)
+        received = await self.receive(server)
+        self.assertEqual(server.accept_encodings, [get_accept_encoding()])
+        self.assertLess(server.bytes_sent, server.bytes_uncompressed)
+        self.assertEqual(received, expected)
+
+    async def test_gzip(self):
+        """Test a gzip compressed stream."""
+        await self.assert_same_events(ENCODING_GZIP)
+
+    async def test_deflate(self):
+        """Test a deflate compressed stream."""
+        await self.assert_same_events(ENCODING_DEFLATE)
+
+    @unittest.skipIf(
+        ENCODING_BROTLI not in COMPRESSORS
+        or ENCODING_BROTLI not in get_accept_encoding(),
+        "Brotli is not installed",
+    )
+    async def test_brotli(self):
+        """Test a brotli compressed stream."""
+        await self.assert_same_events(ENCODING_BROTLI)
+
+
+if __name__ == "__main__":
+    unittest.main()
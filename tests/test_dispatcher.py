@@ -0,0 +1,173 @@
+"""Tests of the sharded dispatcher."""
+import asyncio
+import copy
+import threading
+import time
+import unittest
+
+from crownstone_sse.const import EVENT_PING, EVENT_PRESENCE
+from crownstone_sse.events import PingEvent, PresenceEvent
+from crownstone_sse.util.dispatcher import MODE_THREADS, ShardedDispatcher
+from tests.mocked_events import presence_events
+
+SPHERES = [f"sphere_{index}" for index in range(8)]
+
+
+def presence(sphere_id, counter):
+    """Return a presence event in a sphere, numbered by the user id."""
+    data = copy.deepcopy(presence_events.enter_sphere)
+    data["sphere"]["id"] = sphere_id
+    data["user"]["id"] = counter
+    return PresenceEvent(data)
+
+
+def events(count=50):
+    """Return numbered presence events, spread over the spheres."""
+    return [presence(SPHERES[index % len(SPHERES)], index) for index in range(count)]
+
+
+def by_sphere(received):
+    """Return the numbers of the received events per sphere."""
+    result = {}
+    for event in received:
+        result.setdefault(event.sphere_id, []).append(int(event.user_id))
+    return result
+
+
+class TestShardedDispatcher(unittest.TestCase):
+    """Test the shard assignment of the dispatcher."""
+
+    def test_shard_of(self):
+        """Test events of a key always go to the same shard, events without key to the first."""
+        dispatcher = ShardedDispatcher(shards=4)
+        shards = {dispatcher.shard_of(presence(sphere_id, 0)) for sphere_id in SPHERES}
+        self.assertGreater(len(shards), 1)
+        for sphere_id in SPHERES:
+            self.assertEqual(
+                dispatcher.shard_of(presence(sphere_id, 0)),
+                dispatcher.shard_of(presence(sphere_id, 1)),
+            )
+        self.assertEqual(dispatcher.shard_of(PingEvent({"type": EVENT_PING, "counter": 1})), 0)
+
+    def test_invalid_arguments(self):
+        """Test invalid shard counts and modes."""
+        with self.assertRaises(ValueError):
+            ShardedDispatcher(shards=0)
+        with self.assertRaises(ValueError):
+            ShardedDispatcher(mode="processes")
+
+    def test_threads(self):
+        """Test threads mode runs the listeners in order per key."""
+        dispatcher = ShardedDispatcher(shards=4, mode=MODE_THREADS, metrics=True)
+        received = []
+        lock = threading.Lock()
+
+        def listener(event):
+            """Record the event, slower for the first events."""
+            if int(event.user_id) < len(SPHERES):
+                time.sleep(0.01)
+            with lock:
+                received.append(event)
+
+        async def async_listener(event):
+            """Listener run on an event loop of the shard."""
+            await asyncio.sleep(0)
+
+        dispatcher.add_event_listener(EVENT_PRESENCE, listener)
+        dispatcher.add_event_listener(EVENT_PRESENCE, async_listener)
+        expected = events()
+        for event in expected:
+            dispatcher.fire(event.type, event)
+        dispatcher.shutdown()
+
+        self.assertEqual(by_sphere(received), by_sphere(expected))
+        self.assertEqual(dispatcher.queue_depths(), [0, 0, 0, 0])
+        metrics = dispatcher.metrics()
+        self.assertEqual(
+            metrics["crownstone_sse_bus_events_fired_total"].values[(EVENT_PRESENCE,)],
+            len(expected),
+        )
+        self.assertEqual(
+            sum(metrics["crownstone_sse_dispatcher_shard_events_total"].values.values()),
+            len(expected),
+        )
+
+        with self.assertLogs("crownstone_sse.util.dispatcher", "WARNING"):
+            dispatcher.fire(EVENT_PRESENCE, expected[0])
+
+
+class TestShardedDispatcherTasks(unittest.IsolatedAsyncioTestCase):
+    """Test the dispatcher in tasks mode."""
+
+    async def test_order_per_key(self):
+        """Test listeners run in order per key, and in parallel over the shards."""
+        dispatcher = ShardedDispatcher(shards=4)
+        received = []
+        running = 0
+        max_running = 0
+
+        async def listener(event):
+            """Record the event, and how many listeners run at the same time."""
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.001 * (len(SPHERES) - int(event.user_id) % len(SPHERES)))
+            running -= 1
+            received.append(event)
+
+        dispatcher.add_event_listener(EVENT_PRESENCE, listener)
+        # sync listeners run in the executor, one at a time per shard
+        sync_received = []
+        dispatcher.add_event_listener(EVENT_PRESENCE, sync_received.append)
+        expected = events()
+        for event in expected:
+            dispatcher.fire(event.type, event)
+        await dispatcher.async_shutdown()
+
+        self.assertEqual(by_sphere(received), by_sphere(expected))
+        self.assertEqual(by_sphere(sync_received), by_sphere(expected))
+        self.assertGreater(max_running, 1)
+
+    async def test_listener_error(self):
+        """Test an error in a listener is logged, and the shard continues."""
+        dispatcher = ShardedDispatcher(shards=1)
+        received = []
+
+        def failing_listener(event):
+            """Fail on the first event."""
+            if event.user_id == "0":
+                raise ValueError("listener failed")
+            received.append(event.user_id)
+
+        dispatcher.add_event_listener(EVENT_PRESENCE, failing_listener)
+        with self.assertLogs("crownstone_sse.util.dispatcher", "ERROR"):
+            for event in events(3):
+                dispatcher.fire(event.type, event)
+            await dispatcher.async_shutdown()
+        self.assertEqual(received, ["1", "2"])
+
+    async def test_fire_from_thread(self):
+        """Test events fired from another thread run on the loop of the dispatcher."""
+        loop = asyncio.get_running_loop()
+        dispatcher = ShardedDispatcher(shards=2, loop=loop)
+        received = []
+
+        async def listener(event):
+            """Record the event and whether it runs on the loop of the dispatcher."""
+            received.append((int(event.user_id), asyncio.get_running_loop() is loop))
+
+        dispatcher.add_event_listener(EVENT_PRESENCE, listener)
+        expected = events(10)
+
+        def fire():
+            """Fire the events from a thread."""
+            for event in expected:
+                dispatcher.fire(event.type, event)
+
+        await loop.run_in_executor(None, fire)
+        await dispatcher.async_shutdown()
+        self.assertEqual(sorted(received), [(index, True) for index in range(10)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Tests of the event loop selection."""
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+from crownstone_sse.helpers import event_loop
+from crownstone_sse.helpers.event_loop import get_loop_factory
+
+
+class CountingFactory:
+    """Loop factory recording the loops it created."""
+
+    def __init__(self):
+        """Initialize without loops."""
+        self.loops = []
+
+    def __call__(self):
+        """Create and record a default event loop."""
+        loop = asyncio.new_event_loop()
+        self.loops.append(loop)
+        return loop
+
+
+# stand-in for the uvloop module
+fake_uvloop = types.SimpleNamespace(new_event_loop=CountingFactory())
+
+
+class TestGetLoopFactory(unittest.TestCase):
+    """Test choosing the factory of event loops."""
+
+    def test_given_factory(self):
+        """Test a given factory is always used."""
+        factory = CountingFactory()
+        with mock.patch.object(event_loop, "uvloop", fake_uvloop):
+            self.assertIs(get_loop_factory(factory), factory)
+            self.assertIs(get_loop_factory(factory, allow_uvloop=False), factory)
+
+    def test_uvloop_installed(self):
+        """Test uvloop is used when installed, unless not allowed."""
+        with mock.patch.object(event_loop, "uvloop", fake_uvloop):
+            self.assertIs(get_loop_factory(), fake_uvloop.new_event_loop)
+            self.assertIs(get_loop_factory(allow_uvloop=False), asyncio.new_event_loop)
+
+    def test_uvloop_not_installed(self):
+        """Test the default asyncio loop is used without uvloop."""
+        with mock.patch.object(event_loop, "uvloop", None):
+            self.assertIs(get_loop_factory(), asyncio.new_event_loop)
+
+
+class TestRun(unittest.TestCase):
+    """Test running a coroutine on a loop of the factory."""
+
+    async def main(self):
+        """Leave a task behind, and return the running loop."""
+        self.leftover = asyncio.ensure_future(asyncio.sleep(3600))
+        await asyncio.sleep(0)
+        return asyncio.get_running_loop()
+
+    def check_run(self):
+        """Test the coroutine runs on a new loop of the factory, closed afterwards."""
+        factory = CountingFactory()
+        loop = event_loop.run(self.main(), factory)
+        self.assertEqual(factory.loops, [loop])
+        self.assertTrue(loop.is_closed())
+        self.assertTrue(self.leftover.cancelled())
+
+    def test_run(self):
+        """Test running with the asyncio runner."""
+        self.check_run()
+
+    def test_run_without_runner(self):
+        """Test running on Python versions without asyncio.Runner."""
+        with mock.patch.object(
+            event_loop, "sys", types.SimpleNamespace(version_info=(3, 10, 0))
+        ):
+            self.check_run()
+
+    def test_run_selects_loop(self):
+        """Test run uses uvloop when installed and allowed."""
+        with mock.patch.object(event_loop, "uvloop", fake_uvloop):
+            created = len(fake_uvloop.new_event_loop.loops)
+            loop = event_loop.run(self.main())
+            self.assertEqual(fake_uvloop.new_event_loop.loops[created:], [loop])
+
+            loop = event_loop.run(self.main(), allow_uvloop=False)
+            self.assertNotIn(loop, fake_uvloop.new_event_loop.loops)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""Tests of the event bus."""
+import asyncio
+import threading
+import time
+import unittest
+
+from crownstone_sse.const import EVENT_PING
+from crownstone_sse.events import PingEvent
+from crownstone_sse.util.eventbus import EventBus
+
+HANDOVERS = "crownstone_sse_bus_loop_handovers_total"
+
+
+def ping(counter=1):
+    """Return a ping event."""
+    return PingEvent({"type": EVENT_PING, "counter": counter})
+
+
+def wait_for(condition, timeout=5.0):
+    """Wait until a condition holds, return whether it did."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestEventBus(unittest.TestCase):
+    """Test firing events without an event loop."""
+
+    def test_sync_listener(self):
+        """Test listeners are called directly, until removed."""
+        bus = EventBus()
+        received = []
+        remove = bus.add_event_listener(EVENT_PING, received.append)
+        self.assertEqual(bus.get_event_listeners(), {EVENT_PING: 1})
+        event = ping()
+        bus.fire(EVENT_PING, event)
+        self.assertEqual(received, [event])
+
+        remove()
+        bus.fire(EVENT_PING, ping())
+        self.assertEqual(received, [event])
+        self.assertEqual(bus.get_event_listeners(), {})
+        with self.assertLogs("crownstone_sse.util.eventbus", "WARNING"):
+            remove()
+
+
+class TestEventBusTargetLoop(unittest.TestCase):
+    """Test handing coroutine listeners over to a target loop in another thread."""
+
+    def setUp(self):
+        """Run a target loop in a thread."""
+        self.target = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.target.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        """Stop the target loop."""
+        if not self.target.is_closed():
+            self.target.call_soon_threadsafe(self.target.stop)
+            self.thread.join()
+            self.target.close()
+
+    def test_handover_in_batches(self):
+        """Test listeners fired while the target loop is busy are handed over with one wakeup."""
+        bus = EventBus(loop=self.target, metrics=True)
+        received = []
+        done = threading.Event()
+
+        async def listener(event):
+            """Record the event and whether it runs on the target loop."""
+            received.append((event.counter, asyncio.get_running_loop() is self.target))
+            if len(received) == 10:
+                done.set()
+
+        bus.add_event_listener(EVENT_PING, listener)
+
+        # hold the target loop, so all events are handed over in one batch
+        gate = threading.Event()
+        self.target.call_soon_threadsafe(gate.wait)
+        for counter in range(10):
+            bus.fire(EVENT_PING, ping(counter))
+        gate.set()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(received, [(counter, True) for counter in range(10)])
+        self.assertEqual(bus.metrics()[HANDOVERS].values, {(): 1})
+
+        # the next event starts a new batch
+        bus.fire(EVENT_PING, ping(10))
+        self.assertTrue(wait_for(lambda: len(received) == 11))
+        self.assertEqual(bus.metrics()[HANDOVERS].values, {(): 2})
+
+    def test_fired_on_target_loop(self):
+        """Test listeners fired on the target loop itself are not handed over."""
+        bus = EventBus(loop=self.target, metrics=True)
+        received = []
+
+        async def listener(event):
+            """Record the event."""
+            received.append(event.counter)
+
+        async def fire():
+            """Fire events on the target loop, and let the listeners run."""
+            for counter in range(3):
+                bus.fire(EVENT_PING, ping(counter))
+            await asyncio.sleep(0.01)
+
+        bus.add_event_listener(EVENT_PING, listener)
+        asyncio.run_coroutine_threadsafe(fire(), self.target).result(5)
+        self.assertEqual(received, [0, 1, 2])
+        self.assertNotIn((), bus.metrics()[HANDOVERS].values)
+
+    def test_fired_from_other_loop(self):
+        """Test coroutine listeners fired from another loop run on the target loop."""
+        bus = EventBus(loop=self.target)
+        loops = []
+        done = threading.Event()
+
+        async def listener(event):
+            """Record the loop the listener runs on."""
+            loops.append(asyncio.get_running_loop())
+            done.set()
+
+        async def fire():
+            """Fire an event from the client loop."""
+            bus.fire(EVENT_PING, ping())
+
+        bus.add_event_listener(EVENT_PING, listener)
+        asyncio.run(fire())
+        self.assertTrue(done.wait(5))
+        self.assertEqual(loops, [self.target])
+
+    def test_target_loop_closed(self):
+        """Test events for a closed target loop are dropped with a warning."""
+        bus = EventBus(loop=self.target)
+        calls = []
+
+        async def listener(event):
+            """Record the event."""
+            calls.append(event)
+
+        bus.add_event_listener(EVENT_PING, listener)
+        self.target.call_soon_threadsafe(self.target.stop)
+        self.thread.join()
+        self.target.close()
+
+        with self.assertLogs("crownstone_sse.util.eventbus", "WARNING"):
+            bus.fire(EVENT_PING, ping())
+        # the dropped batch does not hold back later handovers
+        self.assertEqual(bus._pending, [])
+        self.assertEqual(calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests of the columnar export."""
+import unittest
+
+from crownstone_sse.events import InvalidEvent, ReceiveInfo, SwitchStateUpdateEvent
+from crownstone_sse.util import export
+from crownstone_sse.util.export import EventColumnBuilder
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+def build(count=10):
+    """Return a builder with switch states, every third without percentage."""
+    builder = EventColumnBuilder()
+    for row in range(count):
+        builder.append(
+            SwitchStateUpdateEvent(
+                switch_state_data(
+                    None if row % 3 == 0 else -1, unique_id=-1 if row == 1 else row
+                )
+            ),
+            receive_time=float(row),
+        )
+    return builder
+
+
+class TestEventColumnBuilder(unittest.TestCase):
+    """Test converting events to columns."""
+
+    def test_validity(self):
+        """Test missing values are marked in the validity, and -1 is a value."""
+        batch = build().to_columns()["switchStateUpdate"]
+        self.assertEqual(len(batch), 10)
+        self.assertEqual(
+            [batch.is_valid("percentage", row) for row in range(10)],
+            [row % 3 != 0 for row in range(10)],
+        )
+        self.assertEqual(batch.null_counts["percentage"], 4)
+        self.assertTrue(batch.is_valid("uid", 1))
+        self.assertEqual(batch.columns["uid"][1], -1)
+        # no receive info
+        self.assertEqual(batch.null_counts["sequence"], 10)
+        self.assertEqual(batch.decode("cloud_id"), ["crownstone_id"] * 10)
+
+    def test_skip_non_object_data(self):
+        """Test events of which the data is not an object are skipped."""
+        builder = EventColumnBuilder()
+        builder.append(InvalidEvent([], ["expected an object, got list"]))
+        self.assertEqual(builder.to_columns(), {})
+
+    @unittest.skipIf(export.pa is None, "PyArrow is not installed")
+    def test_to_arrow(self):
+        """Test missing values are null in Arrow, and -1 is kept."""
+        builder = build()
+        record_batch = builder.to_arrow()["switchStateUpdate"]
+        self.assertEqual(
+            record_batch.column("percentage").to_pylist(),
+            [None if row % 3 == 0 else -1 for row in range(10)],
+        )
+        self.assertEqual(record_batch.column("uid").to_pylist()[:3], [0, -1, 2])
+        self.assertEqual(record_batch.column("cloud_id").to_pylist(), ["crownstone_id"] * 10)
+        self.assertEqual(record_batch.column("sequence").null_count, 10)
+
+        # the builder can still grow after exporting
+        builder.append(
+            SwitchStateUpdateEvent(switch_state_data(50), ReceiveInfo(0.0, 1.0, 1, 7))
+        )
+        record_batch = builder.to_arrow()["switchStateUpdate"]
+        self.assertEqual(record_batch.column("sequence").to_pylist()[-1], 7)
+
+    @unittest.skipIf(export.np is None, "NumPy is not installed")
+    def test_to_numpy(self):
+        """Test missing values are masked in NumPy."""
+        records, dictionaries = build().to_numpy()["switchStateUpdate"]
+        self.assertEqual(
+            list(records["percentage"].mask), [row % 3 == 0 for row in range(10)]
+        )
+        self.assertEqual(int(records["uid"][1]), -1)
+        self.assertFalse(records["uid"].mask[1])
+        self.assertEqual(dictionaries["cloud_id"], ["crownstone_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Tests of the event journal."""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from crownstone_sse.events import PresenceEvent, ReceiveInfo, SwitchStateUpdateEvent
+from crownstone_sse.util import journal
+from crownstone_sse.util.journal import (
+    EventJournal,
+    JournalError,
+    iter_records,
+    list_segments,
+    replay_journal,
+)
+from tests.mocked_events import presence_events, switch_state_update_events
+
+
+def payload(data):
+    """Return the raw payload of event data."""
+    return json.dumps(data).encode()
+
+
+class TestEventJournal(unittest.TestCase):
+    """Test writing and replaying the journal."""
+
+    def setUp(self):
+        """Create a journal directory."""
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self):
+        """Remove the journal directory."""
+        self._tmp.cleanup()
+
+    def test_replay(self):
+        """Test events are replayed with their receive info."""
+        with EventJournal(self.directory) as event_journal:
+            event_journal.append(
+                payload(presence_events.enter_location), ReceiveInfo(1.0, 100.0, 1, 1)
+            )
+            event_journal.append(
+                payload(switch_state_update_events.switch_state_update),
+                ReceiveInfo(2.0, 101.0, 1, 2),
+            )
+
+        events = list(replay_journal(self.directory))
+        self.assertIsInstance(events[0], PresenceEvent)
+        self.assertIsInstance(events[1], SwitchStateUpdateEvent)
+        self.assertEqual(events[1].receive_info, ReceiveInfo(2.0, 101.0, 1, 2))
+        self.assertEqual(len(list(replay_journal(self.directory, since=100.5))), 1)
+
+    def test_rotation_and_retention(self):
+        """Test segments are rotated by the background thread, and the oldest removed."""
+        event_journal = EventJournal(
+            self.directory, max_segment_bytes=200, retention_bytes=1000, fsync_interval=None
+        )
+        data = payload(presence_events.enter_location)
+        for sequence in range(50):
+            event_journal.append(data, ReceiveInfo(0.0, time.time(), 1, sequence))
+            # let the background thread start the next segment
+            time.sleep(0.005)
+        event_journal.close()
+
+        segments = list_segments(self.directory)
+        self.assertGreater(len(segments), 1)
+        self.assertLessEqual(
+            sum(os.path.getsize(path) for path in segments[:-1]), 1000
+        )
+        sequences = [info.sequence for info, _ in iter_records(self.directory)]
+        self.assertEqual(sequences, list(range(50 - len(sequences), 50)))
+
+    def test_append_does_not_wait_for_fsync(self):
+        """Test appending while the background thread is in a slow fsync."""
+        fsync_started = threading.Event()
+
+        def slow_fsync(fileno):
+            """Simulate a slow disk."""
+            fsync_started.set()
+            time.sleep(0.5)
+
+        with mock.patch.object(journal.os, "fsync", slow_fsync):
+            event_journal = EventJournal(self.directory, fsync_interval=0.01)
+            event_journal.append(payload(presence_events.enter_location))
+            self.assertTrue(fsync_started.wait(5))
+            started = time.monotonic()
+            event_journal.append(payload(presence_events.exit_location))
+            self.assertLess(time.monotonic() - started, 0.25)
+            event_journal.close()
+        self.assertEqual(len(list(replay_journal(self.directory))), 2)
+
+    def test_incomplete_record(self):
+        """Test replay stops at a record cut off by a crash."""
+        with EventJournal(self.directory) as event_journal:
+            event_journal.append(payload(presence_events.enter_location))
+            event_journal.append(payload(presence_events.exit_location))
+        path = list_segments(self.directory)[0]
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 10)
+
+        with self.assertLogs(journal.__name__, "WARNING"):
+            self.assertEqual(len(list(replay_journal(self.directory))), 1)
+
+    def test_segment_header(self):
+        """Test segments of another format are refused."""
+        with EventJournal(self.directory) as event_journal:
+            event_journal.append(payload(presence_events.enter_location))
+        path = list_segments(self.directory)[0]
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(8), journal.SEGMENT_MAGIC)
+
+        with open(path, "r+b") as file:
+            file.write(b"NOTAJRNL")
+        with self.assertRaises(JournalError):
+            list(replay_journal(self.directory))
+
+    def test_append_after_close(self):
+        """Test appending to a closed journal raises."""
+        event_journal = EventJournal(self.directory)
+        event_journal.close()
+        with self.assertRaises(ValueError):
+            event_journal.append(b"{}")
+
+
+if __name__ == "__main__":
+    unittest.main()
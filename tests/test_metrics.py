@@ -0,0 +1,113 @@
+"""Tests of the metrics and their Prometheus rendering."""
+import math
+import unittest
+
+from crownstone_sse.util.metrics import (
+    KIND_COUNTER,
+    MetricsRegistry,
+    _Metric,
+    render_prometheus,
+)
+
+
+def registry(requests=0, lag=0.0, timings=()):
+    """Return a registry with a labeled counter, a gauge and a histogram."""
+    metrics = MetricsRegistry("test")
+    counter = metrics.counter("requests_total", "Requests.", ("method",))
+    if requests:
+        counter.inc(requests, labels=("get",))
+    metrics.gauge("lag_seconds", "Lag.").set(lag)
+    histogram = metrics.histogram("duration_seconds", "Duration.", buckets=(0.1, 1.0))
+    for timing in timings:
+        histogram.observe(timing)
+    return metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """Test collecting metric values."""
+
+    def test_snapshot(self):
+        """Test snapshots copy the current values."""
+        metrics = registry(requests=2, lag=1.5, timings=(0.05, 0.5, 5.0))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["test_requests_total"].kind, KIND_COUNTER)
+        self.assertEqual(snapshot["test_requests_total"].values, {("get",): 2})
+        self.assertEqual(snapshot["test_lag_seconds"].values, {(): 1.5})
+        histogram = snapshot["test_duration_seconds"].values[()]
+        self.assertEqual(histogram.counts, [1, 1, 1])
+        self.assertEqual(histogram.count, 3)
+
+        metrics._metrics[2].observe(0.05)
+        self.assertEqual(histogram.counts, [1, 1, 1])
+
+    def test_abstract_metric(self):
+        """Test the base metric can not be created without a snapshot method."""
+        with self.assertRaises(TypeError):
+            _Metric("name", "help")  # pylint: disable=abstract-class-instantiated
+
+
+class TestRenderPrometheus(unittest.TestCase):
+    """Test rendering snapshots in the Prometheus text format."""
+
+    def test_render(self):
+        """Test counters, gauges and histograms with their help and type."""
+        text = render_prometheus(
+            registry(requests=2, lag=math.inf, timings=(0.05, 0.5)).snapshot()
+        )
+        self.assertEqual(
+            text.splitlines(),
+            [
+                "# HELP test_requests_total Requests.",
+                "# TYPE test_requests_total counter",
+                'test_requests_total{method="get"} 2',
+                "# HELP test_lag_seconds Lag.",
+                "# TYPE test_lag_seconds gauge",
+                "test_lag_seconds +Inf",
+                "# HELP test_duration_seconds Duration.",
+                "# TYPE test_duration_seconds histogram",
+                'test_duration_seconds_bucket{le="0.1"} 1',
+                'test_duration_seconds_bucket{le="1"} 2',
+                'test_duration_seconds_bucket{le="+Inf"} 2',
+                "test_duration_seconds_sum 0.55",
+                "test_duration_seconds_count 2",
+            ],
+        )
+
+    def test_merge_families(self):
+        """Test metrics of several snapshots are one family, with values added up."""
+        first = registry(requests=2, lag=1.0, timings=(0.05,))
+        second = registry(requests=3, lag=0.5, timings=(0.5,))
+        # only in the second snapshot
+        second.counter("errors_total", "Errors.").inc()
+        first_snapshot = first.snapshot()
+        text = render_prometheus(first_snapshot, second.snapshot())
+        lines = text.splitlines()
+
+        for name, kind in (
+            ("test_requests_total", "counter"),
+            ("test_lag_seconds", "gauge"),
+            ("test_duration_seconds", "histogram"),
+        ):
+            self.assertEqual(lines.count(f"# TYPE {name} {kind}"), 1)
+            self.assertEqual(len([line for line in lines if line.startswith(f"# HELP {name} ")]), 1)
+        self.assertIn('test_requests_total{method="get"} 5', lines)
+        self.assertIn("test_lag_seconds 1.5", lines)
+        self.assertIn('test_duration_seconds_bucket{le="1"} 2', lines)
+        self.assertIn("test_duration_seconds_count 2", lines)
+        self.assertIn("test_errors_total 1", lines)
+        # the snapshots themselves are not changed
+        self.assertEqual(first_snapshot["test_requests_total"].values, {("get",): 2})
+        self.assertEqual(first_snapshot["test_duration_seconds"].values[()].count, 1)
+
+    def test_merge_conflicting_kinds(self):
+        """Test metrics with the same name but another kind can not be merged."""
+        first = MetricsRegistry("test")
+        first.counter("value", "Value.")
+        second = MetricsRegistry("test")
+        second.gauge("value", "Value.")
+        with self.assertRaises(ValueError):
+            render_prometheus(first.snapshot(), second.snapshot())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests of the presence occupancy index."""
+import copy
+import threading
+import unittest
+
+from crownstone_sse.events import PresenceEvent
+from crownstone_sse.util.occupancy import OccupancyIndex
+from tests.mocked_events import presence_events
+
+
+def presence(template, user_id="user_id", location_id="location_id"):
+    """Return a presence event of a user."""
+    data = copy.deepcopy(template)
+    data["user"]["id"] = user_id
+    data["location"]["id"] = location_id
+    return PresenceEvent(data)
+
+
+class TestOccupancyIndex(unittest.TestCase):
+    """Test the occupancy index."""
+
+    def test_enter_exit_location(self):
+        """Test users entering and leaving a location, with dwell time."""
+        index = OccupancyIndex()
+        index.apply(presence(presence_events.enter_location), now=10.0)
+        self.assertEqual(index.users_in_location("location_id"), {"user_id": 10.0})
+        self.assertEqual(index.users_in_sphere("sphere_id"), {"user_id": 10.0})
+        self.assertEqual(index.location_of("user_id"), "location_id")
+        self.assertEqual(index.location_count("location_id"), 1)
+        self.assertEqual(index.time_in_location("user_id", now=15.0), 5.0)
+
+        index.apply(presence(presence_events.exit_location), now=20.0)
+        self.assertEqual(index.users_in_location("location_id"), {})
+        self.assertIsNone(index.location_of("user_id"))
+        self.assertEqual(index.dwell_time("user_id", "location_id", now=30.0), 10.0)
+        self.assertEqual(index.location_dwell_time("location_id", now=30.0), 10.0)
+
+    def test_timeout(self):
+        """Test users leave after the timeout without presence events."""
+        index = OccupancyIndex(timeout=60)
+        index.apply(presence(presence_events.enter_location), now=0.0)
+        self.assertEqual(index.location_count("location_id", now=30.0), 1)
+        self.assertEqual(index.location_count("location_id", now=61.0), 0)
+        self.assertEqual(index.users_in_sphere("sphere_id", now=61.0), {})
+        self.assertEqual(index.dwell_time("user_id", "location_id", now=100.0), 60.0)
+
+    def test_users_is_a_copy(self):
+        """Test the returned users do not change with later events."""
+        index = OccupancyIndex()
+        index.apply(presence(presence_events.enter_location), now=0.0)
+        users = index.users_in_location("location_id")
+        index.apply(presence(presence_events.enter_location, "other"), now=1.0)
+        self.assertEqual(list(users), ["user_id"])
+
+    def test_iterate_while_applying(self):
+        """Test iterating the users while another thread applies events."""
+        index = OccupancyIndex()
+        errors = []
+        stop = threading.Event()
+
+        def apply_events():
+            """Let users enter and leave from another thread."""
+            for number in range(20000):
+                user_id = f"user_{number % 50}"
+                index.apply(presence(presence_events.enter_location, user_id))
+                index.apply(presence(presence_events.exit_location, user_id))
+            stop.set()
+
+        thread = threading.Thread(target=apply_events)
+        thread.start()
+        try:
+            while not stop.is_set():
+                for user_id in index.users_in_location("location_id"):
+                    self.assertTrue(user_id.startswith("user_"))
+        except RuntimeError as err:
+            errors.append(err)
+        finally:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+"""Tests of the stream operators."""
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from crownstone_sse.util.aggregation import key_function
+from crownstone_sse.util.operators import Stream, TimerWheel
+
+
+def item(cloud_id, percentage=0):
+    """Return an item with a cloud id and a percentage."""
+    return SimpleNamespace(cloud_id=cloud_id, percentage=percentage)
+
+
+async def source(items, delay=0.0):
+    """Yield the items, sleeping before every item."""
+    for value in items:
+        await asyncio.sleep(delay)
+        yield value
+
+
+async def collect(stream):
+    """Return all items of a stream."""
+    return [value async for value in stream]
+
+
+class TestKeyFunction(unittest.TestCase):
+    """Test extracting the key of an event."""
+
+    def test_key_function(self):
+        """Test attribute names and functions as key."""
+        value = item("a", 50)
+        self.assertEqual(key_function("cloud_id")(value), "a")
+        self.assertEqual(key_function(["cloud_id", "percentage"])(value), ("a", 50))
+        self.assertEqual(key_function(lambda event: event.percentage)(value), 50)
+
+
+class TestTimerWheel(unittest.IsolatedAsyncioTestCase):
+    """Test the shared timer of the operators."""
+
+    async def test_order_and_cancel(self):
+        """Test calls run in deadline order, and cancelled calls do not run."""
+        wheel = TimerWheel()
+        calls = []
+        wheel.call_later(0.03, lambda: calls.append(3))
+        wheel.call_later(0.01, lambda: calls.append(1))
+        cancelled = wheel.call_later(0.02, lambda: calls.append(2))
+        TimerWheel.cancel(cancelled)
+        await asyncio.sleep(0.05)
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(len(wheel), 0)
+
+    async def test_close(self):
+        """Test closing cancels all calls."""
+        wheel = TimerWheel()
+        calls = []
+        wheel.call_later(0.01, lambda: calls.append(1))
+        wheel.close()
+        await asyncio.sleep(0.02)
+        self.assertEqual(calls, [])
+
+
+class TestStream(unittest.IsolatedAsyncioTestCase):
+    """Test the operators of a stream."""
+
+    async def test_filter_map(self):
+        """Test filtering and mapping, skipping None items of the source."""
+        stream = Stream(source([1, None, 2, 3, 4]))
+        result = await collect(stream.filter(lambda value: value % 2 == 0).map(str))
+        self.assertEqual(result, ["2", "4"])
+
+    async def test_debounce_by(self):
+        """Test only the last item of a burst per key is passed."""
+        items = [item("a", 1), item("b", 1), item("a", 2), item("a", 3)]
+        stream = Stream(source(items, 0.001)).debounce_by("cloud_id", 0.5)
+        result = await collect(stream)
+        # the source ends before the delay, the pending items are passed on completion
+        self.assertEqual(
+            sorted((value.cloud_id, value.percentage) for value in result), [("a", 3), ("b", 1)]
+        )
+
+    async def test_debounce_timer(self):
+        """Test the last item is passed once the key was quiet for the delay."""
+
+        async def slow_source():
+            """Yield a burst, stay quiet, then yield one more item."""
+            yield item("a", 1)
+            yield item("a", 2)
+            await asyncio.sleep(0.1)
+            yield item("a", 3)
+
+        result = await collect(Stream(slow_source()).debounce_by("cloud_id", 0.02))
+        self.assertEqual([value.percentage for value in result], [2, 3])
+
+    async def test_throttle(self):
+        """Test items within the interval after a passed item are dropped, per key."""
+        items = [item("a", 1), item("a", 2), item("b", 1), item("b", 2)]
+        stream = Stream(source(items)).throttle(10, key="cloud_id")
+        result = await collect(stream)
+        self.assertEqual(
+            [(value.cloud_id, value.percentage) for value in result], [("a", 1), ("b", 1)]
+        )
+
+    async def test_window_count(self):
+        """Test windows by count, and the last partial window on completion."""
+        result = await collect(Stream(source(range(5))).window(count=2))
+        self.assertEqual(result, [[0, 1], [2, 3], [4]])
+
+    async def test_window_seconds(self):
+        """Test a window is passed once its time passed."""
+
+        async def slow_source():
+            """Yield two items, stay quiet, then yield one more item."""
+            yield 1
+            yield 2
+            await asyncio.sleep(0.1)
+            yield 3
+
+        result = await collect(Stream(slow_source()).window(seconds=0.02))
+        self.assertEqual(result, [[1, 2], [3]])
+
+    def test_window_arguments(self):
+        """Test a window requires a valid seconds or count."""
+        stream = Stream(source([]))
+        with self.assertRaises(ValueError):
+            stream.window()
+        with self.assertRaises(ValueError):
+            stream.window(count=0)
+
+    async def test_distinct_until_changed(self):
+        """Test items equal to the previous item of the same group are dropped."""
+        items = [item("a", 0), item("b", 0), item("a", 0), item("a", 100), item("b", 100)]
+        stream = Stream(source(items)).distinct_until_changed(key="percentage", by="cloud_id")
+        result = await collect(stream)
+        self.assertEqual(
+            [(value.cloud_id, value.percentage) for value in result],
+            [("a", 0), ("b", 0), ("a", 100), ("b", 100)],
+        )
+
+    async def test_tee(self):
+        """Test every branch receives every item."""
+        first, second = Stream(source([1, 2, 3])).tee()
+        results = await asyncio.gather(collect(first), collect(second.map(lambda v: v * 2)))
+        self.assertEqual(results, [[1, 2, 3], [2, 4, 6]])
+
+    async def test_source_error(self):
+        """Test an error of the source ends the consumers with that error."""
+
+        async def failing_source():
+            """Yield an item, then fail."""
+            yield 1
+            raise RuntimeError("source failed")
+
+        received = []
+        with self.assertRaises(RuntimeError):
+            async for value in Stream(failing_source()):
+                received.append(value)
+        self.assertEqual(received, [1])
+
+    async def test_close(self):
+        """Test closing stops reading the source and ends the consumers."""
+
+        async def endless_source():
+            """Yield items forever."""
+            counter = 0
+            while True:
+                await asyncio.sleep(0.001)
+                counter += 1
+                yield counter
+
+        stream = Stream(endless_source())
+        received = []
+        async for value in stream:
+            received.append(value)
+            if value == 3:
+                stream.close()
+        self.assertEqual(received, [1, 2, 3])
+
+    async def test_backpressure(self):
+        """Test the source is not read ahead of a slow consumer beyond the buffer."""
+        read = []
+
+        async def counting_source():
+            """Yield items, recording how many were read."""
+            for counter in range(100):
+                read.append(counter)
+                yield counter
+
+        stream = Stream(counting_source(), max_buffered=5)
+        iterator = stream.__aiter__()
+        self.assertEqual(await iterator.__anext__(), 0)
+        await asyncio.sleep(0.01)
+        self.assertLessEqual(len(read), 7)
+        stream.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests of the lazy imports of the package."""
+import subprocess
+import sys
+import unittest
+
+import crownstone_sse
+
+
+def run_python(code):
+    """Run code in a fresh interpreter, return its output."""
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    ).stdout.strip()
+
+
+class TestLazyImports(unittest.TestCase):
+    """Test the clients, event bus and runtime are imported on first use."""
+
+    def test_import_does_not_load_aiohttp(self):
+        """Test importing the package and its constants leaves aiohttp unloaded."""
+        output = run_python(
+            "import sys\n"
+            "import crownstone_sse\n"
+            "from crownstone_sse import EVENT_PING\n"
+            "print('aiohttp' in sys.modules, 'crownstone_sse.async_client' in sys.modules)\n"
+            "crownstone_sse.CrownstoneSSEAsync\n"
+            "print('aiohttp' in sys.modules)\n"
+        )
+        self.assertEqual(output.splitlines(), ["False False", "True"])
+
+    def test_getattr(self):
+        """Test the lazy names resolve to the classes of their modules."""
+        from crownstone_sse.async_client import CrownstoneSSEAsync
+        from crownstone_sse.client import CrownstoneSSE
+        from crownstone_sse.util.eventbus import EventBus
+        from crownstone_sse.util.runtime import SSERuntime
+
+        self.assertIs(crownstone_sse.CrownstoneSSEAsync, CrownstoneSSEAsync)
+        self.assertIs(crownstone_sse.CrownstoneSSE, CrownstoneSSE)
+        self.assertIs(crownstone_sse.EventBus, EventBus)
+        self.assertIs(crownstone_sse.SSERuntime, SSERuntime)
+        # cached after the first lookup
+        self.assertIs(vars(crownstone_sse)["EventBus"], EventBus)
+
+        with self.assertRaisesRegex(AttributeError, "has no attribute 'Missing'"):
+            crownstone_sse.Missing  # pylint: disable=pointless-statement
+
+    def test_dir(self):
+        """Test the lazy names are listed, next to the constants."""
+        # after a lookup, a lazy name is also a global of the package
+        crownstone_sse.EventBus  # pylint: disable=pointless-statement
+        names = dir(crownstone_sse)
+        for name in ("CrownstoneSSEAsync", "CrownstoneSSE", "EventBus", "SSERuntime", "EVENT_PING"):
+            self.assertIn(name, names)
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), len(set(names)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""Tests of the priority-aware delivery."""
+import asyncio
+import threading
+import time
+import unittest
+
+from crownstone_sse.const import EVENT_COMMAND, EVENT_PING, EVENT_PRESENCE
+from crownstone_sse.events import MultiSwitchCommandEvent, PingEvent, PresenceEvent
+from crownstone_sse.util.priority import (
+    PriorityBuffer,
+    PriorityEventBus,
+    PriorityPolicy,
+    prioritize,
+)
+from tests.mocked_events import presence_events
+
+
+def ping(counter=1):
+    """Return a ping event."""
+    return PingEvent({"type": EVENT_PING, "counter": counter})
+
+
+def command():
+    """Return a command event."""
+    return MultiSwitchCommandEvent({"type": EVENT_COMMAND, "subType": "multiSwitch"})
+
+
+class TestPriorityBuffer(unittest.TestCase):
+    """Test the priority buffer."""
+
+    def test_priority_order(self):
+        """Test higher classes are delivered first, in order within a class."""
+        buffer = PriorityBuffer(PriorityPolicy(max_delay=None))
+        for event in (ping(1), PresenceEvent(presence_events.enter_sphere), ping(2), command()):
+            buffer.push(event)
+        self.assertEqual(buffer.depths()[0], 1)
+
+        order = [buffer.pop() for _ in range(len(buffer))]
+        self.assertEqual(
+            [event.type for event in order], [EVENT_COMMAND, EVENT_PRESENCE, EVENT_PING, EVENT_PING]
+        )
+        self.assertEqual([event.counter for event in order[2:]], [1, 2])
+        with self.assertRaises(IndexError):
+            buffer.pop()
+
+    def test_starvation_guard(self):
+        """Test an overdue event of a lower class is delivered first."""
+        buffer = PriorityBuffer(PriorityPolicy(max_delay=0.01))
+        buffer.push(ping())
+        time.sleep(0.02)
+        buffer.push(command())
+        self.assertEqual(buffer.pop().type, EVENT_PING)
+        self.assertEqual(buffer.promoted, 1)
+
+    def test_unknown_type(self):
+        """Test unknown event types get the lowest class."""
+        policy = PriorityPolicy(classes=[[EVENT_COMMAND]])
+        self.assertEqual(policy.classify(ping()), 1)
+
+
+class TestPrioritize(unittest.IsolatedAsyncioTestCase):
+    """Test iterating events in priority order."""
+
+    async def test_prioritize(self):
+        """Test events arriving while the consumer is busy are delivered by priority."""
+        consuming = asyncio.Event()
+
+        async def source():
+            """Yield a ping, and once it is consumed more pings and a command."""
+            yield ping(0)
+            await consuming.wait()
+            for counter in range(1, 3):
+                yield ping(counter)
+            yield None
+            yield command()
+
+        received = []
+        async for event in prioritize(source(), PriorityPolicy(max_delay=None)):
+            received.append(event.type)
+            consuming.set()
+            # busy consumer, the source is read meanwhile
+            await asyncio.sleep(0.01)
+        self.assertEqual(received, [EVENT_PING, EVENT_COMMAND, EVENT_PING, EVENT_PING])
+
+
+class TestPriorityEventBusOrder(unittest.IsolatedAsyncioTestCase):
+    """Test the order listeners of the priority event bus finish in."""
+
+    async def finish_order(self, max_concurrent):
+        """Return the counters of the pings in the order their listeners finished."""
+        bus = PriorityEventBus(policy=PriorityPolicy(max_delay=None), max_concurrent=max_concurrent)
+        finished = []
+
+        async def listener(event):
+            """Take less time for later pings."""
+            await asyncio.sleep(0.01 * (5 - event.counter))
+            finished.append(event.counter)
+
+        bus.add_event_listener(EVENT_PING, listener)
+        for counter in range(5):
+            bus.fire(EVENT_PING, ping(counter))
+        while len(finished) < 5:
+            await asyncio.sleep(0.01)
+        return finished
+
+    async def test_strict_order_one_at_a_time(self):
+        """Test listeners of a class finish in order when one runs at a time."""
+        self.assertEqual(await self.finish_order(1), [0, 1, 2, 3, 4])
+
+    async def test_concurrent_listeners_overlap(self):
+        """Test listeners running at the same time only start in order."""
+        self.assertEqual(await self.finish_order(5), [4, 3, 2, 1, 0])
+
+
+class TestPriorityEventBus(unittest.TestCase):
+    """Test the priority event bus with a target loop."""
+
+    def setUp(self):
+        """Run a target loop in a thread."""
+        self.target = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.target.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        """Stop the target loop."""
+        self.target.call_soon_threadsafe(self.target.stop)
+        self.thread.join()
+        self.target.close()
+
+    def test_listeners_run_on_target_loop(self):
+        """Test async listeners only run on the target loop, in priority order there."""
+        bus = PriorityEventBus(
+            loop=self.target, policy=PriorityPolicy(max_delay=None), max_concurrent=1
+        )
+        received = []
+        wrong_loop = []
+        sync_calls = []
+        done = threading.Event()
+        total = 5 * 20
+
+        async def async_listener(event):
+            """Record the event and the loop it runs on."""
+            if asyncio.get_running_loop() is not self.target:
+                wrong_loop.append(event)
+            received.append(event.type)
+            await asyncio.sleep(0.001)
+            if len(received) == total:
+                done.set()
+
+        for event_type in (EVENT_PING, EVENT_COMMAND):
+            bus.add_event_listener(event_type, async_listener)
+            # sync listeners run in the executor of the client loop, finishing meanwhile
+            bus.add_event_listener(event_type, sync_calls.append)
+
+        # hold the target loop, so the first events are handed over in one batch
+        gate = threading.Event()
+        self.target.call_soon_threadsafe(gate.wait)
+
+        async def fire():
+            """Fire events from the client loop, and wait for the sync listeners."""
+            for round_number in range(20):
+                for event in (ping(), ping(), ping(), command(), command()):
+                    bus.fire(event.type, event)
+                if round_number == 0:
+                    gate.set()
+                await asyncio.sleep(0.001)
+            deadline = time.monotonic() + 10
+            while len(sync_calls) < total and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(fire())
+        self.assertTrue(done.wait(10))
+        self.assertEqual(wrong_loop, [])
+        self.assertEqual(len(sync_calls), total)
+        self.assertEqual(received.count(EVENT_COMMAND), 40)
+        # the first ping starts right away, then the queued commands go first
+        self.assertEqual(received[:3], [EVENT_PING, EVENT_COMMAND, EVENT_COMMAND])
+        self.assertEqual(bus.queue_depths(), [0] * len(bus.queue_depths()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests of the pipeline profiler."""
+import time
+import unittest
+
+from crownstone_sse.const import EVENT_PING
+from crownstone_sse.events import PingEvent
+from crownstone_sse.util.profiling import (
+    COST_STAGES,
+    STAGE_DECODE,
+    STAGE_DISPATCH,
+    STAGE_READ,
+    STAGE_WAIT,
+    PipelineProfiler,
+    PipelineSample,
+)
+
+
+def busy(seconds):
+    """Spend CPU time for a while."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestPipelineSample(unittest.TestCase):
+    """Test timing the stages of a single event."""
+
+    def test_wait_is_split_from_read(self):
+        """Test idle time before a line is waiting, CPU time is reading."""
+        sample = PipelineSample(
+            time.monotonic(), _last=time.perf_counter(), _last_cpu=time.thread_time()
+        )
+        time.sleep(0.05)
+        busy(0.02)
+        sample.lap_read()
+        self.assertGreaterEqual(sample.timings[STAGE_WAIT], 0.04)
+        self.assertGreaterEqual(sample.timings[STAGE_READ], 0.015)
+        self.assertLess(sample.timings[STAGE_READ], 0.04)
+
+        busy(0.01)
+        sample.lap(STAGE_DECODE)
+        self.assertGreaterEqual(sample.timings[STAGE_DECODE], 0.01)
+
+    def test_restart(self):
+        """Test restarting forgets the timings, and the time before it."""
+        sample = PipelineSample(
+            time.monotonic(), _last=time.perf_counter(), _last_cpu=time.thread_time()
+        )
+        sample.lap(STAGE_DECODE)
+        time.sleep(0.05)
+        sample.restart()
+        sample.lap_read()
+        self.assertLess(sample.timings[STAGE_WAIT], 0.05)
+        self.assertEqual(sample.timings[STAGE_DECODE], 0.0)
+
+
+class TestPipelineProfiler(unittest.TestCase):
+    """Test sampling events and summarizing the stages."""
+
+    def run_events(self, profiler, count):
+        """Run events through the profiler like the client does."""
+        for _ in range(count):
+            sample = profiler.begin()
+            if sample is None:
+                continue
+            time.sleep(0.002)
+            sample.lap_read()
+            busy(0.002)
+            sample.lap(STAGE_DECODE)
+            profiler.end(sample, PingEvent({"type": EVENT_PING, "counter": 1}))
+
+    def test_sampling(self):
+        """Test one of every N events is sampled, including the time of its dispatch."""
+        samples = []
+        profiler = PipelineProfiler(
+            sample_every=3, on_sample=samples.append, summary_interval=None
+        )
+        self.run_events(profiler, 9)
+        # the dispatch time of the last sample is only known when the next event starts
+        self.assertEqual(len(samples), 2)
+        profiler.close()
+        self.assertEqual(len(samples), 3)
+        self.assertEqual({sample.event_type for sample in samples}, {EVENT_PING})
+        self.assertGreater(samples[0].timings[STAGE_DISPATCH], 0.0)
+        self.assertEqual(samples[2].timings[STAGE_DISPATCH], 0.0)
+
+    def test_summary_shares_without_wait(self):
+        """Test the summary counts waiting, but leaves it out of the cost shares."""
+        profiler = PipelineProfiler(sample_every=1, summary_interval=None)
+        self.run_events(profiler, 5)
+        profiler.close()
+
+        summary = profiler.summary(reset=True)
+        self.assertEqual(summary.samples, 5)
+        self.assertEqual(summary.stages[STAGE_WAIT].count, 5)
+        self.assertGreaterEqual(summary.stages[STAGE_WAIT].mean, 0.001)
+        shares = summary.shares()
+        self.assertEqual(list(shares), COST_STAGES)
+        self.assertAlmostEqual(sum(shares.values()), 1.0)
+        self.assertGreater(shares[STAGE_DECODE], 0.5)
+
+        self.assertEqual(profiler.summary().samples, 0)
+        self.assertEqual(profiler.summary().shares(), dict.fromkeys(COST_STAGES, 0.0))
+
+    def test_periodic_summary(self):
+        """Test the summary is handed over or logged every interval."""
+        summaries = []
+        profiler = PipelineProfiler(
+            sample_every=1, on_summary=summaries.append, summary_interval=0
+        )
+        self.run_events(profiler, 3)
+        self.assertEqual([summary.samples for summary in summaries], [1, 1])
+
+        profiler = PipelineProfiler(sample_every=1, summary_interval=0)
+        with self.assertLogs("crownstone_sse.util.profiling", "INFO") as logs:
+            self.run_events(profiler, 2)
+        self.assertIn("waited", logs.output[0])
+        self.assertNotIn("wait ", logs.output[0])
+
+    def test_invalid_sample_every(self):
+        """Test at least every event must be sampled."""
+        with self.assertRaises(ValueError):
+            PipelineProfiler(sample_every=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests of recording and replaying the stream."""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import aiohttp
+
+from crownstone_sse.async_client import CrownstoneSSEAsync
+from crownstone_sse.events import PresenceEvent
+from crownstone_sse.util.replay import (
+    CrownstoneSSEReplay,
+    RecordingError,
+    StreamRecorder,
+    iter_recording,
+)
+from tests.mock_classes.standin_server import StandInServer, StreamConfig
+from tests.mocked_events import presence_events
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    """Test replaying recordings through the client."""
+
+    def setUp(self):
+        """Create a directory for the recordings."""
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "stream.rec")
+
+    def tearDown(self):
+        """Remove the recordings."""
+        self._tmp.cleanup()
+
+    def test_no_session_created(self):
+        """Test a replay can be created outside a loop, without HTTP session."""
+        with StreamRecorder(self.path):
+            pass
+        with mock.patch.object(aiohttp, "ClientSession") as client_session:
+            CrownstoneSSEReplay(self.path)
+        client_session.assert_not_called()
+
+    async def test_replay(self):
+        """Test recorded lines are parsed into events, and the replay ends."""
+        with StreamRecorder(self.path) as recorder:
+            for template in (presence_events.enter_sphere, presence_events.exit_sphere):
+                recorder.record(f"data:{json.dumps(template)}\n".encode())
+                recorder.record(b"\n")
+
+        async with CrownstoneSSEReplay(self.path, speed=None) as replay:
+            events = [event async for event in replay]
+        self.assertEqual([event.sub_type for event in events], ["enterSphere", "exitSphere"])
+        self.assertIsInstance(events[0], PresenceEvent)
+        self.assertEqual([event.receive_info.sequence for event in events], [1, 2])
+
+    async def test_record_live_stream(self):
+        """Test replaying a recording of a live stream returns the same events."""
+        server = StandInServer(StreamConfig(count=50))
+        await server.start()
+        try:
+            with StreamRecorder(self.path) as recorder:
+                async with CrownstoneSSEAsync(
+                    "email",
+                    "password",
+                    recorder=recorder,
+                    event_base_url=server.event_base_url,
+                    login_url=server.login_url,
+                ) as client:
+                    # the stream start event and the configured events
+                    live = [await client.__anext__() for _ in range(51)]
+                    client.close_client()
+        finally:
+            await server.stop()
+
+        async with CrownstoneSSEReplay(self.path, speed=None) as replay:
+            replayed = [event async for event in replay]
+        self.assertEqual([event.data for event in replayed], [event.data for event in live])
+
+    def test_invalid_recording(self):
+        """Test files that are not a recording are refused."""
+        with open(self.path, "wb") as file:
+            file.write(b"NOTAREC\0\1\0")
+        with self.assertRaises(RecordingError):
+            list(iter_recording(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Tests of the shared background runtime."""
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from crownstone_sse.util.runtime import SSERuntime, _LoopThread
+
+
+class TestSSERuntime(unittest.TestCase):
+    """Test hosting coroutines on the runtime loops."""
+
+    def test_submit(self):
+        """Test coroutines run on a loop thread of the runtime, and return their result."""
+        with SSERuntime(loops=2, name="test-runtime", allow_uvloop=False) as runtime:
+
+            async def thread_name():
+                """Return the name of the thread running the coroutine."""
+                return threading.current_thread().name
+
+            loop, future = runtime.submit(thread_name())
+            self.assertTrue(future.result(5).startswith("test-runtime-"))
+            self.assertTrue(loop.is_running())
+        self.assertFalse(runtime.is_running)
+
+    def test_least_loaded(self):
+        """Test coroutines are distributed over the loops with the least clients."""
+        runtime = SSERuntime(loops=2, allow_uvloop=False)
+        release = threading.Event()
+
+        async def wait():
+            """Run until released."""
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+        try:
+            first_loop, first = runtime.submit(wait())
+            second_loop, second = runtime.submit(wait())
+            self.assertIsNot(first_loop, second_loop)
+            self.assertEqual(runtime.get_load(), [1, 1])
+            release.set()
+            first.result(5)
+            second.result(5)
+            self.assertEqual(runtime.get_load(), [0, 0])
+        finally:
+            release.set()
+            runtime.shutdown(5)
+
+    def test_websession(self):
+        """Test a session is shared per loop, and only available on the runtime loops."""
+        runtime = SSERuntime(allow_uvloop=False)
+
+        async def get_websession():
+            """Return the session of the loop."""
+            return runtime.get_websession()
+
+        try:
+            _, first = runtime.submit(get_websession())
+            _, second = runtime.submit(get_websession())
+            session = first.result(5)
+            self.assertIs(second.result(5), session)
+            with self.assertRaises(RuntimeError):
+                asyncio.run(get_websession())
+        finally:
+            runtime.shutdown(5)
+        self.assertTrue(session.closed)
+
+    def test_shutdown(self):
+        """Test shutting down cancels running coroutines, and refuses new ones."""
+        runtime = SSERuntime(allow_uvloop=False)
+        _, future = runtime.submit(asyncio.sleep(3600))
+        runtime.shutdown(5)
+        self.assertTrue(future.cancelled())
+
+        coro = asyncio.sleep(0)
+        with self.assertRaises(RuntimeError):
+            runtime.submit(coro)
+        # the refused coroutine is closed, without a never awaited warning
+        self.assertIsNone(coro.cr_frame)
+        runtime.shutdown()
+
+    def test_loops_running_when_started(self):
+        """Test the runtime only returns once its loops are running."""
+        run = _LoopThread.run
+
+        def slow_run(thread):
+            """Start the loop late."""
+            time.sleep(0.05)
+            run(thread)
+
+        with mock.patch.object(_LoopThread, "run", slow_run):
+            runtime = SSERuntime(loops=2, allow_uvloop=False)
+        try:
+            for thread in runtime._threads:
+                self.assertTrue(thread.loop.is_running())
+        finally:
+            runtime.shutdown(5)
+
+    def test_invalid_loops(self):
+        """Test a runtime requires a loop."""
+        with self.assertRaises(ValueError):
+            SSERuntime(loops=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
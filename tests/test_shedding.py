@@ -0,0 +1,148 @@
+"""Tests of the consumer lag detection and load shedding."""
+import json
+import unittest
+
+from crownstone_sse.const import EVENT_PING
+from crownstone_sse.util.shedding import (
+    SHED_DUPLICATE_DATA_CHANGE,
+    SHED_INTERMEDIATE_SWITCH_STATE,
+    SHED_PING,
+    LoadShedder,
+)
+from tests.mocked_events import data_change_events
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+class BufferedContent:
+    """Stand-in for a response stream, with all data already received."""
+
+    def __init__(self, data):
+        """Initialize with the received data."""
+        self.total_bytes = len(data)
+        self._buffer = data
+
+    def __aiter__(self):
+        """Return instance."""
+        return self
+
+    async def __anext__(self):
+        """Return the next line."""
+        if not self._buffer:
+            raise StopAsyncIteration
+        line, separator, self._buffer = self._buffer.partition(b"\n")
+        return line + separator
+
+    def read_nowait(self, _):
+        """Return all data waiting."""
+        data, self._buffer = self._buffer, b""
+        return data
+
+
+def stream(*events):
+    """Return the data lines of events, separated by blank lines."""
+    return b"".join(f"data:{json.dumps(event)}\n\n".encode() for event in events)
+
+
+async def shed_all(shedder, content):
+    """Read all lines, return the kept data and the reasons of the dropped data."""
+    kept = []
+    reasons = []
+    reader = shedder.reader(content)
+    async for line in reader:
+        if not line.startswith(b"data:"):
+            continue
+        data = reader.data if reader.data is not None else json.loads(line[5:])
+        reason = shedder.shed(data)
+        if reason is None:
+            kept.append(data)
+        else:
+            reasons.append(reason)
+    return kept, reasons
+
+
+class TestLoadShedder(unittest.IsolatedAsyncioTestCase):
+    """Test dropping events while the consumer lags."""
+
+    async def test_not_lagging(self):
+        """Test nothing is dropped while the consumer keeps up."""
+        events = [{"type": EVENT_PING, "counter": 1}, switch_state_data(0), switch_state_data(100)]
+        shedder = LoadShedder()
+        kept, reasons = await shed_all(shedder, BufferedContent(stream(*events)))
+        self.assertEqual(kept, events)
+        self.assertEqual(reasons, [])
+        self.assertFalse(shedder.lagging)
+
+    async def test_lagging(self):
+        """Test pings, duplicate data changes and intermediate switch states are dropped."""
+        events = [
+            switch_state_data(0),
+            {"type": EVENT_PING, "counter": 1},
+            switch_state_data(0, cloud_id="other"),
+            data_change_events.user_updated,
+            switch_state_data(50),
+            data_change_events.user_updated,
+            data_change_events.user_created,
+            switch_state_data(100),
+        ]
+        shedder = LoadShedder(max_buffered_bytes=100)
+        kept, reasons = await shed_all(shedder, BufferedContent(stream(*events)))
+
+        # the first event is read before the lag is measured
+        self.assertEqual(
+            kept,
+            [
+                switch_state_data(0),
+                switch_state_data(0, cloud_id="other"),
+                data_change_events.user_updated,
+                data_change_events.user_created,
+                switch_state_data(100),
+            ],
+        )
+        self.assertEqual(
+            reasons, [SHED_PING, SHED_DUPLICATE_DATA_CHANGE, SHED_INTERMEDIATE_SWITCH_STATE]
+        )
+        self.assertEqual(shedder.shed_counts, dict.fromkeys(reasons, 1))
+        self.assertEqual(shedder.lag().buffered_bytes, 0)
+
+    async def test_disabled(self):
+        """Test shedding can be disabled per kind of event."""
+        events = [
+            switch_state_data(0),
+            {"type": EVENT_PING, "counter": 1},
+            switch_state_data(50),
+            switch_state_data(100),
+        ]
+        shedder = LoadShedder(max_buffered_bytes=100, shed_pings=False, shed_switch_states=False)
+        kept, reasons = await shed_all(shedder, BufferedContent(stream(*events)))
+        self.assertEqual(kept, events)
+        self.assertEqual(reasons, [])
+
+    def test_supersede_key(self):
+        """Test the keys of events replacing each other."""
+        shedder = LoadShedder()
+        self.assertEqual(
+            shedder.supersede_key(switch_state_data(0)), ("switchStateUpdate", "crownstone_id")
+        )
+        self.assertEqual(
+            shedder.supersede_key(data_change_events.user_updated),
+            ("dataChange", "users", "update", "sphere_id", "item_id"),
+        )
+        self.assertIsNone(shedder.supersede_key({"type": EVENT_PING, "counter": 1}))
+        self.assertIsNone(shedder.supersede_key({"type": "switchStateUpdate"}))
+
+    async def test_unmeasured_content(self):
+        """Test content without a buffer to measure, like a replay, is never shed."""
+
+        async def lines():
+            """Yield the data lines of pings."""
+            for _ in range(3):
+                yield stream({"type": EVENT_PING, "counter": 1})
+
+        shedder = LoadShedder(max_buffered_bytes=0)
+        kept, reasons = await shed_all(shedder, lines())
+        self.assertEqual(len(kept), 3)
+        self.assertEqual(reasons, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
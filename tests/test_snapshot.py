@@ -0,0 +1,143 @@
+"""Tests of the state snapshots."""
+import os
+import tempfile
+import unittest
+
+from crownstone_sse.events import ReceiveInfo, SwitchStateUpdateEvent
+from crownstone_sse.util.snapshot import (
+    SNAPSHOT_VERSION,
+    SnapshotCheckpointer,
+    SnapshotError,
+    decode_snapshot,
+    encode_snapshot,
+    read_snapshot,
+    write_snapshot,
+)
+from crownstone_sse.util.state import StateStore
+from tests.mocked_events.switch_state_update_events import switch_state_data
+from tests.test_state import filled_store
+
+
+def received_switch_state(percentage, wall, sequence, generation=1):
+    """Return a switch state event received at a wall clock time and stream position."""
+    event = SwitchStateUpdateEvent(switch_state_data(percentage))
+    event.receive_info = ReceiveInfo(0.0, wall, generation, sequence)
+    return event
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test encoding and restoring the state."""
+
+    def setUp(self):
+        """Create a directory for the snapshot files."""
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "state.snapshot")
+
+    def tearDown(self):
+        """Remove the snapshot files."""
+        self._directory.cleanup()
+
+    def assert_same_state(self, restored, store):
+        """Test a restored state equals the original, including the indexes."""
+        self.assertEqual(restored.spheres, store.spheres)
+        self.assertEqual(restored.crownstones, store.crownstones)
+        self.assertEqual(restored.locations, store.locations)
+        self.assertEqual(restored.users, store.users)
+        self.assertEqual(restored.last_event_time, store.last_event_time)
+        self.assertEqual(restored.last_event_position, store.last_event_position)
+        self.assertIs(
+            restored.get_crownstone_by_uid("sphere_id", 1),
+            restored.get_crownstone("crownstone_id"),
+        )
+
+    def test_round_trip(self):
+        """Test a decoded snapshot equals the encoded state."""
+        store = filled_store()
+        store.apply(received_switch_state(100, 1000.5, 7, generation=2))
+        restored, info = decode_snapshot(encode_snapshot(store))
+        self.assert_same_state(restored, store)
+        self.assertEqual(info.version, SNAPSHOT_VERSION)
+        self.assertEqual(info.last_event_time, 1000.5)
+        self.assertEqual(info.last_event_position, (2, 7))
+
+    def test_without_position(self):
+        """Test a state last changed by an event without receive info has no position."""
+        store = filled_store()
+        restored, info = decode_snapshot(encode_snapshot(store))
+        self.assert_same_state(restored, store)
+        self.assertIsNotNone(info.last_event_time)
+        self.assertIsNone(info.last_event_position)
+
+    def test_empty_state(self):
+        """Test a snapshot of an empty state."""
+        restored, info = decode_snapshot(encode_snapshot(StateStore()))
+        self.assertEqual(restored.spheres, {})
+        self.assertIsNone(info.last_event_time)
+        self.assertIsNone(info.last_event_position)
+
+    def test_restore_into_store(self):
+        """Test restoring replaces the contents of an existing store."""
+        store = StateStore()
+        store.apply(SwitchStateUpdateEvent(switch_state_data(0, cloud_id="other", unique_id=5)))
+        restored, _ = decode_snapshot(encode_snapshot(filled_store()), store)
+        self.assertIs(restored, store)
+        self.assertIsNone(store.get_crownstone("other"))
+        self.assertIsNone(store.get_crownstone_by_uid("sphere_id", 5))
+        self.assertEqual(store.get_crownstone("crownstone_id").switch_state, 100)
+
+    def test_invalid(self):
+        """Test invalid snapshots raise a SnapshotError."""
+        data = encode_snapshot(filled_store())
+        with self.assertRaisesRegex(SnapshotError, "truncated"):
+            decode_snapshot(data[:10])
+        with self.assertRaisesRegex(SnapshotError, "Not a Crownstone"):
+            decode_snapshot(b"X" + data[1:])
+        with self.assertRaisesRegex(SnapshotError, "version"):
+            decode_snapshot(data[:8] + b"\x09\x00" + data[10:])
+        with self.assertRaisesRegex(SnapshotError, "corrupt"):
+            decode_snapshot(data[:-1] + bytes([data[-1] ^ 0xFF]))
+        with self.assertRaisesRegex(SnapshotError, "corrupt"):
+            decode_snapshot(data[:-1])
+
+    def test_file(self):
+        """Test writing and reading a snapshot file."""
+        store = filled_store()
+        store.apply(received_switch_state(100, 1000.5, 7))
+        write_snapshot(store, self.path)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+        restored, info = read_snapshot(self.path)
+        self.assert_same_state(restored, store)
+        self.assertEqual(info.last_event_position, (1, 7))
+
+    def test_checkpointer(self):
+        """Test checkpoints are only written when the state changed."""
+        store = StateStore()
+        checkpointer = SnapshotCheckpointer(store, self.path, interval=3600)
+        self.assertFalse(checkpointer.checkpoint())
+
+        store.apply(received_switch_state(100, 1000.0, 1))
+        self.assertTrue(checkpointer.checkpoint())
+        self.assertFalse(checkpointer.checkpoint())
+
+        checkpointer.start()
+        # received in the same clock tick, but a later event of the stream
+        store.apply(received_switch_state(0, 1000.0, 2))
+        # the final checkpoint is written on stop
+        checkpointer.stop()
+        restored, info = read_snapshot(self.path)
+        self.assertEqual(restored.get_crownstone("crownstone_id").switch_state, 0)
+        self.assertEqual(info.last_event_time, 1000.0)
+        self.assertEqual(info.last_event_position, (1, 2))
+
+    def test_checkpoint_error(self):
+        """Test a failing checkpoint is logged instead of raised."""
+        store = filled_store()
+        checkpointer = SnapshotCheckpointer(
+            store, os.path.join(self._directory.name, "missing", "state.snapshot")
+        )
+        with self.assertLogs("crownstone_sse.util.snapshot", "WARNING"):
+            self.assertFalse(checkpointer.checkpoint())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+"""Tests of the in-memory state model."""
+import asyncio
+import copy
+import unittest
+
+from crownstone_sse.const import (
+    EVENT_ABILITY_CHANGE,
+    EVENT_ABILITY_CHANGE_DIMMING,
+    OPERATION_CREATE,
+    OPERATION_DELETE,
+    OPERATION_UPDATE,
+)
+from crownstone_sse.events import (
+    AbilityChangeEvent,
+    DataChangeEvent,
+    PresenceEvent,
+    ReceiveInfo,
+    SwitchStateUpdateEvent,
+)
+from crownstone_sse.util.eventbus import EventBus
+from crownstone_sse.util.state import (
+    KIND_CROWNSTONE,
+    KIND_LOCATION,
+    KIND_SPHERE,
+    KIND_USER,
+    AbilityState,
+    StateChange,
+    StateStore,
+)
+from tests.mocked_events import data_change_events, presence_events
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+def ability_change(enabled, synced=True):
+    """Return a dimming ability change of the crownstone."""
+    return AbilityChangeEvent(
+        {
+            "type": EVENT_ABILITY_CHANGE,
+            "subType": EVENT_ABILITY_CHANGE_DIMMING,
+            "sphere": {"id": "sphere_id", "name": "sphere_name", "uid": 84},
+            "stone": {"id": "crownstone_id", "name": "crownstone_name", "uid": 1},
+            "ability": {
+                "type": EVENT_ABILITY_CHANGE_DIMMING,
+                "enabled": enabled,
+                "syncedToCrownstone": synced,
+            },
+        }
+    )
+
+
+def presence(template):
+    """Return a presence event."""
+    return PresenceEvent(copy.deepcopy(template))
+
+
+def data_change(template):
+    """Return a data change event."""
+    return DataChangeEvent(copy.deepcopy(template))
+
+
+def filled_store():
+    """Return a state with a crownstone, an ability and a user in a location."""
+    store = StateStore()
+    store.apply(SwitchStateUpdateEvent(switch_state_data(100)))
+    store.apply(ability_change(True))
+    store.apply(presence(presence_events.enter_location))
+    return store
+
+
+class TestStateStore(unittest.TestCase):
+    """Test maintaining the state from events."""
+
+    def test_switch_state(self):
+        """Test a switch state creates the sphere and crownstone, indexed by uid."""
+        store = StateStore()
+        changes = []
+        store.add_change_listener(changes.append)
+        store.apply(SwitchStateUpdateEvent(switch_state_data(100)))
+
+        crownstone = store.get_crownstone("crownstone_id")
+        self.assertEqual(crownstone.switch_state, 100)
+        self.assertEqual(crownstone.name, "crownstone_name")
+        self.assertIs(store.get_crownstone_by_uid("sphere_id", 1), crownstone)
+        self.assertEqual(store.get_sphere("sphere_id").unique_id, 84)
+        self.assertIsNotNone(store.last_event_time)
+        self.assertEqual(
+            changes,
+            [
+                StateChange(KIND_SPHERE, OPERATION_CREATE, "sphere_id", "sphere_id"),
+                StateChange(KIND_CROWNSTONE, OPERATION_CREATE, "crownstone_id", "sphere_id"),
+                StateChange(KIND_CROWNSTONE, OPERATION_UPDATE, "crownstone_id", "sphere_id"),
+            ],
+        )
+
+        # the same state again is no change
+        changes.clear()
+        store.apply(SwitchStateUpdateEvent(switch_state_data(100)))
+        self.assertEqual(changes, [])
+
+    def test_last_event(self):
+        """Test the receive time and stream position of the last applied event are kept."""
+        store = StateStore()
+        event = SwitchStateUpdateEvent(switch_state_data(100))
+        event.receive_info = ReceiveInfo(5.0, 1000.5, 2, 7)
+        store.apply(event)
+        self.assertEqual(store.last_event_time, 1000.5)
+        self.assertEqual(store.last_event_position, (2, 7))
+
+        # events without receive info, like ones created by hand, have no position
+        store.apply(SwitchStateUpdateEvent(switch_state_data(0)))
+        self.assertGreater(store.last_event_time, 1000.5)
+        self.assertIsNone(store.last_event_position)
+
+    def test_unique_id_change(self):
+        """Test the uid index follows a new unique id of a crownstone."""
+        store = StateStore()
+        store.apply(SwitchStateUpdateEvent(switch_state_data(0, unique_id=1)))
+        store.apply(SwitchStateUpdateEvent(switch_state_data(0, unique_id=2)))
+        self.assertIsNone(store.get_crownstone_by_uid("sphere_id", 1))
+        self.assertEqual(store.get_crownstone_by_uid("sphere_id", 2).cloud_id, "crownstone_id")
+
+    def test_ability(self):
+        """Test ability changes of a crownstone."""
+        store = StateStore()
+        store.apply(ability_change(True, synced=False))
+        self.assertEqual(
+            store.get_crownstone("crownstone_id").abilities,
+            {EVENT_ABILITY_CHANGE_DIMMING: AbilityState(True, False)},
+        )
+
+    def test_presence(self):
+        """Test users entering and leaving locations and spheres."""
+        store = StateStore()
+        store.apply(presence(presence_events.enter_location))
+        self.assertEqual(store.get_user("user_id").location_id, "location_id")
+        self.assertEqual(store.get_location("location_id").users, {"user_id"})
+        self.assertEqual(store.get_sphere("sphere_id").users, {"user_id"})
+
+        store.apply(presence(presence_events.exit_location))
+        self.assertIsNone(store.get_user("user_id").location_id)
+        self.assertEqual(store.get_location("location_id").users, set())
+
+        store.apply(presence(presence_events.enter_location))
+        store.apply(presence(presence_events.exit_sphere))
+        # leaving the sphere also leaves the location in it
+        self.assertIsNone(store.get_user("user_id").location_id)
+        self.assertEqual(store.get_sphere("sphere_id").users, set())
+
+    def test_data_change(self):
+        """Test creating, updating and deleting items."""
+        store = StateStore()
+        store.apply(data_change(data_change_events.location_created))
+        self.assertEqual(store.get_location("item_id").name, "item_name")
+
+        changes = []
+        store.add_change_listener(changes.append)
+        store.apply(data_change(data_change_events.location_deleted))
+        self.assertIsNone(store.get_location("item_id"))
+        self.assertEqual(
+            changes, [StateChange(KIND_LOCATION, OPERATION_DELETE, "item_id", "sphere_id")]
+        )
+
+    def test_delete_sphere(self):
+        """Test deleting a sphere removes everything in it."""
+        store = filled_store()
+        deleted = copy.deepcopy(data_change_events.sphere_deleted)
+        deleted["changedItem"]["id"] = "sphere_id"
+        store.apply(DataChangeEvent(deleted))
+        self.assertEqual(store.spheres, {})
+        self.assertEqual(store.crownstones, {})
+        self.assertEqual(store.locations, {})
+        self.assertIsNone(store.get_crownstone_by_uid("sphere_id", 1))
+        self.assertEqual(store.get_user("user_id").spheres, set())
+
+    def test_delete_user(self):
+        """Test a user in no sphere anymore is removed."""
+        store = filled_store()
+        deleted = copy.deepcopy(data_change_events.user_deleted)
+        deleted["changedItem"]["id"] = "user_id"
+        changes = []
+        store.add_change_listener(changes.append)
+        store.apply(DataChangeEvent(deleted))
+        self.assertIsNone(store.get_user("user_id"))
+        self.assertEqual(store.get_location("location_id").users, set())
+        self.assertEqual(
+            changes[-1], StateChange(KIND_USER, OPERATION_DELETE, "user_id", "sphere_id")
+        )
+
+    def test_remove_change_listener(self):
+        """Test a removed listener is no longer called."""
+        store = StateStore()
+        changes = []
+        remove = store.add_change_listener(changes.append)
+        remove()
+        store.apply(SwitchStateUpdateEvent(switch_state_data(100)))
+        self.assertEqual(changes, [])
+        with self.assertLogs("crownstone_sse.util.state", "WARNING"):
+            remove()
+
+    def test_listen_to(self):
+        """Test the state is updated from the executor threads of an event bus."""
+        store = StateStore()
+        bus = EventBus()
+        remove = store.listen_to(bus)
+
+        async def fire():
+            """Fire switch states of many crownstones, and wait for the executor."""
+            for index in range(200):
+                data = switch_state_data(index, cloud_id=f"crownstone_{index}", unique_id=index)
+                event = SwitchStateUpdateEvent(data)
+                bus.fire(event.type, event)
+            await asyncio.get_running_loop().shutdown_default_executor()
+
+        asyncio.run(fire())
+        self.assertEqual(len(store.crownstones), 200)
+        self.assertEqual(store.get_crownstone_by_uid("sphere_id", 150).switch_state, 150)
+
+        remove()
+        self.assertEqual(bus.get_event_listeners(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests of the compiled switch plan of multi switch commands."""
+import unittest
+
+from crownstone_sse.events import MultiSwitchCommandEvent
+from crownstone_sse.helpers.switch_command import SwitchCommandType
+from crownstone_sse.helpers.switch_plan import SwitchPlan
+from tests.mocked_events.command_events import multi_switch_data
+
+
+class TestSwitchPlan(unittest.TestCase):
+    """Test compiling switch data into a plan."""
+
+    def test_last_command_wins(self):
+        """Test only the last command per unique id is kept, in order of arrival per action."""
+        plan = SwitchPlan(
+            [
+                {"id": "a", "uid": 1, "type": "PERCENTAGE", "percentage": 20},
+                {"id": "b", "uid": 2, "type": "TURN_ON"},
+                {"id": "c", "uid": 3, "type": "PERCENTAGE", "percentage": 30},
+                {"id": "a", "uid": 1, "type": "TURN_OFF"},
+                {"id": "c", "uid": "3", "type": "PERCENTAGE", "percentage": 40},
+            ]
+        )
+        self.assertEqual(len(plan), 3)
+        self.assertEqual(
+            plan.group_actions,
+            [SwitchCommandType.TURN_ON, SwitchCommandType.TURN_OFF, SwitchCommandType.PERCENTAGE],
+        )
+        self.assertEqual(list(plan.iter_group(SwitchCommandType.TURN_ON)), [(2, "b", 0)])
+        self.assertEqual(list(plan.iter_group(SwitchCommandType.TURN_OFF)), [(1, "a", 0)])
+        self.assertEqual(list(plan.iter_group(SwitchCommandType.PERCENTAGE)), [(3, "c", 40)])
+
+    def test_parallel_arrays(self):
+        """Test the arrays hold one command per index, grouped by action."""
+        plan = SwitchPlan(
+            [
+                {"id": "a", "uid": 1, "type": "PERCENTAGE", "percentage": 150},
+                {"id": "b", "uid": 2, "type": "TURN_ON"},
+                {"id": "c", "uid": 3, "type": "PERCENTAGE", "percentage": -5},
+                {"id": "d", "uid": 4, "type": "BLINK"},
+            ]
+        )
+        self.assertEqual(list(plan.unique_ids), [4, 2, 1, 3])
+        self.assertEqual(plan.cloud_ids, ["d", "b", "a", "c"])
+        self.assertEqual(
+            list(plan.actions),
+            [
+                SwitchCommandType.UNKNOWN.value,
+                SwitchCommandType.TURN_ON.value,
+                SwitchCommandType.PERCENTAGE.value,
+                SwitchCommandType.PERCENTAGE.value,
+            ],
+        )
+        # percentages are clamped to 0-100
+        self.assertEqual(list(plan.percentages), [0, 0, 100, 0])
+        self.assertEqual(plan.group(SwitchCommandType.PERCENTAGE), range(2, 4))
+        self.assertEqual(plan.group(SwitchCommandType.TURN_OFF), range(0, 0))
+
+    def test_empty(self):
+        """Test a plan without commands."""
+        plan = SwitchPlan([])
+        self.assertEqual(len(plan), 0)
+        self.assertEqual(plan.group_actions, [])
+        self.assertEqual(list(plan.iter_group(SwitchCommandType.TURN_ON)), [])
+
+    def test_compiled_once(self):
+        """Test the plan of an event is compiled once."""
+        event = MultiSwitchCommandEvent(multi_switch_data())
+        self.assertIs(event.switch_plan, event.switch_plan)
+        self.assertEqual(list(event.switch_plan.unique_ids), [2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Tests of the switch state history."""
+import math
+import threading
+import unittest
+
+from crownstone_sse.events import SwitchStateUpdateEvent
+from crownstone_sse.util import timeseries
+from crownstone_sse.util.timeseries import NO_VALUE, SwitchStateBuffer, SwitchStateHistory
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+class HistoryTests:
+    """Tests run with and without NumPy."""
+
+    use_numpy = False
+
+    def create(self, capacity=16):
+        """Return a history."""
+        return SwitchStateHistory(capacity, use_numpy=self.use_numpy)
+
+    def test_keyed_by_sphere(self):
+        """Test Crownstones with the same unique id in different spheres are kept apart."""
+        history = self.create()
+        for sphere_id, percentage, timestamp in (("sphere_a", 100, 1.0), ("sphere_b", 0, 2.0)):
+            data = switch_state_data(percentage, sphere_id=sphere_id)
+            history.apply(SwitchStateUpdateEvent(data), timestamp=timestamp)
+        self.assertEqual(history.latest("sphere_a", 1), (1.0, 100))
+        self.assertEqual(history.latest("sphere_b", 1), (2.0, 0))
+        self.assertEqual(sorted(history.crownstones), [("sphere_a", 1), ("sphere_b", 1)])
+
+        history.clear("sphere_a")
+        self.assertIsNone(history.latest("sphere_a", 1))
+        self.assertEqual(history.crownstones, [("sphere_b", 1)])
+
+    def test_range_and_resample(self):
+        """Test range queries over a wrapped ring buffer."""
+        history = self.create(capacity=4)
+        for second in range(6):
+            history.append("sphere", 1, second * 10, timestamp=float(second))
+
+        timestamps, values = history.range("sphere", 1, 3.0, 5.0)
+        self.assertEqual(list(timestamps), [3.0, 4.0])
+        self.assertEqual(list(values), [30, 40])
+
+        grid, values = history.resample("sphere", 1, 1.0, 6.0, 1.0)
+        self.assertEqual(list(grid), [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(list(values), [NO_VALUE, 20, 30, 40, 50])
+
+        self.assertAlmostEqual(history.average("sphere", 1, 2.0, 4.0), 25.0)
+        _, means = history.downsample("sphere", 1, 2.0, 6.0, 2.0)
+        self.assertEqual(list(means), [25.0, 45.0])
+        self.assertTrue(math.isnan(history.average("sphere", 2, 0.0, 1.0)))
+
+    def test_samples_are_a_copy(self):
+        """Test returned samples do not change with later appends."""
+        history = self.create()
+        history.append("sphere", 1, 10, timestamp=1.0)
+        timestamps, values = history.range("sphere", 1)
+        history.append("sphere", 1, 20, timestamp=2.0)
+        history.clear()
+        history.append("sphere", 1, 30, timestamp=0.5)
+        self.assertEqual(list(timestamps), [1.0])
+        self.assertEqual(list(values), [10])
+
+    def test_buffer_grows(self):
+        """Test a buffer doubles its arrays as samples are added, up to the capacity."""
+        buffer = SwitchStateBuffer(100, self.use_numpy, initial_capacity=8)
+        self.assertEqual(buffer.allocated, 8)
+        allocated = []
+        for second in range(150):
+            buffer.append(float(second), second % 100)
+            allocated.append(buffer.allocated)
+        self.assertEqual(sorted(set(allocated)), [8, 16, 32, 64, 100])
+        self.assertEqual(buffer.size, 100)
+        timestamps, values = buffer.samples()
+        self.assertEqual(list(timestamps), [float(second) for second in range(50, 150)])
+        self.assertEqual(list(values), [second % 100 for second in range(50, 150)])
+
+    def test_buffer_queries(self):
+        """Test searching and slicing the buffer, before and after the ring wraps."""
+        buffer = SwitchStateBuffer(10, self.use_numpy, initial_capacity=2)
+        for count in range(1, 25):
+            buffer.append(float(count), count)
+            expected = [float(second) for second in range(max(count - 9, 1), count + 1)]
+            for value in (0.0, 5.0, 5.5, 12.0, 30.0):
+                self.assertEqual(
+                    buffer.search(value), len([t for t in expected if t < value]), value
+                )
+                self.assertEqual(
+                    buffer.search(value, right=True),
+                    len([t for t in expected if t <= value]),
+                    value,
+                )
+            for first, last in ((0, 10), (2, 7), (-1, 3), (8, 20), (5, 5)):
+                timestamps, values = buffer.slice(first, last)
+                self.assertEqual(list(timestamps), expected[max(first, 0) : last])
+                self.assertEqual(list(values), [int(t) for t in expected[max(first, 0) : last]])
+
+    def test_concurrent_appends_in_order(self):
+        """Test appends from several threads keep the timestamps sorted."""
+        history = self.create(capacity=40000)
+
+        def append():
+            """Append samples without timestamp."""
+            for _ in range(5000):
+                history.append("sphere", 1, 50)
+
+        threads = [threading.Thread(target=append) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        timestamps, _ = history.range("sphere", 1)
+        self.assertEqual(len(timestamps), 40000)
+        self.assertEqual(list(timestamps), sorted(timestamps))
+
+
+class TestHistoryArray(HistoryTests, unittest.TestCase):
+    """Test the history with the array module."""
+
+
+@unittest.skipIf(timeseries.np is None, "NumPy is not installed")
+class TestHistoryNumpy(HistoryTests, unittest.TestCase):
+    """Test the history with NumPy."""
+
+    use_numpy = True
+
+
+if __name__ == "__main__":
+    unittest.main()
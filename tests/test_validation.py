@@ -0,0 +1,112 @@
+"""Tests of the event schema validation."""
+import copy
+import unittest
+
+from crownstone_sse.const import EVENT_PING
+from crownstone_sse.events import (
+    InvalidEvent,
+    PresenceEvent,
+    SwitchStateUpdateEvent,
+    parse_event,
+)
+from crownstone_sse.util.validation import NUMBER, EventValidator
+from tests.mocked_events import (
+    command_events,
+    data_change_events,
+    presence_events,
+    system_events,
+)
+from tests.mocked_events.command_events import multi_switch_data
+from tests.mocked_events.switch_state_update_events import switch_state_data
+
+
+class TestEventValidator(unittest.TestCase):
+    """Test validating event data."""
+
+    def test_valid(self):
+        """Test the mocked events are valid."""
+        validator = EventValidator()
+        for data in (
+            switch_state_data(),
+            multi_switch_data(),
+            command_events.switch_crownstone_command,
+            data_change_events.location_created,
+            presence_events.enter_location,
+            system_events.stream_start,
+            {"type": EVENT_PING, "counter": 1},
+            # event types without a schema are not validated
+            {"type": "unknown"},
+        ):
+            self.assertIsNone(validator.validate(data), data)
+        self.assertEqual(validator.invalid_counts, {})
+
+    def test_invalid_fields(self):
+        """Test missing fields and fields of the wrong type are described."""
+        validator = EventValidator()
+        data = switch_state_data()
+        del data["crownstone"]["percentage"]
+        data["sphere"]["id"] = None
+        self.assertEqual(
+            validator.validate(data),
+            [
+                "sphere.id: expected str or int, got NoneType",
+                "crownstone.percentage: missing",
+            ],
+        )
+        self.assertEqual(validator.invalid_counts, {"switchStateUpdate": 1})
+
+    def test_invalid_list_items(self):
+        """Test the items of a list are validated, with their index."""
+        validator = EventValidator()
+        data = multi_switch_data()
+        del data["switchData"][1]["type"]
+        self.assertEqual(validator.validate(data), ["switchData[1].type: missing"])
+
+        data["switchData"] = "none"
+        self.assertEqual(validator.validate(data), ["switchData: expected a list, got str"])
+
+        del data["switchData"]
+        self.assertEqual(validator.validate(data), ["switchData: missing"])
+
+    def test_invalid_type(self):
+        """Test data without a type, or that is not an object."""
+        validator = EventValidator()
+        self.assertEqual(validator.validate({}), ["type: missing"])
+        self.assertEqual(validator.validate({"type": [EVENT_PING]}), ["type: expected str"])
+        self.assertEqual(validator.validate([]), ["expected an object, got list"])
+        self.assertEqual(validator.invalid_counts, {"": 3})
+
+    def test_custom_schema(self):
+        """Test validating against custom schemas."""
+        validator = EventValidator(schemas={EVENT_PING: {"counter": NUMBER}}, sub_type_schemas={})
+        self.assertIsNone(validator.validate(switch_state_data()))
+        self.assertEqual(
+            validator.validate({"type": EVENT_PING, "counter": "1"}),
+            ["counter: expected int or float, got str"],
+        )
+
+
+class TestParseEvent(unittest.TestCase):
+    """Test parsing events with validation."""
+
+    def test_parse_event(self):
+        """Test valid data is parsed, and invalid data becomes an InvalidEvent."""
+        validator = EventValidator()
+        self.assertIsInstance(
+            parse_event(switch_state_data(), validator=validator), SwitchStateUpdateEvent
+        )
+        self.assertIsInstance(
+            parse_event(copy.deepcopy(presence_events.enter_sphere), validator=validator),
+            PresenceEvent,
+        )
+
+        data = switch_state_data()
+        del data["crownstone"]
+        event = parse_event(data, validator=validator)
+        self.assertIsInstance(event, InvalidEvent)
+        self.assertEqual(event.type, "switchStateUpdate")
+        self.assertIn("crownstone.id: missing", event.errors)
+
+
+if __name__ == "__main__":
+    unittest.main()